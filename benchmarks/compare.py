@@ -0,0 +1,81 @@
+"""
+Compara um arquivo de resultados de benchmark com uma linha de base.
+
+Exemplo:
+    python -m benchmarks.compare data/bench/results.json data/bench/baseline.json --threshold 0.1
+"""
+import json
+import sys
+from typing import Dict, List
+
+import click
+
+def metric_direction(name: str) -> int:
+    """+1 se maior é melhor, -1 se menor é melhor, 0 se não comparável (contagens)."""
+    if name.endswith("_per_s"):
+        return 1
+    if name == "seconds" or name.endswith("_ms") or name.endswith("_mb"):
+        return -1
+    return 0
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.10) -> List[Dict]:
+    """
+    Compara métricas de cada estágio presente nos dois resultados.
+
+    Returns:
+        list: Uma linha por métrica com valores, variação relativa e status
+        ("regression", "improvement", "ok" ou "changed" para contagens).
+    """
+    rows = []
+    for stage, metrics in current.get("stages", {}).items():
+        base_metrics = baseline.get("stages", {}).get(stage)
+        if not base_metrics:
+            continue
+        for name, value in metrics.items():
+            base = base_metrics.get(name)
+            if not isinstance(value, (int, float)) or not isinstance(base, (int, float)):
+                continue
+            direction = metric_direction(name)
+            change = (value - base) / base if base else 0.0
+            if direction == 0:
+                status = "changed" if value != base else "ok"
+            elif change * direction < -threshold:
+                status = "regression"
+            elif change * direction > threshold:
+                status = "improvement"
+            else:
+                status = "ok"
+            rows.append({"stage": stage, "metric": name, "baseline": base, "current": value, "change": change, "status": status})
+    return rows
+
+def print_comparison(rows: List[Dict], threshold: float):
+    print(f"\n{'estágio':<10} {'métrica':<22} {'base':>12} {'atual':>12} {'variação':>9}  status")
+    for row in rows:
+        print(
+            f"{row['stage']:<10} {row['metric']:<22} {row['baseline']:>12.4g} {row['current']:>12.4g} "
+            f"{row['change']:>+8.1%}  {row['status']}"
+        )
+    regressions = [r for r in rows if r["status"] == "regression"]
+    changed = [r for r in rows if r["status"] == "changed"]
+    if changed:
+        print(f"⚠️ {len(changed)} contagens de saída mudaram em relação à linha de base.")
+    if regressions:
+        print(f"❌ {len(regressions)} regressões acima de {threshold:.0%}.")
+    else:
+        print(f"✅ Nenhuma regressão acima de {threshold:.0%}.")
+
+@click.command(help="Compara resultados de benchmark com uma linha de base.")
+@click.argument("results", type=click.Path(exists=True, dir_okay=False))
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.option("--threshold", default=0.10, type=float, show_default=True, help="Variação relativa tolerada.")
+def main(results, baseline, threshold):
+    with open(results, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    with open(baseline, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    rows = compare_results(current, base, threshold)
+    print_comparison(rows, threshold)
+    sys.exit(1 if any(r["status"] == "regression" for r in rows) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Benchmark ponta a ponta do pipeline sobre o corpus sintético: extração,
+transformação, carga e recuperação/resposta. Cada estágio roda em um processo
+próprio (pico de memória isolado) e registra tempo, vazão, percentis de
+latência, pico de RSS e contagens de saída em um arquivo JSON.
+
+Roda só em CPU e sem rede, desde que os modelos já estejam no cache local
+(`HF_HUB_OFFLINE`/`TRANSFORMERS_OFFLINE` são ativados por padrão).
+
+Exemplo:
+    python -m benchmarks.run_benchmarks --scale 1 --output data/bench/results.json
+    python -m benchmarks.run_benchmarks --stages query --baseline data/bench/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import subprocess
+import traceback
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+from typing import Dict, List
+
+import click
+
+from benchmarks.compare import compare_results, print_comparison
+from benchmarks.synthetic_corpus import generate_corpus
+
+STAGES = ("extract", "transform", "load", "query")
+# Intervalo (s) entre verificações de que o processo do estágio ainda está vivo
+STAGE_POLL_INTERVAL = 5.0
+
+def workdir_layout(workdir: str, corpus_dir: str) -> Dict[str, str]:
+    workdir = Path(workdir)
+    corpus_dir = Path(corpus_dir)
+    return {
+        "documents_dir": str(corpus_dir / "documents"),
+        "notes_dir": str(corpus_dir / "notes"),
+        "queries_path": str(corpus_dir / "queries.jsonl"),
+        "raw_dir": str(workdir / "raw"),
+        "clean_dir": str(workdir / "clean"),
+        "chunks_path": str(workdir / "chunks" / "chunks_output.json"),
+        "embeddings_dir": str(workdir / "embeddings"),
+        "bm25_index_path": str(workdir / "bm25" / "bm25_index.pkl"),
+    }
+
+# Saídas de cada estágio, apagadas antes de rodá-lo (os estágios pulam arquivos já processados)
+STAGE_OUTPUTS = {
+    "extract": ("raw_dir",),
+    "transform": ("clean_dir", "chunks_path", "bm25_index_path"),
+    "load": ("embeddings_dir",),
+    "query": (),
+}
+
+def _count_files(directory: str, suffix: str = None) -> int:
+    return sum(
+        1 for _, _, files in os.walk(directory) for name in files if suffix is None or name.endswith(suffix)
+    )
+
+def _count_lines(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+def _dir_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(directory) for name in files
+    )
+
+def stage_extract(layout: Dict, options: Dict) -> Dict:
+    from etl.extract.extract import run_extraction
+
+    start = time.perf_counter()
+    run_extraction([layout["documents_dir"]], output_dir=layout["raw_dir"])
+    seconds = time.perf_counter() - start
+
+    # Notas markdown não passam pela extração: entram direto na transformação
+    shutil.copytree(layout["notes_dir"], os.path.join(layout["raw_dir"], "notes"), dirs_exist_ok=True)
+
+    files = _count_files(layout["documents_dir"])
+    return {"extract": {
+        "seconds": seconds,
+        "files_per_s": files / seconds if seconds else 0.0,
+        "mb_per_s": _dir_bytes(layout["documents_dir"]) / 1e6 / seconds if seconds else 0.0,
+        "input_files": files,
+        "output_files": _count_files(layout["raw_dir"], ".md") - _count_files(layout["notes_dir"], ".md"),
+    }}
+
+def stage_transform(layout: Dict, options: Dict) -> Dict:
+    from etl.transform.transform import run_transformation
+
+    start = time.perf_counter()
+    run_transformation(
+        layout["raw_dir"], layout["clean_dir"], layout["chunks_path"], bm25_index_path=layout["bm25_index_path"]
+    )
+    seconds = time.perf_counter() - start
+
+    chunks = _count_lines(layout["chunks_path"])
+    files = _count_files(layout["clean_dir"], ".md")
+    return {"transform": {
+        "seconds": seconds,
+        "files_per_s": files / seconds if seconds else 0.0,
+        "chunks_per_s": chunks / seconds if seconds else 0.0,
+        "clean_files": files,
+        "chunks": chunks,
+    }}
+
+def stage_load(layout: Dict, options: Dict) -> Dict:
+    from etl.load.load import run_embedding_generation
+    from etl.load.index_version import read_index_version
+
+    start = time.perf_counter()
+    run_embedding_generation(layout["chunks_path"], layout["embeddings_dir"], bm25_index_path=layout["bm25_index_path"])
+    seconds = time.perf_counter() - start
+
+    chunks = _count_lines(layout["chunks_path"])
+    marker = read_index_version(layout["embeddings_dir"]) or {}
+    return {"load": {
+        "seconds": seconds,
+        "chunks_per_s": chunks / seconds if seconds else 0.0,
+        "vectors": marker.get("count", 0),
+        "store_mb": _dir_bytes(layout["embeddings_dir"]) / 1e6,
+    }}
+
+def _timed_queries(fn, queries: List[str]) -> Dict:
+    from utils.metrics import latency_summary
+
+    # Aquecimento fora da medição: carrega índices/modelos na primeira chamada
+    fn(queries[0])
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - query_start)
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "queries_per_s": len(queries) / seconds if seconds else 0.0,
+        "queries": len(queries),
+        **latency_summary(latencies),
+    }
+
+def stage_query(layout: Dict, options: Dict) -> Dict:
+    from inference.batch_qa import load_questions
+    from inference.rag_pipeline import RagPipeline
+
+    queries = [q["question"] for q in load_questions(layout["queries_path"])]
+    if not queries:
+        raise RuntimeError("Nenhuma pergunta no corpus para o benchmark de consulta.")
+
+    results = {}
+    for mode in options["retrieval_modes"]:
+        rag = RagPipeline(
+            persist_directory=layout["embeddings_dir"],
+            retrieval_mode=mode,
+            bm25_index_path=layout["bm25_index_path"],
+            use_cache=False,
+        )
+        results[f"query_{mode}"] = _timed_queries(lambda q: rag.retrieve_documents(q, k=options["k"]), queries)
+
+        if options["generate"]:
+            sample = queries[:options["generate_queries"]]
+            results[f"answer_{mode}"] = _timed_queries(
+                lambda q: rag.generate_answer(q, k=options["k"], max_tokens=options["max_tokens"]), sample
+            )
+    return results
+
+STAGE_FUNCTIONS = {
+    "extract": stage_extract,
+    "transform": stage_transform,
+    "load": stage_load,
+    "query": stage_query,
+}
+
+def _stage_worker(stage: str, layout: Dict, options: Dict, queue):
+    try:
+        results = STAGE_FUNCTIONS[stage](layout, options)
+        # ru_maxrss em KB no Linux; filhos cobrem os workers de OCR
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        for metrics in results.values():
+            metrics["peak_rss_mb"] = peak
+            metrics["children_peak_rss_mb"] = children_peak
+        queue.put(("ok", results))
+    except Exception:
+        queue.put(("error", traceback.format_exc()))
+
+def run_stage(stage: str, layout: Dict, options: Dict) -> Dict:
+    """Roda o estágio em um processo novo (spawn) e devolve suas métricas."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_stage_worker, args=(stage, layout, options, queue), name=f"bench-{stage}")
+    process.start()
+    # Processo morto sem resposta (OOM kill, segfault) não pode travar o benchmark
+    while True:
+        try:
+            status, payload = queue.get(timeout=STAGE_POLL_INTERVAL)
+            break
+        except Empty:
+            if not process.is_alive():
+                process.join()
+                raise click.ClickException(
+                    f"Estágio '{stage}' terminou sem resultado (código de saída {process.exitcode})."
+                )
+    process.join()
+    if status != "ok":
+        raise click.ClickException(f"Estágio '{stage}' falhou:\n{payload}")
+    return payload
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _reset_outputs(stage: str, layout: Dict):
+    for key in STAGE_OUTPUTS[stage]:
+        path = Path(layout[key])
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+@click.command(help="Benchmark ponta a ponta do pipeline sobre um corpus sintético.")
+@click.option("--corpus-dir", default="data/bench/corpus", show_default=True)
+@click.option("--workdir", default="data/bench/work", show_default=True, help="Saídas dos estágios (recriadas).")
+@click.option("--scale", default=1, type=int, show_default=True, help="Escala do corpus gerado.")
+@click.option("--seed", default=42, type=int, show_default=True)
+@click.option("--regenerate", is_flag=True, default=False, help="Regera o corpus mesmo se já existir.")
+@click.option("--stages", default=",".join(STAGES), show_default=True, help="Estágios separados por vírgula.")
+@click.option("--retrieval-modes", default="dense,lexical,hybrid", show_default=True)
+@click.option("--k", default=5, type=int, show_default=True)
+@click.option("--generate", is_flag=True, default=False, help="Mede também a geração de respostas (LLM).")
+@click.option("--generate-queries", default=5, type=int, show_default=True, help="Perguntas respondidas pelo LLM.")
+@click.option("--max-tokens", default=128, type=int, show_default=True)
+@click.option("--online", is_flag=True, default=False, help="Permite downloads do Hugging Face Hub.")
+@click.option("--output", default="data/bench/results.json", show_default=True, type=click.Path(dir_okay=False))
+@click.option("--baseline", default=None, type=click.Path(exists=True, dir_okay=False), help="Resultados anteriores.")
+@click.option("--threshold", default=0.10, type=float, show_default=True, help="Regressão relativa tolerada.")
+def main(
+    corpus_dir, workdir, scale, seed, regenerate, stages, retrieval_modes, k,
+    generate, generate_queries, max_tokens, online, output, baseline, threshold,
+):
+    stages = [s.strip() for s in stages.split(",") if s.strip()]
+    invalid = [s for s in stages if s not in STAGES]
+    if invalid:
+        raise click.BadParameter(f"Estágios inválidos: {invalid}. Use {STAGES}.")
+
+    if not online:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    manifest_path = Path(corpus_dir) / "corpus_manifest.json"
+    manifest = None
+    if manifest_path.exists() and not regenerate:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest.get("scale"), manifest.get("seed")) != (scale, seed):
+            print(
+                f"[Bench] Corpus existente tem escala {manifest.get('scale')} e semente {manifest.get('seed')}; "
+                f"regerando com escala {scale} e semente {seed}."
+            )
+            manifest = None
+    if manifest is None:
+        if Path(corpus_dir).exists():
+            shutil.rmtree(corpus_dir)
+        print(f"[Bench] Gerando corpus sintético (escala {scale}, semente {seed})...")
+        manifest = generate_corpus(corpus_dir, scale=scale, seed=seed)
+
+    layout = workdir_layout(workdir, corpus_dir)
+    options = {
+        "retrieval_modes": [m.strip() for m in retrieval_modes.split(",") if m.strip()],
+        "k": k,
+        "generate": generate,
+        "generate_queries": generate_queries,
+        "max_tokens": max_tokens,
+    }
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": {key: manifest[key] for key in ("seed", "scale", "counts", "queries", "bytes")},
+            "options": options,
+        },
+        "stages": {},
+    }
+
+    for stage in stages:
+        print(f"\n[Bench] Estágio: {stage}")
+        _reset_outputs(stage, layout)
+        results["stages"].update(run_stage(stage, layout, options))
+
+    print(f"\n{'estágio':<16} {'tempo(s)':>9} {'vazão':>16} {'p95(ms)':>9} {'pico RSS(MB)':>13}")
+    for name, metrics in results["stages"].items():
+        rate_key = next((key for key in metrics if key.endswith("_per_s")), None)
+        rate = f"{metrics[rate_key]:.2f} {rate_key[:-6]}/s" if rate_key else "-"
+        p95 = f"{metrics['latency_p95_ms']:.1f}" if "latency_p95_ms" in metrics else "-"
+        print(f"{name:<16} {metrics['seconds']:>9.2f} {rate:>16} {p95:>9} {metrics['peak_rss_mb']:>13.0f}")
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"✅ Resultados salvos em {output}")
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            rows = compare_results(results, json.load(f), threshold)
+        print_comparison(rows, threshold)
+        if any(row["status"] == "regression" for row in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Gerador de corpus sintético e reprodutível (mesma semente -> mesmo conteúdo)
+para os benchmarks do pipeline. Não usa rede.
+
+Tipos gerados, em tamanhos e idiomas (pt, en, es) variados:
+- PDFs com texto embutido e PDFs escaneados (só imagem, exigem OCR)
+- Imagens PNG/JPG com texto renderizado
+- DOCX (OOXML mínimo, escrito sem dependências extras)
+- Notas de texto (.txt) e notas markdown (.md, estilo Obsidian)
+
+As notas .md vão para `notes/`: a extração não lê markdown, então o benchmark
+as copia direto para a pasta de entrada da transformação.
+
+Exemplo:
+    python -m benchmarks.synthetic_corpus --output data/bench/corpus --scale 2
+"""
+import io
+import json
+import random
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+import click
+
+VOCABULARY = {
+    "pt": (
+        "conhecimento memória nota livro capítulo ideia projeto aprendizado modelo dados pesquisa "
+        "análise sistema processo resultado estudo leitura resumo conceito método prática hábito "
+        "tempo trabalho equipe decisão problema solução pergunta resposta contexto exemplo"
+    ).split(),
+    "en": (
+        "knowledge memory note book chapter idea project learning model data research analysis "
+        "system process result study reading summary concept method practice habit time work "
+        "team decision problem solution question answer context example"
+    ).split(),
+    "es": (
+        "conocimiento memoria nota libro capítulo idea proyecto aprendizaje modelo datos "
+        "investigación análisis sistema proceso resultado estudio lectura resumen concepto método "
+        "práctica hábito tiempo trabajo equipo decisión problema solución pregunta respuesta"
+    ).split(),
+}
+
+CONNECTORS = {
+    "pt": ["e", "com", "sobre", "para", "de", "no", "na"],
+    "en": ["and", "with", "about", "for", "of", "in", "on"],
+    "es": ["y", "con", "sobre", "para", "de", "en", "del"],
+}
+
+# Parágrafos por documento em cada faixa de tamanho
+SIZES = {"small": (1, 3), "medium": (4, 10), "large": (12, 30)}
+
+# Documentos de cada tipo por unidade de escala
+DOCUMENTS_PER_SCALE = {
+    "text_pdf": 4,
+    "scanned_pdf": 2,
+    "png": 2,
+    "jpg": 2,
+    "docx": 3,
+    "txt": 3,
+    "md": 20,
+}
+
+def sentence(rng: random.Random, lang: str) -> str:
+    words = VOCABULARY[lang]
+    connectors = CONNECTORS[lang]
+    tokens = []
+    for i in range(rng.randint(6, 16)):
+        tokens.append(rng.choice(connectors) if i % 3 == 2 else rng.choice(words))
+    return " ".join(tokens).capitalize() + "."
+
+def paragraph(rng: random.Random, lang: str) -> str:
+    return " ".join(sentence(rng, lang) for _ in range(rng.randint(2, 6)))
+
+def document_text(rng: random.Random, lang: str, size: str) -> List[str]:
+    low, high = SIZES[size]
+    return [paragraph(rng, lang) for _ in range(rng.randint(low, high))]
+
+def render_text_image(paragraphs: List[str], width: int = 1240, line_height: int = 28):
+    """Renderiza o texto em uma imagem em tons de cinza (simula página escaneada)."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=22)
+    except TypeError:
+        font = ImageFont.load_default()
+
+    lines = []
+    for text in paragraphs:
+        words, current = text.split(), ""
+        for word in words:
+            candidate = f"{current} {word}".strip()
+            if len(candidate) > 80:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        lines.extend([current, ""])
+
+    image = Image.new("L", (width, max(line_height * (len(lines) + 2), 200)), color=255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, 20 + i * line_height), line, fill=0, font=font)
+    return image
+
+def write_text_pdf(path: Path, paragraphs: List[str]):
+    import fitz
+
+    doc = fitz.open()
+    # Uma página a cada 4 parágrafos, para variar o número de páginas
+    for i in range(0, len(paragraphs), 4):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paragraphs[i:i + 4]), fontsize=11)
+    doc.save(str(path))
+
+def write_scanned_pdf(path: Path, paragraphs: List[str]):
+    import fitz
+
+    doc = fitz.open()
+    for i in range(0, len(paragraphs), 4):
+        buffer = io.BytesIO()
+        render_text_image(paragraphs[i:i + 4]).save(buffer, format="PNG")
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(str(path))
+
+def write_image(path: Path, paragraphs: List[str]):
+    image = render_text_image(paragraphs)
+    if path.suffix == ".jpg":
+        image.convert("RGB").save(path, format="JPEG", quality=90)
+    else:
+        image.save(path, format="PNG")
+
+def write_docx(path: Path, paragraphs: List[str]):
+    """DOCX mínimo válido (content types, relações e document.xml)."""
+    body = "".join(f"<w:p><w:r><w:t>{escape(text)}</w:t></w:r></w:p>" for text in paragraphs)
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/>'
+            "</Relationships>"
+        ),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"
+        ),
+    }
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            # Data fixa: o arquivo sai idêntico a cada geração
+            zf.writestr(zipfile.ZipInfo(name, date_time=(2024, 1, 1, 0, 0, 0)), content)
+
+def write_markdown(path: Path, paragraphs: List[str], rng: random.Random, lang: str, links: List[str]):
+    title = " ".join(rng.choice(VOCABULARY[lang]) for _ in range(3)).title()
+    lines = [f"# {title}", ""]
+    for i, text in enumerate(paragraphs):
+        if i and i % 3 == 0:
+            lines += [f"## {rng.choice(VOCABULARY[lang]).title()}", ""]
+        lines += [text, ""]
+        if rng.random() < 0.3:
+            lines += [f"- {sentence(rng, lang)}" for _ in range(rng.randint(2, 4))] + [""]
+    if links:
+        lines.append(" ".join(f"[[{link}]]" for link in rng.sample(links, min(3, len(links)))))
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+def generate_corpus(output_dir: str, scale: int = 1, seed: int = 42, queries: int = 50) -> Dict:
+    """
+    Gera o corpus em `output_dir/documents` (entrada da extração) e
+    `output_dir/notes` (markdown), além de perguntas em `queries.jsonl`.
+
+    Returns:
+        dict: Manifesto do corpus (também salvo em `corpus_manifest.json`).
+    """
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    documents_dir = output_dir / "documents"
+    notes_dir = output_dir / "notes"
+    documents_dir.mkdir(parents=True, exist_ok=True)
+    notes_dir.mkdir(parents=True, exist_ok=True)
+
+    writers = {
+        "text_pdf": (".pdf", write_text_pdf),
+        "scanned_pdf": (".pdf", write_scanned_pdf),
+        "png": (".png", write_image),
+        "jpg": (".jpg", write_image),
+        "docx": (".docx", write_docx),
+        "txt": (".txt", lambda path, paragraphs: path.write_text("\n\n".join(paragraphs), encoding="utf-8")),
+    }
+
+    files = []
+    sentences = []
+    note_names = [f"note_{i:04d}" for i in range(DOCUMENTS_PER_SCALE["md"] * scale)]
+    for kind, per_scale in DOCUMENTS_PER_SCALE.items():
+        for i in range(per_scale * scale):
+            lang = rng.choice(list(VOCABULARY))
+            size = rng.choices(list(SIZES), weights=[5, 3, 1])[0]
+            # Imagens e páginas escaneadas ficam curtas: o custo de OCR cresce com a área
+            if kind in ("png", "jpg", "scanned_pdf"):
+                size = "small"
+            paragraphs = document_text(rng, lang, size)
+            sentences.extend(paragraphs[0].split(". ")[:2])
+
+            if kind == "md":
+                path = notes_dir / f"{note_names[i]}.md"
+                write_markdown(path, paragraphs, rng, lang, note_names)
+            else:
+                extension, writer = writers[kind]
+                path = documents_dir / f"{kind}_{i:04d}{extension}"
+                writer(path, paragraphs)
+            files.append({"path": str(path.relative_to(output_dir)), "kind": kind, "lang": lang, "size": size})
+
+    with open(output_dir / "queries.jsonl", "w", encoding="utf-8") as f:
+        for i, text in enumerate(rng.sample(sentences, min(queries, len(sentences)))):
+            f.write(json.dumps({"id": i, "question": text.rstrip(".")}, ensure_ascii=False) + "\n")
+
+    counts = {}
+    for entry in files:
+        counts[entry["kind"]] = counts.get(entry["kind"], 0) + 1
+    manifest = {
+        "seed": seed,
+        "scale": scale,
+        "counts": counts,
+        "queries": min(queries, len(sentences)),
+        "bytes": sum((output_dir / entry["path"]).stat().st_size for entry in files),
+        "files": files,
+    }
+    with open(output_dir / "corpus_manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+@click.command(help="Gera um corpus sintético reprodutível para benchmarks.")
+@click.option("--output", "output_dir", default="data/bench/corpus", show_default=True)
+@click.option("--scale", default=1, type=int, show_default=True, help="Multiplica o número de documentos.")
+@click.option("--seed", default=42, type=int, show_default=True)
+@click.option("--queries", default=50, type=int, show_default=True)
+def main(output_dir, scale, seed, queries):
+    manifest = generate_corpus(output_dir, scale=scale, seed=seed, queries=queries)
+    print(f"✅ Corpus gerado em {output_dir}: {manifest['counts']} ({manifest['bytes'] / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,25 @@
-
+from etl.extract.ocr_cache import get_ocr_cache
+from etl.extract.ocr_files import shutdown_ocr_pool
 from etl.extract.smart_loader import load_document
 
-def run_extraction(paths: list[str]):
+def run_extraction(paths: list[str], output_dir: str = None, manifest=None):
     print("\n🟢 Iniciando extração...")
     for path in paths:
-        load_document(path)
\ No newline at end of file
+        if output_dir:
+            load_document(path, output_dir=output_dir, manifest=manifest)
+        else:
+            load_document(path, manifest=manifest)
+    shutdown_ocr_pool()
+
+    cache = get_ocr_cache()
+    if cache:
+        stats = cache.stats()
+        run = stats["run"]
+        print(
+            f"[OCR cache] Nesta execução: {run['hits']} acertos, {run['misses']} erros "
+            f"(taxa {run['hit_rate']:.0%}), ~{run['saved_seconds']}s de OCR economizados."
+        )
+        print(
+            f"[OCR cache] Total: {stats['entries']} entradas ({stats['size_mb']} MB), "
+            f"taxa de acerto {stats['hit_rate']:.0%}, ~{stats['saved_seconds']}s economizados."
+        )
@@ -1,6 +1,7 @@
 from pathlib import Path
 from langchain_community.document_loaders import TextLoader
 from etl.extract.ocr_files import save_text_output
+from utils.instrumentation import incr
 
 def load_text_with_loader(file_path, ext, supported_extensions, output_dir=None):
     """
@@ -24,6 +25,7 @@ def load_text_with_loader(file_path, ext, supported_extensions, output_dir=None)
 
         if cached_file.exists():
             print(f"[SKIP] Já processado: {file_path.name}")
+            incr("extract_cache_hits", kind="loader")
             return cached_file.read_text(encoding="utf-8")
 
     loader_class = supported_extensions.get(ext)
@@ -64,6 +66,7 @@ def load_non_pdf_text(file_path: str, loader_class, output_dir: Path = None) ->
 
         if cached_file.exists():
             print(f"[SKIP] Já processado: {file_path.name}")
+            incr("extract_cache_hits", kind="loader")
             return cached_file.read_text(encoding="utf-8")
 
     print(f"[Loader] Texto estruturado: {file_path.name}")
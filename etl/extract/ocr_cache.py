@@ -0,0 +1,255 @@
+"""
+Cache de OCR endereçado por conteúdo, compartilhado entre documentos,
+execuções e processos (workers do pool de OCR).
+
+A chave é o hash dos pixels da imagem enviada ao EasyOCR (mais dimensões e
+idiomas): capas escaneadas, timbres, prints colados em várias notas e PDFs
+duplicados com outro nome saem do cache sem passar pelo OCR. Opcionalmente
+(`MYMIND_OCR_CACHE_PERCEPTUAL=1`), renders quase idênticos também acertam:
+os candidatos são os de mesmo dHash 64 bits e a imagem só é aceita se a
+miniatura em tons de cinza for praticamente igual (média e pior bloco).
+
+Guarda texto, caixas e confiança em SQLite (WAL), com teto de tamanho e
+remoção dos menos usados recentemente.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_CACHE_PATH = "./data/output/cache/ocr_cache.sqlite"
+DEFAULT_MAX_MB = 512
+# Fração do teto mantida após uma remoção (evita remover a cada inserção)
+EVICT_TARGET_RATIO = 0.9
+# Inserções entre verificações de tamanho
+EVICT_CHECK_EVERY = 100
+# Miniatura usada na verificação de quase-igualdade
+THUMB_SIZE = 96
+THUMB_BLOCK = 12
+PERCEPTUAL_MAX_MEAN_DIFF = 2.0
+PERCEPTUAL_MAX_BLOCK_DIFF = 8.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_cache (
+    key TEXT PRIMARY KEY,
+    dhash INTEGER,
+    width INTEGER,
+    height INTEGER,
+    langs TEXT,
+    results TEXT,
+    confidence REAL,
+    seconds REAL,
+    thumb BLOB,
+    size INTEGER,
+    hits INTEGER DEFAULT 0,
+    created_at REAL,
+    last_used_at REAL
+);
+CREATE INDEX IF NOT EXISTS ocr_cache_dhash ON ocr_cache (dhash, langs);
+CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used_at);
+CREATE TABLE IF NOT EXISTS ocr_cache_counters (
+    name TEXT PRIMARY KEY,
+    value REAL DEFAULT 0
+);
+"""
+
+def _gray(image: np.ndarray) -> Image.Image:
+    return Image.fromarray(image).convert("L") if image.ndim == 3 else Image.fromarray(image)
+
+def content_key(image: np.ndarray, langs: List[str]) -> str:
+    """Hash dos pixels (com forma, tipo e idiomas)."""
+    digest = hashlib.sha1(np.ascontiguousarray(image).tobytes())
+    digest.update(f"{image.shape}|{image.dtype}|{','.join(sorted(langs))}".encode())
+    return digest.hexdigest()
+
+def dhash(image: np.ndarray) -> int:
+    """dHash de 64 bits (gradiente horizontal de uma miniatura 9x8), como inteiro com sinal do SQLite."""
+    small = np.asarray(_gray(image).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    value = int("".join("1" if bit else "0" for bit in bits), 2)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def thumbnail(image: np.ndarray) -> np.ndarray:
+    return np.asarray(_gray(image).resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR), dtype=np.uint8)
+
+def _near_identical(a: np.ndarray, b: np.ndarray) -> bool:
+    diff = np.abs(a.astype(np.int16) - b.astype(np.int16)).astype(np.float32)
+    blocks = diff.reshape(THUMB_SIZE // THUMB_BLOCK, THUMB_BLOCK, THUMB_SIZE // THUMB_BLOCK, THUMB_BLOCK).mean(axis=(1, 3))
+    return diff.mean() <= PERCEPTUAL_MAX_MEAN_DIFF and blocks.max() <= PERCEPTUAL_MAX_BLOCK_DIFF
+
+def _serialize_results(results) -> str:
+    return json.dumps(
+        [[[[float(x), float(y)] for x, y in box], text, float(conf)] for box, text, conf in results],
+        ensure_ascii=False,
+    )
+
+class OCRCache:
+    """Cache persistente de resultados do EasyOCR (thread-safe; um por processo)."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_mb: float = DEFAULT_MAX_MB, perceptual: bool = False):
+        self.path = path
+        self.max_bytes = int(max_mb * 2**20)
+        self.perceptual = perceptual
+        self._lock = threading.Lock()
+        self._puts = 0
+        # Consultas desta execução, registradas pelo processo principal (`record`)
+        self.session = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Cada worker de OCR raramente chega a EVICT_CHECK_EVERY inserções: confere na abertura
+        self.enforce_limit()
+
+    def get(self, image: np.ndarray, langs: List[str]) -> Optional[Dict]:
+        """
+        Resultado em cache para a imagem, ou None.
+
+        Returns:
+            dict: {"results": [(caixa, texto, confiança)], "confidence", "seconds", "match"}
+            com `match` "exact" ou "perceptual".
+        """
+        key = content_key(image, langs)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, results, confidence, seconds FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            match = "exact"
+            if row is None and self.perceptual:
+                thumb = thumbnail(image)
+                ratio = image.shape[1] / image.shape[0]
+                for candidate in self._conn.execute(
+                    "SELECT key, results, confidence, seconds, thumb, width, height FROM ocr_cache "
+                    "WHERE dhash = ? AND langs = ?",
+                    (dhash(image), ",".join(sorted(langs))),
+                ):
+                    same_shape = abs(candidate[5] / candidate[6] - ratio) <= 0.02 * ratio
+                    stored = np.frombuffer(candidate[4], dtype=np.uint8).reshape(THUMB_SIZE, THUMB_SIZE)
+                    if same_shape and _near_identical(thumb, stored):
+                        row, match = candidate[:4], "perceptual"
+                        break
+            if row is None:
+                self._bump("misses")
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE ocr_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?", (time.time(), row[0])
+            )
+            self._bump("hits")
+            self._bump("saved_seconds", row[3] or 0.0)
+            self._conn.commit()
+        results = [(box, text, conf) for box, text, conf in json.loads(row[1])]
+        return {"results": results, "confidence": row[2], "seconds": row[3], "match": match}
+
+    def put(self, image: np.ndarray, langs: List[str], results, seconds: float, confidence: Optional[float] = None):
+        """Guarda o resultado do OCR da imagem (`seconds`: custo economizado em cada acerto)."""
+        serialized = _serialize_results(results)
+        thumb = thumbnail(image).tobytes() if self.perceptual else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache "
+                "(key, dhash, width, height, langs, results, confidence, seconds, thumb, size, hits, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (
+                    content_key(image, langs), dhash(image), image.shape[1], image.shape[0],
+                    ",".join(sorted(langs)), serialized, confidence, seconds, thumb,
+                    len(serialized.encode("utf-8")) + (len(thumb) if thumb else 0), now, now,
+                ),
+            )
+            self._conn.commit()
+            self._puts += 1
+            if self._puts % EVICT_CHECK_EVERY == 0:
+                self._evict()
+
+    def _bump(self, name: str, value: float = 1):
+        self._conn.execute(
+            "INSERT INTO ocr_cache_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, value),
+        )
+
+    def record(self, hit: bool, saved_seconds: float = 0.0):
+        """Conta uma consulta desta execução (inclusive as feitas nos workers de OCR)."""
+        with self._lock:
+            self.session["hits" if hit else "misses"] += 1
+            self.session["saved_seconds"] += saved_seconds if hit else 0.0
+
+    def enforce_limit(self):
+        """Remove as entradas menos usadas se o cache passou do teto de tamanho."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * EVICT_TARGET_RATIO)
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_used_at"):
+            if freed >= target:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", doomed)
+        self._conn.commit()
+        print(f"[OCR cache] {len(doomed)} entradas removidas ({freed / 2**20:.1f} MB).")
+
+    def stats(self) -> Dict:
+        """
+        Totais persistentes (entradas, tamanho, acertos, erros, taxa de acerto e
+        segundos de OCR economizados) e os da execução atual em `run`.
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM ocr_cache_counters"))
+            session = dict(self.session)
+        return {
+            "entries": entries,
+            "size_mb": round(size / 2**20, 2),
+            **_lookup_summary(counters),
+            "run": _lookup_summary(session),
+        }
+
+def _lookup_summary(counters: Dict) -> Dict:
+    hits, misses = int(counters.get("hits", 0)), int(counters.get("misses", 0))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "saved_seconds": round(counters.get("saved_seconds", 0.0), 1),
+    }
+
+_cache: Optional[OCRCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """
+    Cache do processo, configurado por ambiente (herdado pelos workers):
+    MYMIND_OCR_CACHE=0 desativa, MYMIND_OCR_CACHE_PATH, MYMIND_OCR_CACHE_MB e
+    MYMIND_OCR_CACHE_PERCEPTUAL=1.
+    """
+    global _cache, _cache_pid
+    if os.environ.get("MYMIND_OCR_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    with _cache_lock:
+        # Conexões SQLite não podem atravessar fork: workers abrem a sua
+        if _cache is None or _cache_pid != os.getpid():
+            _cache_pid = os.getpid()
+            _cache = OCRCache(
+                path=os.environ.get("MYMIND_OCR_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_mb=float(os.environ.get("MYMIND_OCR_CACHE_MB", DEFAULT_MAX_MB)),
+                perceptual=os.environ.get("MYMIND_OCR_CACHE_PERCEPTUAL", "").lower() in ("1", "true", "yes"),
+            )
+    return _cache
@@ -4,10 +4,20 @@ import torch
 import logging
 import time
 import fitz
+import atexit
+import threading
+import multiprocessing
 from pathlib import Path
 from PIL import Image
-from io import BytesIO
-from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from utils.instrumentation import span, incr, record_span
+from utils.profiling import profile_worker
+from utils.resources import get_governor, init_worker, worker_memory_mb
+from etl.extract.ocr_cache import get_ocr_cache
+from etl.extract.page_render import (
+    MAX_SCALE, MIN_CONFIDENCE, RETRY_SCALE_FACTOR, mean_confidence, plan_page, render_for_ocr
+)
 
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
@@ -65,13 +75,28 @@ def read_text_from_image(image_input, output_dir: Path = None, image_name=None)
         output_file = output_dir / f"{image_path.stem}_ocr.md"
         if output_file.exists():
             print(f"[SKIP] OCR já existe: {output_file.name}")
+            incr("extract_cache_hits", kind="ocr_image")
             return output_file.read_text(encoding='utf-8')
 
     # Executa OCR
     logging.info(f"[OCR] Processando: {image_path.name if image_path else 'imagem sem nome'}")
 
-    reader = create_easyocr_reader(['pt', 'en'])
-    results = reader.readtext(img_np)
+    langs = ['pt', 'en']
+    cache = get_ocr_cache()
+    cached = cache.get(img_np, langs) if cache else None
+    if cached:
+        results = cached["results"]
+        _count_cache_lookup(cache, cached["match"], cached["seconds"])
+    else:
+        start = time.perf_counter()
+        with span("ocr.image"):
+            reader = create_easyocr_reader(langs)
+            results = reader.readtext(img_np)
+        incr("pages_ocr", kind="image")
+        if cache:
+            _count_cache_lookup(cache)
+            cache.put(img_np, langs, results, time.perf_counter() - start, mean_confidence(results))
+            cache.enforce_limit()
 
     text = " ".join([word for _, word, _ in results])
 
@@ -104,57 +129,210 @@ def save_text_output(text: str, source_path, output_dir: Path) -> Path:
     logging.info(f"[OK] Texto salvo em: {output_file}")
     return output_file
 
-def _ocr_page_bytes(i, image_bytes, langs, force_cpu):
-    start = time.perf_counter()
-    reader = easyocr.Reader(langs, gpu=not force_cpu)
-    png = BytesIO(image_bytes)
-    img = Image.open(png).convert("L")
-    text = " ".join([w for _, w, _ in reader.readtext(np.array(img))])
-    return i, text, time.perf_counter() - start
+def _count_cache_lookup(cache, match: str = None, saved_seconds: float = None):
+    """Registra no processo principal uma consulta ao cache de OCR (`match` None = erro)."""
+    if cache is None:
+        return
+    cache.record(match is not None, saved_seconds or 0.0)
+    if match:
+        incr("ocr_cache_hits", kind=match)
+        incr("ocr_seconds_saved", round(saved_seconds or 0.0, 3))
+    else:
+        incr("ocr_cache_misses")
+
+# Pool de OCR do processo e, em cada worker, os leitores EasyOCR já carregados
+_pool = None
+_pool_gpu = None
+_pool_lock = threading.Lock()
+_worker_readers = {}
+_worker_force_cpu = False
+
+def _init_ocr_worker(threads: int, langs, force_cpu: bool):
+    """`initializer` do pool de OCR: limita as threads e carrega o EasyOCR uma vez por worker."""
+    global _worker_force_cpu
+    init_worker(threads)
+    _worker_force_cpu = force_cpu
+    _worker_reader(langs)
+
+def _worker_reader(langs) -> easyocr.Reader:
+    key = tuple(langs)
+    if key not in _worker_readers:
+        _worker_readers[key] = easyocr.Reader(list(langs), gpu=not _worker_force_cpu)
+    return _worker_readers[key]
+
+def get_ocr_pool(gpu: bool = False) -> ProcessPoolExecutor:
+    """
+    Pool de OCR compartilhado pela execução, com `ocr_budget` workers criados
+    sob demanda e reaproveitados entre documentos. Usa spawn: o pool pode ser
+    criado de threads (pipeline em streaming) com o torch já rodando no
+    processo, e um fork nesse estado pode travar os filhos.
+    """
+    global _pool, _pool_gpu
+    with _pool_lock:
+        if _pool is not None and _pool_gpu != gpu:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=get_governor().ocr_budget(gpu),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker,
+                initargs=(1, ['pt', 'en'], not gpu),
+            )
+            _pool_gpu = gpu
+        return _pool
+
+def _replace_broken_pool(pool: ProcessPoolExecutor, gpu: bool) -> ProcessPoolExecutor:
+    """Descarta o pool se um worker morreu (ele não aceita mais tarefas) e devolve um novo."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+    return get_ocr_pool(gpu)
 
-def convert_pdf_to_text(pdf_path: str, output_dir: str, langs=['pt','en'], force_cpu=False) -> str:
+def shutdown_ocr_pool():
+    """Encerra o pool de OCR (fim da extração); o próximo documento cria outro."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+atexit.register(shutdown_ocr_pool)
+
+def _ocr_page(i, pdf_path, plan, langs):
+    # Roda no pool de processos: perfilado quando o passo de extração usa --profile.
+    # Só recebe páginas que não estão no cache (consultado no processo principal)
+    with profile_worker(f"ocr_page{i}"):
+        start = time.perf_counter()
+        with fitz.open(pdf_path) as doc:
+            page = doc[i - 1]
+            image = render_for_ocr(page, plan)
+            reader = _worker_reader(langs)
+            first_image = image
+            results = reader.readtext(image)
+            confidence = mean_confidence(results)
+            stats = {"pixels": image.size, "scale": plan["scale"], "confidence": confidence, "retried": False}
+
+            # Confiança baixa: tenta de novo com mais resolução e fica com o melhor resultado
+            if confidence < MIN_CONFIDENCE and plan["scale"] < MAX_SCALE:
+                scale = min(MAX_SCALE, plan["scale"] * RETRY_SCALE_FACTOR)
+                image = render_for_ocr(page, plan, scale=scale)
+                retry = reader.readtext(image)
+                stats["pixels"] += image.size
+                stats["retried"] = True
+                if mean_confidence(retry) > confidence:
+                    results = retry
+                    stats.update(scale=scale, confidence=mean_confidence(retry))
+
+        elapsed = time.perf_counter() - start
+        # Chave é o primeiro render: a próxima vez acerta antes de qualquer nova tentativa
+        cache = get_ocr_cache()
+        if cache:
+            cache.put(first_image, langs, results, elapsed, stats["confidence"])
+        text = " ".join([w for _, w, _ in results])
+        return i, text, elapsed, worker_memory_mb(), stats
+
+def convert_pdf_to_text(
+    pdf_path: str, output_dir: str, langs=['pt','en'], force_cpu=False, preprocess: dict = None
+) -> str:
+    """
+    Extrai o texto de um PDF: texto nativo quando a página tem, OCR nas demais.
+    Páginas para OCR passam pela rasterização adaptativa (`page_render`):
+    páginas em branco são puladas e a escala, o recorte e o deskew são
+    escolhidos por página. `preprocess` sobrescreve `PREPROCESS_DEFAULTS`
+    (crop, deskew, contrast, binarize).
+    """
     pdf_path = Path(pdf_path)
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True, parents=True)
     out_md = output_dir / f"{pdf_path.stem}_ocr.md"
     if out_md.exists():
         logging.info(f"[SKIP] já existe: {out_md.name}")
+        incr("extract_cache_hits", kind="ocr_pdf")
         return out_md.read_text(encoding='utf-8')
 
     doc = fitz.open(str(pdf_path))
     page_texts = []
     ocr_jobs = []
+    native_pages = 0
+    cache = get_ocr_cache()
 
-    # 1) extração nativa
+    # 1) extração nativa; páginas sem texto recebem um plano de rasterização e
+    #    são procuradas no cache aqui, sem subir workers para elas
     for i, page in enumerate(doc, 1):
         text = page.get_text().strip()
         if text:
             page_texts.append((i, text))
-        else:
-            pix = page.get_pixmap(matrix=fitz.Matrix(1,1), colorspace=fitz.csGRAY)
-            ocr_jobs.append((i, pix.tobytes()))
+            native_pages += 1
+            continue
+        plan = plan_page(page, preprocess)
+        if plan is None:
+            incr("pages_blank")
+            continue
+        # Fora do cache, o render é descartado (o worker renderiza de novo): manter
+        # as imagens de todas as páginas pendentes custaria mais memória que o render
+        cached = cache.get(render_for_ocr(page, plan), langs) if cache else None
+        if cached:
+            _count_cache_lookup(cache, cached["match"], cached["seconds"])
+            page_texts.append((i, " ".join([w for _, w, _ in cached["results"]])))
+            logging.info(f"Pág {i} OCR do cache ({cached['match']})")
+            continue
+        _count_cache_lookup(cache)
+        ocr_jobs.append((i, plan))
+
+    doc.close()
+    incr("pages_native", native_pages)
 
     # 2) OCR apenas nas páginas sem texto
     if ocr_jobs:
         can_gpu = torch.cuda.is_available() and not force_cpu
-        max_workers = 2 if can_gpu else min(8, len(ocr_jobs))
-        logging.info(f"OCR em {len(ocr_jobs)} páginas → workers={max_workers}, gpu={can_gpu}")
-
-        with ProcessPoolExecutor(max_workers=max_workers) as exe:
-            futures = {
-                exe.submit(_ocr_page_bytes, i, img_bytes, langs, not can_gpu): i
-                for i, img_bytes in ocr_jobs
-            }
-            for fut in as_completed(futures):
-                i = futures[fut]
-                try:
-                    i, text, elapsed = fut.result(timeout=120)
-                    logging.info(f"Pág {i} OCR em {elapsed:.2f}s")
-                    page_texts.append((i, text))
-                except TimeoutError:
-                    logging.error(f"[TIMEOUT] OCR pág {i}")
-                except Exception as e:
-                    logging.error(f"[ERRO] OCR pág {i}: {e}")
+        governor = get_governor()
+        # Workers limitados por núcleos livres e memória medida; 1 thread de torch por worker
+        governor.wait_for_memory(governor.worker_memory_mb["ocr"])
+        pool = get_ocr_pool(gpu=can_gpu)
+        # O pool é da execução: a reserva do governador limita as páginas deste documento em voo
+        with governor.ocr_workers(len(ocr_jobs), gpu=can_gpu) as max_workers:
+            logging.info(f"OCR em {len(ocr_jobs)} páginas → workers={max_workers}, gpu={can_gpu}")
+            pending = list(ocr_jobs)
+            futures = {}
+            while pending or futures:
+                while pending and len(futures) < max_workers:
+                    i, plan = pending.pop(0)
+                    futures[pool.submit(_ocr_page, i, str(pdf_path), plan, langs)] = i
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i = futures.pop(fut)
+                    try:
+                        i, text, elapsed, worker_mb, stats = fut.result(timeout=120)
+                        logging.info(
+                            f"Pág {i} OCR em {elapsed:.2f}s (escala {stats['scale']:.2f}, "
+                            f"confiança {stats['confidence']:.2f}{', nova tentativa' if stats['retried'] else ''})"
+                        )
+                        page_texts.append((i, text))
+                        incr("ocr_pixels", stats["pixels"])
+                        if stats["retried"]:
+                            incr("ocr_retries")
+                        governor.record_worker_memory("ocr", worker_mb)
+                        # Medido dentro do worker: registrado aqui, no processo principal
+                        record_span("ocr.page", elapsed, page=i, file=pdf_path.name)
+                        incr("pages_ocr", kind="pdf")
+                    except TimeoutError:
+                        logging.error(f"[TIMEOUT] OCR pág {i}")
+                        incr("ocr_errors", reason="timeout")
+                    except BrokenProcessPool:
+                        # Worker morto (ex.: OOM): as páginas restantes vão para um pool novo
+                        logging.error(f"[ERRO] OCR pág {i}: worker de OCR encerrado")
+                        incr("ocr_errors", reason="worker_died")
+                        pool = _replace_broken_pool(pool, can_gpu)
+                    except Exception as e:
+                        logging.error(f"[ERRO] OCR pág {i}: {e}")
+                        incr("ocr_errors", reason="error")
+
+        # Inserções vêm dos workers do pool: o teto é conferido aqui
+        if cache:
+            cache.enforce_limit()
 
     # 3) monta e salva
     page_texts.sort(key=lambda x: x[0])
@@ -0,0 +1,167 @@
+"""
+Rasterização adaptativa de páginas escaneadas para o OCR.
+
+Em vez de renderizar toda página sem texto a 72 dpi (`fitz.Matrix(1, 1)`),
+cada página passa por uma sonda barata em baixa resolução que:
+
+- descarta páginas em branco (nada a reconhecer);
+- estima a altura das linhas de texto e escolhe a escala que leva os glifos a
+  ~TARGET_LINE_PX pixels (letra miúda sobe de resolução, texto grande desce);
+- recorta as margens vazias e limita o total de pixels por página;
+- estima a inclinação (deskew) pela variância da projeção horizontal.
+
+O worker de OCR renderiza com esse plano, aplica o pré-processamento barato
+(rotação, contraste, binarização opcional) e só renderiza de novo, em escala
+maior, se a confiança média do EasyOCR ficar abaixo de MIN_CONFIDENCE.
+"""
+from typing import Dict, Optional, Tuple
+
+import fitz
+import numpy as np
+from PIL import Image, ImageOps
+
+# Sonda: 72 dpi em tons de cinza
+PROBE_SCALE = 1.0
+# Altura desejada (px) da faixa de uma linha de texto na imagem enviada ao OCR
+TARGET_LINE_PX = 24
+# Escala quando não há linhas mensuráveis (ex: figura com pouco texto)
+DEFAULT_SCALE = 2.0
+MIN_SCALE, MAX_SCALE = 1.0, 4.0
+# Teto de pixels por página renderizada
+MAX_PIXELS = 12_000_000
+# Fração mínima de pixels escuros para a página não ser considerada em branco
+BLANK_INK_RATIO = 0.001
+# Folga (pontos) ao recortar as margens
+MARGIN_PADDING_PT = 12
+# Deskew: ângulos avaliados (graus) e pixels escuros amostrados
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.25
+DESKEW_SAMPLE = 20000
+# Nova tentativa em escala maior quando a confiança média fica abaixo disto
+MIN_CONFIDENCE = 0.55
+RETRY_SCALE_FACTOR = 1.6
+
+PREPROCESS_DEFAULTS = {"crop": True, "deskew": True, "contrast": True, "binarize": False}
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Limiar de Otsu de uma imagem uint8: pixels `<= limiar` são tinta."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if not total:
+        return 128
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+def estimate_line_height(mask: np.ndarray) -> Optional[float]:
+    """
+    Altura típica (px) das faixas de texto pela projeção horizontal da máscara
+    de tinta. Usa o 25º percentil: parágrafos com entrelinha apertada podem
+    fundir linhas em faixas maiores.
+    """
+    rows = mask.mean(axis=1) > 0.005
+    if not rows.any():
+        return None
+    # Comprimentos das sequências de linhas com tinta
+    edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+    runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    runs = runs[runs >= 2]
+    return float(np.percentile(runs, 25)) if len(runs) else None
+
+def estimate_skew(mask: np.ndarray, seed: int = 0) -> float:
+    """Ângulo (graus) que maximiza a variância da projeção horizontal dos pixels de tinta."""
+    ys, xs = np.nonzero(mask)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > DESKEW_SAMPLE:
+        pick = np.random.default_rng(seed).choice(len(ys), DESKEW_SAMPLE, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 1e-9, DESKEW_STEP):
+        theta = np.deg2rad(angle)
+        projected = np.round(ys * np.cos(theta) - xs * np.sin(theta)).astype(np.int64)
+        counts = np.bincount(projected - projected.min())
+        score = counts.var()
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def _render_gray(page: "fitz.Page", scale: float, clip: Optional[Tuple[float, float, float, float]] = None) -> Image.Image:
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, clip=fitz.Rect(clip) if clip else None
+    )
+    return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+def plan_page(page: "fitz.Page", preprocess: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Analisa a página em baixa resolução e devolve o plano de rasterização
+    (escala, recorte, ângulo e pré-processamento), ou None se estiver em branco.
+    """
+    options = {**PREPROCESS_DEFAULTS, **(preprocess or {})}
+    probe = _render_gray(page, PROBE_SCALE)
+    gray = np.asarray(probe)
+    threshold = otsu_threshold(gray)
+    mask = gray <= threshold
+    if mask.mean() < BLANK_INK_RATIO:
+        return None
+    angle = estimate_skew(mask) if options["deskew"] else 0.0
+
+    rect = page.rect
+    clip = (rect.x0, rect.y0, rect.x1, rect.y1)
+    if options["crop"]:
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        pad = MARGIN_PADDING_PT
+        clip = (
+            max(rect.x0, rect.x0 + cols[0] / PROBE_SCALE - pad),
+            max(rect.y0, rect.y0 + rows[0] / PROBE_SCALE - pad),
+            min(rect.x1, rect.x0 + (cols[-1] + 1) / PROBE_SCALE + pad),
+            min(rect.y1, rect.y0 + (rows[-1] + 1) / PROBE_SCALE + pad),
+        )
+
+    # Com a página inclinada, as faixas de texto só aparecem na projeção depois de endireitar
+    if angle:
+        straight = np.asarray(probe.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255))
+        line_px = estimate_line_height(straight <= threshold)
+    else:
+        line_px = estimate_line_height(mask)
+    scale = TARGET_LINE_PX / (line_px / PROBE_SCALE) if line_px else DEFAULT_SCALE
+    area = max(1.0, (clip[2] - clip[0]) * (clip[3] - clip[1]))
+    scale = min(max(scale, MIN_SCALE), MAX_SCALE, (MAX_PIXELS / area) ** 0.5)
+
+    return {
+        "scale": round(scale, 3),
+        "clip": clip,
+        "angle": angle,
+        "contrast": options["contrast"],
+        "binarize": options["binarize"],
+        "line_pt": round(line_px / PROBE_SCALE, 2) if line_px else None,
+    }
+
+def render_for_ocr(page: "fitz.Page", plan: Dict, scale: Optional[float] = None) -> np.ndarray:
+    """Renderiza a página conforme o plano e aplica o pré-processamento; devolve array uint8."""
+    img = _render_gray(page, scale or plan["scale"], plan["clip"])
+    if plan["angle"]:
+        # Rotação anti-horária de `angle` endireita linhas que descem para a direita
+        img = img.rotate(plan["angle"], resample=Image.BILINEAR, expand=True, fillcolor=255)
+    if plan["contrast"]:
+        img = ImageOps.autocontrast(img, cutoff=1)
+    array = np.asarray(img)
+    if plan["binarize"]:
+        array = np.where(array <= otsu_threshold(array), 0, 255).astype(np.uint8)
+    return array
+
+def mean_confidence(results) -> float:
+    """Confiança média do EasyOCR ponderada pelo tamanho de cada trecho reconhecido."""
+    weights = [len(text) for _, text, _ in results]
+    if not sum(weights):
+        return 0.0
+    return float(sum(conf * w for (_, _, conf), w in zip(results, weights)) / sum(weights))
@@ -5,6 +5,9 @@ from PyPDF2 import PdfReader
 
 from etl.extract.ocr_files import read_text_from_image, convert_pdf_to_text
 from etl.extract.loader_files import load_text_with_loader, load_non_pdf_text
+from etl.run_manifest import is_pending, track
+from utils.instrumentation import span, incr
+from utils.resources import get_governor
 
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -13,6 +16,16 @@ from langchain_community.document_loaders import (
     UnstructuredEPubLoader
 )
 
+SUPPORTED_EXTENSIONS = {
+    ".pdf": PyPDFLoader,
+    ".txt": TextLoader,
+    ".epub": UnstructuredEPubLoader,
+    ".docx": UnstructuredWordDocumentLoader,
+    ".doc": UnstructuredWordDocumentLoader,
+}
+
+VALID_EXTENSIONS = [".pdf", ".jpg", ".png", ".txt", ".docx"]
+
 def collect_files(directory: str, extensions: List[str] = None) -> List[str]:
     """
     Coleta todos os arquivos de uma pasta (recursivamente), opcionalmente filtrando por extensões.
@@ -59,7 +72,7 @@ def is_scanned_pdf(filepath: str, max_pages: int = 3) -> bool:
         print(f"[ERRO] Falha ao ler PDF '{filepath}': {e}")
         return True  # Por segurança, assume que precisa de OCR
 
-def load_document(filepath: str, output_dir: str = r"C:\projetos\IA\my-mind\data\output"):
+def load_document(filepath: str, output_dir: str = r"C:\projetos\IA\my-mind\data\output", manifest=None):
     """
     Carrega e processa documentos de diferentes formatos:
     - PDFs escaneados são processados com OCR
@@ -67,37 +80,45 @@ def load_document(filepath: str, output_dir: str = r"C:\projetos\IA\my-mind\data
     - Imagens são processadas com OCR direto
     - Demais formatos são carregados com loaders padrão
 
+    Com `manifest` (RunManifest), pula arquivos já concluídos na execução e
+    registra o status de cada um; uma falha não interrompe os demais.
     """
-    supported_extensions = {
-        ".pdf": PyPDFLoader,
-        ".txt": TextLoader,
-        ".epub": UnstructuredEPubLoader,
-        ".docx": UnstructuredWordDocumentLoader,
-        ".doc": UnstructuredWordDocumentLoader,
-    }
-
-    valid_exts = [".pdf", ".jpg", ".png", ".txt", ".docx"]
-    files = collect_files(filepath, extensions=valid_exts)
+    files = collect_files(filepath, extensions=VALID_EXTENSIONS)
 
     for file in files:
-        ext = Path(file).suffix.lower()
+        if not is_pending(manifest, "extract", file):
+            continue
+        # Segura a admissão do próximo arquivo enquanto a memória estiver sob pressão
+        get_governor().wait_for_memory()
+        with track(manifest, "extract", file):
+            extract_document(file, output_dir)
+
+def extract_document(file: str, output_dir: str) -> str:
+    """
+    Extrai o texto de um único arquivo (OCR ou loader, conforme o tipo) e grava
+    `<nome>_ocr.md` em `output_dir`. Se a saída já existir, reaproveita.
+
+    Returns:
+        str: Texto extraído.
+    """
+    ext = Path(file).suffix.lower()
+    incr("files_extracted", ext=ext)
 
+    with span("extract.document", file=Path(file).name, ext=ext):
         # PDFs: decide entre OCR e loader tradicional
         if ext == ".pdf":
             if is_scanned_pdf(file):
-                convert_pdf_to_text(file, output_dir)
-            else:
-                load_text_with_loader(file, ext, supported_extensions, output_dir)
+                return convert_pdf_to_text(file, output_dir)
+            return load_text_with_loader(file, ext, SUPPORTED_EXTENSIONS, output_dir)
 
         # Imagens: processa com OCR direto
-        elif ext in [".png", ".jpg"]:
-            read_text_from_image(file, output_dir=output_dir)
+        if ext in [".png", ".jpg"]:
+            return read_text_from_image(file, output_dir=output_dir)
 
         # Arquivos estruturados: loaders padrão
-        elif ext in supported_extensions:
-            loader_class = supported_extensions[ext]
-            load_non_pdf_text(file, loader_class, output_dir=output_dir)
+        if ext in SUPPORTED_EXTENSIONS:
+            loader_class = SUPPORTED_EXTENSIONS[ext]
+            return load_non_pdf_text(file, loader_class, output_dir=output_dir)
 
         # Qualquer outro tipo: erro explícito
-        else:
-            raise NotImplementedError(f"Formato ainda não suportado: {ext}")
+        raise NotImplementedError(f"Formato ainda não suportado: {ext}")
@@ -0,0 +1,332 @@
+import os
+import re
+import json
+import math
+import pickle
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from etl.load.metadata_index import normalize_filters, source_matches
+
+# Caminho padrão do índice BM25 persistido (ao lado dos embeddings)
+DEFAULT_INDEX_PATH = "./data/output/bm25/bm25_index.pkl"
+
+# Versão do formato serializado; incrementar ao mudar a estrutura persistida
+INDEX_FORMAT_VERSION = 1
+
+# Parâmetros clássicos do BM25 (Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Proporção de documentos removidos que dispara a compactação das postings
+COMPACT_DEAD_RATIO = 0.25
+
+# Tokens "compostos" (códigos, nomes de arquivo, siglas com hífen/ponto) são mantidos
+# inteiros e também quebrados em partes, para casar tanto "ABC-123" quanto "abc".
+TOKEN_PATTERN = re.compile(r"\w+(?:[\-\./_]\w+)*", re.UNICODE)
+
+
+def _fold(text: str) -> str:
+    """Normaliza para minúsculas e remove acentos (ex: 'Informação' -> 'informacao')."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Quebra o texto em termos para o índice lexical.
+
+    Args:
+        text (str): Texto de entrada.
+
+    Returns:
+        List[str]: Termos normalizados (inclui o token composto e suas partes).
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(_fold(text)):
+        token = match.group(0)
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[\-\./_]", token) if part)
+    return tokens
+
+
+def chunk_key(metadata: Dict) -> str:
+    """Chave estável de um chunk, usada para fundir resultados lexicais e densos."""
+    return f"{metadata.get('relative_path', '')}::{metadata.get('chunk_index', '')}"
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 persistido em disco.
+
+    As postings são guardadas em `array('I')` (ids e frequências), o que mantém o
+    arquivo compacto e permite leitura vetorizada com numpy sem cópia. Atualizações
+    são incrementais por caminho de origem (`relative_path`): documentos antigos viram
+    lápides e as postings são compactadas quando a proporção de lápides cresce.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Optional[Tuple[str, Dict]]] = []   # (conteúdo, metadados) ou None
+        self.doc_len = array("I")
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.source_docs: Dict[str, List[int]] = {}
+        self.total_len = 0
+        self.live_docs = 0
+        self._doc_len_np = None
+        self._alive_np = None
+
+    # ------------------------
+    # Construção / atualização
+    # ------------------------
+
+    def add_documents(self, chunks: Iterable[Dict]):
+        """Adiciona chunks ({'content', 'metadata'}) ao índice."""
+        for chunk in chunks:
+            content = chunk.get("content", "")
+            metadata = chunk.get("metadata", {}) or {}
+            doc_id = len(self.docs)
+            terms = Counter(tokenize(content))
+            length = sum(terms.values())
+
+            self.docs.append((content, metadata))
+            self.doc_len.append(length)
+            self.total_len += length
+            self.live_docs += 1
+
+            for term, tf in terms.items():
+                entry = self.postings.get(term)
+                if entry is None:
+                    entry = (array("I"), array("I"))
+                    self.postings[term] = entry
+                entry[0].append(doc_id)
+                entry[1].append(tf)
+
+            source = metadata.get("relative_path")
+            if source:
+                self.source_docs.setdefault(source, []).append(doc_id)
+
+        self._invalidate()
+
+    def remove_source(self, source: str) -> int:
+        """Marca como removidos todos os chunks de um arquivo de origem."""
+        doc_ids = self.source_docs.pop(source, [])
+        for doc_id in doc_ids:
+            if self.docs[doc_id] is not None:
+                self.docs[doc_id] = None
+                self.total_len -= self.doc_len[doc_id]
+                self.live_docs -= 1
+        if doc_ids:
+            self._invalidate()
+        return len(doc_ids)
+
+    def update_source(self, source: str, chunks: List[Dict]):
+        """Substitui os chunks de um arquivo de origem (remove os antigos e indexa os novos)."""
+        self.remove_source(source)
+        self.add_documents(chunks)
+
+    def has_source(self, source: str) -> bool:
+        return source in self.source_docs
+
+    def compact(self):
+        """Remove as lápides, renumerando documentos e postings sem re-tokenizar o texto."""
+        remap = np.full(len(self.docs), -1, dtype=np.int64)
+        alive = [i for i, doc in enumerate(self.docs) if doc is not None]
+        remap[alive] = np.arange(len(alive))
+
+        new_postings = {}
+        for term, (ids, tfs) in self.postings.items():
+            ids_np = remap[np.frombuffer(ids, dtype=np.uint32)]
+            keep = ids_np >= 0
+            if not keep.any():
+                continue
+            new_postings[term] = (
+                array("I", ids_np[keep].astype(np.uint32).tobytes()),
+                array("I", np.frombuffer(tfs, dtype=np.uint32)[keep].tobytes()),
+            )
+
+        self.postings = new_postings
+        self.docs = [self.docs[i] for i in alive]
+        self.doc_len = array("I", (self.doc_len[i] for i in alive))
+        self.source_docs = {
+            source: [int(remap[i]) for i in ids]
+            for source, ids in self.source_docs.items()
+        }
+        self._invalidate()
+
+    def _invalidate(self):
+        self._doc_len_np = None
+        self._alive_np = None
+
+    # ------------------------
+    # Consulta
+    # ------------------------
+
+    def sources_matching(self, filters: Dict) -> Set[str]:
+        """Arquivos de origem do índice cujos metadados satisfazem os filtros."""
+        filters = normalize_filters(filters)
+        return {
+            source for source, ids in self.source_docs.items()
+            if ids and source_matches(source, self.docs[ids[0]][1], filters)
+        }
+
+    def search(self, query: str, k: int = 5, sources: Optional[Set[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Busca BM25 vetorizada.
+
+        Args:
+            query (str): Texto da consulta.
+            k (int): Número de resultados.
+            sources (Set[str], opcional): Restringe a busca a esses arquivos de origem.
+
+        Returns:
+            List[Tuple[int, float]]: Pares (id interno do documento, score) em ordem decrescente.
+        """
+        if self.live_docs == 0:
+            return []
+
+        if self._doc_len_np is None:
+            self._doc_len_np = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float32)
+            self._alive_np = np.fromiter((doc is not None for doc in self.docs), dtype=bool, count=len(self.docs))
+
+        avgdl = self.total_len / self.live_docs if self.live_docs else 1.0
+        norm = self.k1 * (1 - self.b + self.b * self._doc_len_np / max(avgdl, 1e-9))
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids = np.frombuffer(entry[0], dtype=np.uint32)
+            tfs = np.frombuffer(entry[1], dtype=np.uint32).astype(np.float32)
+            df = len(ids)
+            idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+
+        scores[~self._alive_np] = 0.0
+        if sources is not None:
+            allowed = np.zeros(len(self.docs), dtype=bool)
+            for source in sources:
+                allowed[self.source_docs.get(source, [])] = True
+            scores[~allowed] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            top = np.argpartition(scores[candidates], -k)[-k:]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def get(self, doc_id: int) -> Optional[Tuple[str, Dict]]:
+        """Retorna (conteúdo, metadados) de um documento indexado."""
+        return self.docs[doc_id]
+
+    # ------------------------
+    # Persistência
+    # ------------------------
+
+    def save(self, path: str):
+        """Salva o índice (compactando antes, se necessário) de forma atômica."""
+        if len(self.docs) and (len(self.docs) - self.live_docs) / len(self.docs) > COMPACT_DEAD_RATIO:
+            self.compact()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {
+            "version": INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "docs": self.docs,
+            "doc_len": self.doc_len,
+            "postings": self.postings,
+            "source_docs": self.source_docs,
+            "total_len": self.total_len,
+            "live_docs": self.live_docs,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Versão de índice BM25 incompatível em {path}: {state.get('version')}")
+
+        index = cls(k1=state["k1"], b=state["b"])
+        index.docs = state["docs"]
+        index.doc_len = state["doc_len"]
+        index.postings = state["postings"]
+        index.source_docs = state["source_docs"]
+        index.total_len = state["total_len"]
+        index.live_docs = state["live_docs"]
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str) -> "BM25Index":
+        if path and os.path.exists(path):
+            return cls.load(path)
+        return cls()
+
+
+def sync_bm25_from_jsonl(json_path: str, index_path: str = DEFAULT_INDEX_PATH) -> BM25Index:
+    """
+    Garante que todos os arquivos de origem do JSONL de chunks estejam no índice BM25.
+    Arquivos já indexados são mantidos; apenas os ausentes são adicionados.
+
+    Args:
+        json_path (str): Caminho do JSONL de chunks.
+        index_path (str): Caminho do índice BM25 persistido.
+
+    Returns:
+        BM25Index: Índice atualizado.
+    """
+    index = BM25Index.load_or_create(index_path)
+    pending = defaultdict(list)
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                chunk = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            source = chunk.get("metadata", {}).get("relative_path")
+            if source and not index.has_source(source):
+                pending[source].append(chunk)
+
+    for source, chunks in pending.items():
+        index.update_source(source, chunks)
+
+    if pending:
+        index.save(index_path)
+    print(f"[BM25] {len(pending)} arquivos novos indexados ({index.live_docs} chunks no índice).")
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Funde várias listas ranqueadas com Reciprocal Rank Fusion (RRF).
+
+    Args:
+        rankings (List[List[str]]): Listas de chaves em ordem de relevância.
+        k (int): Constante de suavização do RRF.
+
+    Returns:
+        List[Tuple[str, float]]: Chaves com score fundido, em ordem decrescente.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            fused[key] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
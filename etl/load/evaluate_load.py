@@ -1,26 +1,90 @@
-from etl.load.vector_reader import EmbeddingSearcher
-from etl.load.vector_writer import VectorWriter
+import os
+import json
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from langchain_chroma import Chroma
+from etl.load.vector_reader import EmbeddingSearcher, iter_collection, collection_space
+from etl.load.vector_writer import make_chunk_id
 from utils.metrics import calculate_embedding_metrics, calculate_chunk_metrics
 
 def run_embedding_metrics(
     label_key: str = "source_file",
-    limit: int = 100,
+    limit: Optional[int] = None,
     persist_directory: str = "./data/output/embeddings/",
     verbose: bool = True,
+    export_path: str = None,
 ):
+    """
+    Avalia os embeddings persistidos (todos, por padrão; `limit` restringe).
+    Com `export_path` (.npy), os vetores são exportados página a página para
+    um arquivo memory-mapped e lidos de lá, sem materializar a coleção
+    inteira em memória.
+    """
     print("\n🟢 Avaliando métricas de embeddings...")
     searcher = EmbeddingSearcher(persist_directory=persist_directory)
-    embeddings, labels = searcher.load_embeddings_and_labels(label_key=label_key, limit=limit)
+    if export_path:
+        searcher.export_embeddings(export_path, fields=["metadatas"], limit=limit)
+        embeddings = np.load(export_path, mmap_mode="r")
+        labels = []
+        with open(Path(export_path).with_suffix(".jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                labels.append((json.loads(line).get("metadatas") or {}).get(label_key))
+    else:
+        embeddings, labels = searcher.load_embeddings_and_labels(label_key=label_key, limit=limit)
     calculate_embedding_metrics(embeddings, labels, verbose=verbose)
 
 def run_chunk_metrics(
     chunk_json_path: str = "./data/output/chunks/chunks_output.json",
     persist_directory: str = "./data/output/embeddings/",
     k: int = 5,
-    sample_size: int = 100,
+    sample_size: Optional[int] = None,
+    batch_size: int = 1024,
     verbose: bool = True,
 ):
+    """
+    Avalia a recuperação dos chunks lendo os vetores já persistidos, sem
+    escrever no store nem re-embedar textos. As consultas são os chunks do
+    manifesto presentes no store (todos, se o manifesto não existir); são
+    relevantes os outros chunks do mesmo arquivo de origem.
+    """
     print("\n🟢 Avaliando métricas de chunks...")
-    vw = VectorWriter(persist_directory=persist_directory)
-    chunks = vw.load_and_add_chunks(json_path=chunk_json_path)
-    calculate_chunk_metrics(vw, chunks, k=k, sample_size=sample_size, verbose=verbose)
+    vectorstore = Chroma(persist_directory=persist_directory)
+
+    pages, ids, labels = [], [], []
+    for page in iter_collection(vectorstore._collection, fields=["embeddings", "metadatas"]):
+        pages.append(page["embeddings"])
+        ids.extend(page["ids"])
+        for metadata in page["metadatas"]:
+            metadata = metadata or {}
+            # Relevância por fonte: os outros chunks do mesmo arquivo
+            labels.append(metadata.get("relative_path") or metadata.get("source_file", ""))
+
+    if not ids:
+        print("[Eval] Vector store vazio, nada a avaliar.")
+        return {}
+    embeddings = np.concatenate(pages)
+
+    query_indices = None
+    if os.path.exists(chunk_json_path):
+        expected_ids = set()
+        with open(chunk_json_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    expected_ids.add(make_chunk_id(json.loads(line)))
+        query_indices = np.array([i for i, doc_id in enumerate(ids) if doc_id in expected_ids], dtype=np.int64)
+        missing = len(expected_ids) - len(query_indices)
+        if missing:
+            print(f"[Eval] {missing} chunks do manifesto ausentes do store (não avaliados).")
+
+    return calculate_chunk_metrics(
+        embeddings,
+        labels,
+        k=k,
+        sample_size=sample_size,
+        query_indices=query_indices,
+        batch_size=batch_size,
+        space=collection_space(vectorstore),
+        verbose=verbose,
+    )
@@ -0,0 +1,35 @@
+import os
+import json
+import time
+from typing import Dict, Optional
+
+INDEX_VERSION_FILENAME = "index_version.json"
+
+def read_index_version(persist_directory: str) -> Optional[Dict]:
+    """Marcador de versão do índice ({"version", "updated_at", ...}) ou None se ausente."""
+    path = os.path.join(persist_directory, INDEX_VERSION_FILENAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def bump_index_version(persist_directory: str, **info) -> Dict:
+    """
+    Grava (atomicamente) uma nova versão do índice. Deve ser chamado pelo estágio
+    de carga só depois que vector store, índice de metadados e BM25 estiverem
+    consistentes: processos de inferência recarregam o índice ao ver a mudança.
+    """
+    current = read_index_version(persist_directory) or {}
+    marker = {
+        "version": int(current.get("version", 0)) + 1,
+        "updated_at": time.time(),
+        **info,
+    }
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, INDEX_VERSION_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+    os.replace(tmp_path, path)
+    return marker
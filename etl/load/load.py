@@ -1,6 +1,17 @@
 from etl.load.vector_writer import VectorWriter
+from etl.load.bm25_index import sync_bm25_from_jsonl
+from etl.load.index_version import bump_index_version
 
-def run_embedding_generation(json_chunks_path: str, embedding_output_dir: str):
+def run_embedding_generation(
+    json_chunks_path: str, embedding_output_dir: str, bm25_index_path: str = None, manifest=None
+):
     print("\n🟢 Gerando embeddings...")
     vw = VectorWriter(persist_directory=embedding_output_dir)
-    vw.load_and_add_chunks(json_path=json_chunks_path)
+    vw.load_and_add_chunks(json_path=json_chunks_path, manifest=manifest)
+
+    if bm25_index_path:
+        sync_bm25_from_jsonl(json_chunks_path, bm25_index_path)
+
+    # Nova versão do índice: processos de inferência em execução recarregam em segundo plano
+    marker = bump_index_version(embedding_output_dir, stage="load", count=vw.vectorstore._collection.count())
+    print(f"[Load] Índice na versão {marker['version']}.")
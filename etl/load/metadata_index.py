@@ -0,0 +1,180 @@
+import os
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+# Nome do arquivo do índice secundário, salvo dentro do diretório de embeddings
+METADATA_INDEX_FILENAME = "metadata_index.json"
+
+# Filtros aceitos pela busca com escopo
+FILTER_KEYS = ("path_prefix", "source_file", "language", "ingested_after", "ingested_before")
+
+
+def _to_timestamp(value) -> Optional[int]:
+    """Converte 'YYYY-MM-DD', datetime/date ou epoch (int) para epoch em segundos."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return int(value.timestamp())
+
+
+def normalize_filters(filters: Optional[Dict]) -> Dict:
+    """
+    Remove filtros vazios e valida as chaves suportadas.
+
+    Args:
+        filters (dict, opcional): Ex: {"path_prefix": "Livros/", "language": "pt"}.
+
+    Returns:
+        dict: Filtros válidos e não vazios.
+    """
+    if not filters:
+        return {}
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Filtros não suportados: {sorted(unknown)}. Use {FILTER_KEYS}.")
+    return {key: value for key, value in filters.items() if value not in (None, "")}
+
+
+def build_where(filters: Dict, sources: Optional[Iterable[str]] = None) -> Optional[Dict]:
+    """
+    Traduz filtros para a cláusula `where` do Chroma.
+    O prefixo de caminho não é suportado nativamente pelo Chroma, por isso é
+    resolvido antes (pelo índice secundário) para uma lista de `relative_path`.
+    """
+    filters = normalize_filters(filters)
+    clauses = []
+    if sources is not None:
+        clauses.append({"relative_path": {"$in": sorted(sources)}})
+    if "source_file" in filters:
+        clauses.append({"source_file": filters["source_file"]})
+    if "language" in filters:
+        clauses.append({"language": filters["language"]})
+    if "ingested_after" in filters:
+        clauses.append({"ingested_at": {"$gte": _to_timestamp(filters["ingested_after"])}})
+    if "ingested_before" in filters:
+        clauses.append({"ingested_at": {"$lte": _to_timestamp(filters["ingested_before"])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def source_matches(source: str, metadata: Dict, filters: Dict) -> bool:
+    """
+    Verifica se um arquivo de origem satisfaz os filtros.
+
+    Args:
+        source (str): `relative_path` do arquivo.
+        metadata (dict): Metadados do arquivo (`source_file`, `language`, `ingested_at`).
+        filters (dict): Filtros já normalizados.
+
+    Returns:
+        bool: True se o arquivo está no escopo.
+    """
+    prefix = filters.get("path_prefix")
+    if prefix:
+        prefix = prefix.replace("\\", "/")
+        if prefix.startswith("./"):
+            prefix = prefix[2:]
+        if not source.replace("\\", "/").startswith(prefix):
+            return False
+    if "source_file" in filters and metadata.get("source_file") != filters["source_file"]:
+        return False
+    if "language" in filters and metadata.get("language") != filters["language"]:
+        return False
+
+    ingested_at = metadata.get("ingested_at")
+    after = _to_timestamp(filters.get("ingested_after"))
+    before = _to_timestamp(filters.get("ingested_before"))
+    if after is not None and (ingested_at is None or ingested_at < after):
+        return False
+    if before is not None and (ingested_at is None or ingested_at > before):
+        return False
+    return True
+
+
+class MetadataIndex:
+    """
+    Índice secundário (arquivo JSON) por arquivo de origem, com os campos filtráveis
+    (`source_file`, `directory`, `language`, `ingested_at`) e os ids dos seus chunks
+    no vector store. Permite resolver um filtro para o subconjunto de ids sem tocar
+    no Chroma e sem carregar o modelo de embeddings.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, persist_directory: str) -> "MetadataIndex":
+        index = cls(os.path.join(persist_directory, METADATA_INDEX_FILENAME))
+        if os.path.exists(index.path):
+            with open(index.path, "r", encoding="utf-8") as f:
+                index.sources = json.load(f)
+        return index
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def add(self, doc_id: str, metadata: Dict):
+        """Registra um chunk persistido no vector store."""
+        source = metadata.get("relative_path")
+        if not source:
+            return
+        entry = self.sources.get(source)
+        if entry is None:
+            entry = {
+                "source_file": metadata.get("source_file"),
+                "directory": os.path.dirname(source).replace("\\", "/"),
+                "language": metadata.get("language"),
+                "ingested_at": metadata.get("ingested_at"),
+                "ids": [],
+            }
+            self.sources[source] = entry
+        entry["ids"].append(doc_id)
+
+    def remove_source(self, source: str) -> List[str]:
+        entry = self.sources.pop(source, None)
+        return entry["ids"] if entry else []
+
+    def rebuild(self, collection, batch_size: int = 5000):
+        """Reconstrói o índice a partir das metadatas já persistidas no Chroma."""
+        self.sources = {}
+        offset = 0
+        while True:
+            data = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not data["ids"]:
+                break
+            for doc_id, metadata in zip(data["ids"], data["metadatas"]):
+                self.add(doc_id, metadata or {})
+            offset += len(data["ids"])
+        self.save()
+
+    def resolve_sources(self, filters: Dict) -> Set[str]:
+        """Retorna os `relative_path` que satisfazem os filtros."""
+        filters = normalize_filters(filters)
+        return {
+            source for source, entry in self.sources.items()
+            if source_matches(source, entry, filters)
+        }
+
+    def resolve_ids(self, filters: Dict) -> List[str]:
+        """Retorna os ids de chunks que satisfazem os filtros."""
+        return [
+            doc_id
+            for source in self.resolve_sources(filters)
+            for doc_id in self.sources[source]["ids"]
+        ]
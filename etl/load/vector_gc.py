@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+from langchain_chroma import Chroma
+
+from etl.load.bm25_index import BM25Index
+from etl.load.index_version import bump_index_version
+from etl.load.metadata_index import MetadataIndex, METADATA_INDEX_FILENAME
+from etl.load.vector_reader import iter_collection
+from etl.load.vector_writer import make_chunk_id
+
+GC_LOCK_FILENAME = ".gc.lock"
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _file_hash(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return hashlib.sha1(f.read().encode("utf-8")).hexdigest()
+
+def _try_lock(fd: int) -> bool:
+    """Trava exclusiva do arquivo sem esperar; o sistema a libera se o processo morrer."""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def store_lock(persist_directory: str):
+    """
+    Trava exclusiva (arquivo) do diretório do vector store durante a coleta.
+    Falha imediatamente se outra coleta estiver em andamento. A trava é do
+    sistema operacional (flock/msvcrt), não a existência do arquivo: uma
+    coleta ou merge morto (OOM, SIGKILL) não deixa o store travado.
+    """
+    lock_path = os.path.join(persist_directory, GC_LOCK_FILENAME)
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+    try:
+        if not _try_lock(fd):
+            raise RuntimeError(f"Vector store em uso (trava mantida por outro processo: {lock_path}).")
+        # O pid é só informativo (quem segura a trava)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        yield
+    finally:
+        # Fechar o descritor libera a trava; o arquivo fica (removê-lo abriria corrida com quem o abriu)
+        os.close(fd)
+
+def find_stale_sources(chunks_by_source: Dict[str, List[Dict]], clean_dir: str) -> Dict[str, str]:
+    """
+    Compara o manifesto de chunks com a árvore de Markdown limpo.
+
+    Returns:
+        Dict[str, str]: relative_path -> motivo ("removido" ou "alterado").
+    """
+    stale = {}
+    for source, chunks in chunks_by_source.items():
+        if not source:
+            continue
+        path = os.path.join(clean_dir, source)
+        if not os.path.exists(path):
+            stale[source] = "removido"
+            continue
+
+        metadata = chunks[0].get("metadata", {})
+        ingested_at = metadata.get("ingested_at")
+        source_hash = metadata.get("source_hash")
+        # Só recalcula o hash de arquivos modificados após a ingestão
+        if ingested_at is None or os.path.getmtime(path) <= ingested_at:
+            continue
+        if source_hash and _file_hash(path) != source_hash:
+            stale[source] = "alterado"
+    return stale
+
+def compact_sqlite(persist_directory: str):
+    """Executa checkpoint do WAL e VACUUM no SQLite do Chroma para devolver espaço ao disco."""
+    db_path = os.path.join(persist_directory, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        print(f"[GC] Compactação do SQLite não executada: {e}")
+    finally:
+        conn.close()
+
+def run_vector_gc(
+    chunks_path: str,
+    clean_dir: str,
+    persist_directory: str = "./data/output/embeddings",
+    bm25_index_path: str = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> Dict:
+    """
+    Reconcilia o vector store com o manifesto de chunks e a árvore de origem.
+
+    - Arquivos limpos removidos ou alterados desde a ingestão têm seus chunks
+      retirados do manifesto (e serão re-chunkados na próxima transformação).
+    - Vetores cujo id de conteúdo não está no manifesto (órfãos, versões antigas
+      ou duplicatas) são apagados em lotes.
+    - O índice secundário de metadados e o BM25 são atualizados, e o SQLite do
+      Chroma é compactado.
+
+    Deve ser executado com o store ocioso (sem escrita concorrente).
+
+    Returns:
+        dict: Relatório com contagens, espaço recuperado e tempo.
+    """
+    print("\n🟢 Reconciliando vector store...")
+    start = time.perf_counter()
+
+    # Sem manifesto não há referência: tudo seria considerado órfão
+    if not os.path.exists(chunks_path):
+        raise FileNotFoundError(f"Manifesto de chunks não encontrado: {chunks_path}")
+
+    chunks_by_source = defaultdict(list)
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                chunk = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            chunks_by_source[chunk.get("metadata", {}).get("relative_path")].append(chunk)
+
+    stale_sources = find_stale_sources(chunks_by_source, clean_dir)
+    for source, reason in stale_sources.items():
+        print(f"[GC] Fonte {reason}: {source}")
+
+    expected_ids = {
+        make_chunk_id(chunk)
+        for source, chunks in chunks_by_source.items()
+        if source not in stale_sources
+        for chunk in chunks
+    }
+
+    size_before = _dir_size(persist_directory)
+    with store_lock(persist_directory):
+        vectorstore = Chroma(persist_directory=persist_directory)
+        collection = vectorstore._collection
+        metadata_index = MetadataIndex(os.path.join(persist_directory, METADATA_INDEX_FILENAME))
+
+        to_delete = []
+        seen = set()
+        scanned = 0
+        for page in iter_collection(collection, batch_size=batch_size, fields=["metadatas", "documents"]):
+            for doc_id, metadata, document in zip(page["ids"], page["metadatas"], page["documents"]):
+                scanned += 1
+                metadata = metadata or {}
+                # Ids antigos (uuid) são avaliados pelo id de conteúdo equivalente
+                content_id = doc_id if doc_id in expected_ids else make_chunk_id(
+                    {"content": document, "metadata": metadata}
+                )
+                if content_id not in expected_ids or content_id in seen:
+                    to_delete.append(doc_id)
+                    continue
+                seen.add(content_id)
+                metadata_index.add(doc_id, metadata)
+
+        print(f"[GC] {scanned} vetores analisados, {len(to_delete)} a remover.")
+
+        if not dry_run:
+            for i in range(0, len(to_delete), batch_size):
+                collection.delete(ids=to_delete[i:i + batch_size])
+            metadata_index.save()
+
+            if stale_sources:
+                tmp_path = f"{chunks_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for source, chunks in chunks_by_source.items():
+                        if source in stale_sources:
+                            continue
+                        for chunk in chunks:
+                            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, chunks_path)
+
+                if bm25_index_path and os.path.exists(bm25_index_path):
+                    bm25 = BM25Index.load(bm25_index_path)
+                    for source in stale_sources:
+                        bm25.remove_source(source)
+                    bm25.save(bm25_index_path)
+
+        del collection, vectorstore
+        if not dry_run and to_delete:
+            compact_sqlite(persist_directory)
+        if not dry_run and (to_delete or stale_sources):
+            bump_index_version(persist_directory, stage="gc", count=scanned - len(to_delete))
+
+    size_after = _dir_size(persist_directory)
+    report = {
+        "scanned": scanned,
+        "deleted": 0 if dry_run else len(to_delete),
+        "stale_sources": len(stale_sources),
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "bytes_reclaimed": size_before - size_after,
+        "seconds": round(time.perf_counter() - start, 2),
+        "dry_run": dry_run,
+    }
+    print(
+        f"[GC] {report['deleted']} vetores removidos, {report['stale_sources']} fontes obsoletas, "
+        f"{report['bytes_reclaimed'] / 1e6:.1f} MB recuperados em {report['seconds']}s."
+    )
+    return report
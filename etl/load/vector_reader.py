@@ -1,13 +1,23 @@
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from typing import List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional, Sequence
 from langchain_core.documents import Document
+from etl.load.metadata_index import MetadataIndex, build_where, normalize_filters
+from pathlib import Path
+import json
 import warnings
 import numpy as np
 
 warnings.filterwarnings("ignore", message="`add_prefix_space` was not set")
 warnings.filterwarnings("ignore", message="`clean_up_tokenization_spaces` was not set")
 
+# Tamanho padrão das páginas lidas do vector store
+DEFAULT_PAGE_SIZE = 1000
+
+# Até quantos chunks candidatos a busca com filtro faz varredura exata (numpy)
+# sobre o subconjunto, em vez de consultar o índice HNSW global com `where`.
+SCOPED_EXACT_SEARCH_LIMIT = 5000
+
 def initialize_embeddings(
     model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 ) -> HuggingFaceEmbeddings:
@@ -25,6 +35,232 @@ def load_vectorstore(
     """
     return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
 
+def reload_vectorstore(persist_directory: str, embeddings: HuggingFaceEmbeddings) -> Chroma:
+    """
+    Abre um novo cliente Chroma com o estado atual do disco. O chromadb reaproveita
+    um `System` por diretório dentro do processo (com segmentos em memória);
+    limpar esse cache faz o novo cliente reler o índice, enquanto clientes já
+    abertos continuam funcionando até serem descartados.
+    """
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:
+        from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+    return load_vectorstore(persist_directory, embeddings)
+
+def collection_space(vectorstore: Chroma) -> str:
+    """Métrica de distância da coleção ('l2', 'cosine' ou 'ip')."""
+    metadata = vectorstore._collection.metadata or {}
+    return metadata.get("hnsw:space", "l2")
+
+def vector_distances(query_vector: np.ndarray, vectors: np.ndarray, space: str = "l2") -> np.ndarray:
+    """
+    Calcula distâncias no mesmo espaço usado pelo Chroma (l2 ao quadrado, cosine ou ip).
+    """
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+        return 1.0 - (vectors @ query_vector) / np.where(norms == 0, 1.0, norms)
+    if space == "ip":
+        return 1.0 - vectors @ query_vector
+    diff = vectors - query_vector
+    return np.einsum("ij,ij->i", diff, diff)
+
+def scoped_similarity_search(
+    vectorstore: Chroma,
+    embeddings: HuggingFaceEmbeddings,
+    metadata_index: MetadataIndex,
+    query_text: str,
+    k: int,
+    filters: Dict,
+    query_vector: Optional[np.ndarray] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Busca por similaridade restrita a um subconjunto de metadados.
+    Se `query_vector` for informado, a consulta não é re-embedada.
+
+    O filtro é resolvido pelo índice secundário para os ids/caminhos candidatos.
+    Subconjuntos pequenos são pontuados por varredura exata apenas sobre seus
+    embeddings; subconjuntos grandes são empurrados para o Chroma como `where`.
+
+    Returns:
+        List[Tuple[Document, float]]: Documentos e distâncias, do mais próximo ao mais distante.
+    """
+    if not metadata_index.exists():
+        metadata_index.rebuild(vectorstore._collection)
+
+    sources = metadata_index.resolve_sources(filters)
+    if not sources:
+        return []
+
+    candidate_ids = [doc_id for source in sources for doc_id in metadata_index.sources[source]["ids"]]
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query_text)
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+
+    if len(candidate_ids) > SCOPED_EXACT_SEARCH_LIMIT:
+        # Consulta direta na coleção: devolve distâncias, como a varredura exata abaixo
+        where = build_where(filters, sources=sources if "path_prefix" in filters else None)
+        result = vectorstore._collection.query(
+            query_embeddings=[query_vector.tolist()],
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            (Document(page_content=content, metadata=metadata or {}, id=doc_id), float(distance))
+            for doc_id, content, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    data = vectorstore._collection.get(ids=candidate_ids, include=["embeddings", "documents", "metadatas"])
+    if not len(data["ids"]):
+        return []
+
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    distances = vector_distances(query_vector, vectors, collection_space(vectorstore))
+    top = np.argsort(distances)[:k]
+
+    return [
+        (
+            Document(page_content=data["documents"][i], metadata=data["metadatas"][i] or {}, id=data["ids"][i]),
+            float(distances[i]),
+        )
+        for i in top
+    ]
+
+
+def iter_collection(
+    collection,
+    batch_size: int = DEFAULT_PAGE_SIZE,
+    fields: Sequence[str] = ("embeddings", "metadatas"),
+    where: Optional[Dict] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict]:
+    """
+    Percorre a coleção do Chroma em páginas de tamanho fixo, trazendo apenas os
+    campos pedidos (projeção). Os ids sempre acompanham cada página.
+
+    Args:
+        collection: Coleção Chroma (ex: `vectorstore._collection`).
+        batch_size (int): Itens por página.
+        fields (Sequence[str]): Subconjunto de "embeddings", "metadatas", "documents".
+        where (dict, opcional): Filtro de metadados do Chroma.
+        limit (int, opcional): Máximo de itens no total.
+
+    Yields:
+        dict: {"ids": [...], <campo>: [...]} com embeddings como np.ndarray float32.
+    """
+    offset = 0
+    while limit is None or offset < limit:
+        page_size = batch_size if limit is None else min(batch_size, limit - offset)
+        data = collection.get(include=list(fields), where=where, limit=page_size, offset=offset)
+        if not data["ids"]:
+            break
+
+        page = {"ids": data["ids"]}
+        for field in fields:
+            page[field] = data[field]
+        if "embeddings" in fields:
+            page["embeddings"] = np.asarray(page["embeddings"], dtype=np.float32)
+
+        yield page
+        offset += len(data["ids"])
+        if len(data["ids"]) < page_size:
+            break
+
+def export_collection(
+    collection,
+    output_path: str,
+    fields: Sequence[str] = ("metadatas",),
+    batch_size: int = DEFAULT_PAGE_SIZE,
+    limit: Optional[int] = None,
+) -> int:
+    """
+    Exporta os embeddings da coleção para arquivo memory-mapped, página a página.
+
+    - `.npy`: matriz float32 (N, dim) escrita via `np.lib.format.open_memmap`;
+      ids e demais campos vão para um `.jsonl` ao lado (mesma ordem das linhas).
+    - `.arrow`/`.feather`: arquivo Arrow IPC (requer `pyarrow`), com ids,
+      embeddings e os demais campos serializados em JSON.
+
+    Ambos podem ser abertos sem carregar tudo em memória
+    (`np.load(..., mmap_mode="r")` ou `pyarrow.memory_map`).
+
+    Returns:
+        int: Número de vetores exportados.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    extra_fields = [f for f in fields if f != "embeddings"]
+
+    total = collection.count()
+    if limit is not None:
+        total = min(total, limit)
+    if total == 0:
+        print("[Export] Coleção vazia, nada a exportar.")
+        return 0
+
+    pages = iter_collection(collection, batch_size, ["embeddings", *extra_fields], limit=limit)
+
+    if output_path.suffix in (".arrow", ".feather"):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("Exportação Arrow requer 'pyarrow' (pip install pyarrow).")
+
+        written = 0
+        writer = None
+        with pa.OSFile(str(output_path), "wb") as sink:
+            for page in pages:
+                vectors = page["embeddings"]
+                columns = {
+                    "id": pa.array(page["ids"], pa.string()),
+                    "embedding": pa.FixedSizeListArray.from_arrays(
+                        pa.array(vectors.ravel(), pa.float32()), vectors.shape[1]
+                    ),
+                }
+                for field in extra_fields:
+                    columns[field] = pa.array(
+                        [json.dumps(value, ensure_ascii=False) for value in page[field]], pa.string()
+                    )
+                batch = pa.RecordBatch.from_pydict(columns)
+                if writer is None:
+                    writer = pa.ipc.new_file(sink, batch.schema)
+                writer.write_batch(batch)
+                written += len(page["ids"])
+            if writer is not None:
+                writer.close()
+    else:
+        matrix = None
+        written = 0
+        sidecar = output_path.with_suffix(".jsonl")
+        with open(sidecar, "w", encoding="utf-8") as f:
+            for page in pages:
+                vectors = page["embeddings"]
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(
+                        output_path, mode="w+", dtype=np.float32, shape=(total, vectors.shape[1])
+                    )
+                # A coleção pode ter crescido desde o count(); ignora o excedente
+                n = min(len(vectors), total - written)
+                matrix[written:written + n] = vectors[:n]
+                for i in range(n):
+                    row = {"id": page["ids"][i]}
+                    for field in extra_fields:
+                        row[field] = page[field][i]
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                written += n
+                if written >= total:
+                    break
+        if matrix is not None:
+            matrix.flush()
+            del matrix
+
+    print(f"[Export] {written} vetores exportados para: {output_path}")
+    return written
+
 
 class EmbeddingSearcher:
     """
@@ -35,30 +271,115 @@ class EmbeddingSearcher:
         self,
         persist_directory: str = "./data/output/embeddings",
         model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        embeddings: Optional[HuggingFaceEmbeddings] = None,
+        fresh: bool = False,
     ):
-        self.embeddings = initialize_embeddings(model_name)
-        self.vectorstore = load_vectorstore(persist_directory, self.embeddings)
+        self.persist_directory = persist_directory
+        self.embeddings = embeddings or initialize_embeddings(model_name)
+        if fresh:
+            self.vectorstore = reload_vectorstore(persist_directory, self.embeddings)
+        else:
+            self.vectorstore = load_vectorstore(persist_directory, self.embeddings)
+        self.metadata_index = MetadataIndex.load(persist_directory)
+
+    def reloaded(self) -> "EmbeddingSearcher":
+        """
+        Novo buscador sobre o índice atual do disco, reaproveitando o modelo de
+        embeddings já carregado. O buscador atual continua válido até ser trocado.
+        """
+        return EmbeddingSearcher(self.persist_directory, embeddings=self.embeddings, fresh=True)
+
+    def query(self, query_text: str, k: int = 5, filters: Optional[Dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.query_with_score(query_text, k=k, filters=filters)]
+
+    def query_with_score(self, query_text: str, k: int = 5, filters: Optional[Dict] = None):
+        filters = normalize_filters(filters)
+        if filters:
+            return scoped_similarity_search(
+                self.vectorstore, self.embeddings, self.metadata_index, query_text, k, filters
+            )
+        return self.vectorstore.similarity_search_with_score(query_text, k=k)
 
-    def query(self, query_text: str, k: int = 5) -> List[Document]:
-        return self.vectorstore.similarity_search(query_text, k=k)
+    def embed_query(self, query_text: str) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query(query_text), dtype=np.float32)
+
+    def embed_queries(self, query_texts: List[str]) -> np.ndarray:
+        """Embeda várias consultas em uma única chamada em lote ao modelo."""
+        return np.asarray(self.embeddings.embed_documents(list(query_texts)), dtype=np.float32)
+
+    def query_by_vector(
+        self, query_vector: np.ndarray, k: int = 5, filters: Optional[Dict] = None
+    ) -> List[Document]:
+        """Busca a partir de um embedding já calculado (ex: vindo de cache ou de lote)."""
+        filters = normalize_filters(filters)
+        if filters:
+            results = scoped_similarity_search(
+                self.vectorstore, self.embeddings, self.metadata_index, "", k, filters, query_vector=query_vector
+            )
+            return [doc for doc, _ in results]
+        return self.vectorstore.similarity_search_by_vector(list(map(float, query_vector)), k=k)
+
+    def get_embeddings(self, ids: List[str]) -> Optional[np.ndarray]:
+        """
+        Lê os embeddings já armazenados dos ids pedidos, na mesma ordem.
+        Retorna None se algum id não estiver no store.
+        """
+        if not ids:
+            return np.empty((0, 0), dtype=np.float32)
+        data = self.vectorstore._collection.get(ids=list(ids), include=["embeddings"])
+        by_id = dict(zip(data["ids"], data["embeddings"]))
+        if any(doc_id not in by_id for doc_id in ids):
+            return None
+        return np.asarray([by_id[doc_id] for doc_id in ids], dtype=np.float32)
+
+    def count(self) -> int:
+        return self.vectorstore._collection.count()
+
+    def iter_batches(
+        self,
+        batch_size: int = DEFAULT_PAGE_SIZE,
+        fields: Sequence[str] = ("embeddings", "metadatas"),
+        filters: Optional[Dict] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Itera o vector store em páginas com apenas os campos pedidos.
+        Ver `iter_collection`.
+        """
+        where = None
+        filters = normalize_filters(filters)
+        if filters:
+            sources = self.metadata_index.resolve_sources(filters) if "path_prefix" in filters else None
+            where = build_where(filters, sources=sources)
+        return iter_collection(self.vectorstore._collection, batch_size, fields, where, limit)
+
+    def export_embeddings(
+        self,
+        output_path: str,
+        fields: Sequence[str] = ("metadatas",),
+        batch_size: int = DEFAULT_PAGE_SIZE,
+        limit: Optional[int] = None,
+    ) -> int:
+        """Exporta embeddings para `.npy` (memmap) ou Arrow. Ver `export_collection`."""
+        return export_collection(self.vectorstore._collection, output_path, fields, batch_size, limit=limit)
 
     def load_embeddings_and_labels(
-        self, label_key: Optional[str] = None, limit: int = 100
+        self, label_key: Optional[str] = None, limit: Optional[int] = 100, batch_size: int = DEFAULT_PAGE_SIZE
     ) -> Tuple[np.ndarray, List]:
         """
         Recupera embeddings e labels do vectorstore para validação.
+        Lê apenas `limit` itens (ou todos se None), página a página.
         """
-        data = self.vectorstore._collection.get(include=["metadatas", "documents", "embeddings"], ids=None)
+        fields = ["embeddings", "metadatas"] if label_key else ["embeddings"]
+        vectors = []
+        labels_list = []
 
-        total = len(data['ids'])
-        n = min(limit, total)
-
-        embeddings_list = data['embeddings'][:n]
-        embeddings_array = np.array(embeddings_list)
-
-        if label_key:
-            labels_list = [meta.get(label_key, None) for meta in data['metadatas'][:n]]
-        else:
-            labels_list = [None] * n
+        for page in self.iter_batches(batch_size=batch_size, fields=fields, limit=limit):
+            vectors.append(page["embeddings"])
+            if label_key:
+                labels_list.extend((meta or {}).get(label_key, None) for meta in page["metadatas"])
+            else:
+                labels_list.extend([None] * len(page["ids"]))
 
+        embeddings_array = np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
         return embeddings_array, labels_list
@@ -1,14 +1,28 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+import hashlib
 import json
 import warnings
 import os
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from etl.load.metadata_index import MetadataIndex, normalize_filters
+from etl.load.vector_reader import scoped_similarity_search
+from etl.run_manifest import is_pending, mark
+from utils.instrumentation import span, incr
 
 warnings.filterwarnings("ignore", message="`add_prefix_space` was not set")
 warnings.filterwarnings("ignore", message="`clean_up_tokenization_spaces` was not set")
 
+def make_chunk_id(chunk: Dict) -> str:
+    """
+    Id determinístico de um chunk no vector store: muda se o caminho, a posição
+    ou o conteúdo do chunk mudarem.
+    """
+    metadata = chunk.get("metadata", {})
+    key = f"{metadata.get('relative_path', '')}::{metadata.get('chunk_index', '')}::{chunk.get('content', '')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
 class VectorWriter:
     def __init__(self, persist_directory: str = "./chroma_db"):
         self.persist_directory = persist_directory
@@ -19,41 +33,105 @@ class VectorWriter:
             persist_directory=self.persist_directory,
             embedding_function=self.embeddings
         )
+        self.metadata_index = MetadataIndex.load(self.persist_directory)
 
     def _get_existing_contents(self) -> set:
         """Obtém conteúdos já persistidos para evitar duplicatas."""
         existing_docs = self.vectorstore.get(include=["documents"])
         return set(existing_docs["documents"]) if existing_docs else set()
 
-    def add_chunks(self, chunks: List[Dict], batch_size: int = 500):
+    def add_chunks(self, chunks: List[Dict], batch_size: int = 500, manifest=None):
+        """
+        Adiciona os chunks ainda não persistidos, em lotes. Com `manifest`
+        (RunManifest), cada arquivo de origem é marcado como concluído assim que
+        o lote com o seu último chunk novo é gravado.
+        """
         existing_contents = self._get_existing_contents()
         print(f"[DEBUG] Conteúdos existentes na base: {len(existing_contents)}")
 
-        new_chunks = [chunk for chunk in chunks if chunk["content"] not in existing_contents]
+        # Ids determinísticos também eliminam duplicatas dentro do próprio lote
+        new_chunks = {}
+        for chunk in chunks:
+            if chunk["content"] not in existing_contents:
+                new_chunks.setdefault(make_chunk_id(chunk), chunk)
         print(f"[DEBUG] Novos chunks a adicionar: {len(new_chunks)}")
+        incr("chunks_deduplicated", len(chunks) - len(new_chunks))
+
+        if new_chunks and not self.metadata_index.exists():
+            self.metadata_index.rebuild(self.vectorstore._collection)
+
+        new_items = list(new_chunks.items())
+        total_new = len(new_items)
 
-        total_new = len(new_chunks)
+        # Chunks novos que faltam gravar por arquivo de origem
+        remaining = {chunk.get("metadata", {}).get("relative_path", ""): 0 for chunk in chunks}
+        for _, chunk in new_items:
+            remaining[chunk.get("metadata", {}).get("relative_path", "")] += 1
+        for source, count in remaining.items():
+            if not count:
+                mark(manifest, "embed", source, "done")
         total_batches = (total_new + batch_size - 1) // batch_size
 
         for i in range(0, total_new, batch_size):
-            batch = new_chunks[i:i+batch_size]
-            texts = [chunk["content"] for chunk in batch]
-            metadatas = [chunk.get("metadata", {}) for chunk in batch]
-            self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+            batch = new_items[i:i+batch_size]
+            ids = [chunk_id for chunk_id, _ in batch]
+            texts = [chunk["content"] for _, chunk in batch]
+            metadatas = [chunk.get("metadata", {}) for _, chunk in batch]
+            with span("load.batch", size=len(batch)):
+                self.vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+            incr("vectors_added", len(batch))
+            for chunk_id, metadata in zip(ids, metadatas):
+                self.metadata_index.add(chunk_id, metadata)
+                source = metadata.get("relative_path", "")
+                remaining[source] -= 1
+                if not remaining[source]:
+                    mark(manifest, "embed", source, "done")
             print(f"[VectorWriter] Batch {i // batch_size + 1}/{total_batches} processado com {len(batch)} chunks.")
 
+        if total_new:
+            self.metadata_index.save()
         print(f"[VectorWriter] Total de {total_new} chunks novos adicionados.")
 
-    def query(self, query_text: str, k: int = 5) -> List[Document]:
-        return self.vectorstore.similarity_search(query_text, k=k)
+    def existing_ids(self, ids: List[str]) -> set:
+        """Ids já persistidos no store (consulta só por id, sem trazer conteúdo)."""
+        if not ids:
+            return set()
+        return set(self.vectorstore._collection.get(ids=ids, include=[])["ids"])
+
+    def write_embedded_chunks(self, ids: List[str], chunks: List[Dict], vectors):
+        """
+        Grava chunks cujos embeddings já foram calculados (ex: por outro estágio
+        do pipeline em streaming), sem passar pelo modelo de novo. Não salva o
+        índice de metadados: chame `metadata_index.save()` ao final.
+        """
+        if not ids:
+            return
+        with span("load.batch", size=len(ids)):
+            self.vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=[list(map(float, vector)) for vector in vectors],
+                documents=[chunk["content"] for chunk in chunks],
+                metadatas=[chunk.get("metadata", {}) for chunk in chunks],
+            )
+        for chunk_id, chunk in zip(ids, chunks):
+            self.metadata_index.add(chunk_id, chunk.get("metadata", {}))
+        incr("vectors_added", len(ids))
+
+    def query(self, query_text: str, k: int = 5, filters: Optional[Dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.query_with_score(query_text, k=k, filters=filters)]
 
-    def query_with_score(self, query_text: str, k: int = 5):
+    def query_with_score(self, query_text: str, k: int = 5, filters: Optional[Dict] = None):
+        filters = normalize_filters(filters)
+        if filters:
+            return scoped_similarity_search(
+                self.vectorstore, self.embeddings, self.metadata_index, query_text, k, filters
+            )
         return self.vectorstore.similarity_search_with_score(query_text, k=k)
     
-    def load_and_add_chunks(self, json_path: str, max_chunks: int = None):
+    def load_and_add_chunks(self, json_path: str, max_chunks: int = None, manifest=None):
         """
         Lê um arquivo JSONL de chunks, carrega até `max_chunks` entradas (ou todas se None)
-        e adiciona ao vetor.
+        e adiciona ao vetor. Com `manifest`, ignora arquivos de origem já concluídos.
         """
         if not os.path.exists(json_path):
             raise FileNotFoundError(f"Arquivo não encontrado: {json_path}")
@@ -65,7 +143,9 @@ class VectorWriter:
                     break
                 line = line.strip()
                 if line:
-                    chunks.append(json.loads(line))
+                    chunk = json.loads(line)
+                    if is_pending(manifest, "embed", chunk.get("metadata", {}).get("relative_path", "")):
+                        chunks.append(chunk)
 
-        self.add_chunks(chunks)
+        self.add_chunks(chunks, manifest=manifest)
         return chunks
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""
+Manifesto de execução do pipeline: id da execução, snapshot da configuração,
+status e tempos de cada passo e de cada item (arquivo ou documento) dentro dos
+estágios. Fica em `<raw_dir>/runs/<run_id>/manifest.json` e permite que
+`run.py --resume <run_id>` continue só o que não terminou, ou refaça um único
+documento com `--retry-item`.
+
+Estágios e chaves de item:
+- `extract`: caminho do arquivo de entrada
+- `clean`, `chunk`, `embed`: caminho relativo do markdown (`<nome>_ocr.md`)
+- `stream`: caminho do arquivo de entrada (pipeline em streaming)
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+RUNS_DIRNAME = "runs"
+MANIFEST_FILENAME = "manifest.json"
+# Intervalo mínimo entre gravações disparadas por itens (passos sempre gravam na hora)
+SAVE_INTERVAL = 2.0
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+# Passo concluído com itens falhos ou interrompidos: refeito no próximo --resume
+PARTIAL = "partial"
+
+# Estágios de item registrados por cada passo do run.py
+STEP_ITEM_STAGES = {
+    "extraction": ("extract",),
+    "transformation": ("clean", "chunk"),
+    "embedding_generation": ("embed",),
+    "streaming": ("stream",),
+}
+
+def item_aliases(item: str) -> set:
+    """Chaves que identificam o mesmo documento em estágios diferentes."""
+    return {item, f"{Path(item).stem}_ocr.md", Path(item).name}
+
+class RunManifest:
+    """Estado persistente de uma execução (thread-safe, gravação atômica)."""
+
+    def __init__(self, path: str, data: Dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.RLock()
+        self._last_save = 0.0
+
+    @property
+    def run_id(self) -> str:
+        return self.data["run_id"]
+
+    @property
+    def config(self) -> Dict:
+        return self.data["config"]
+
+    @property
+    def steps(self) -> List[str]:
+        return self.data["steps"]
+
+    @classmethod
+    def create(cls, runs_dir: str, config: Dict, steps: List[str]) -> "RunManifest":
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_id, suffix = stamp, 1
+        while os.path.exists(os.path.join(runs_dir, run_id)):
+            run_id, suffix = f"{stamp}_{suffix}", suffix + 1
+        path = os.path.join(runs_dir, run_id, MANIFEST_FILENAME)
+        manifest = cls(path, {
+            "run_id": run_id,
+            "status": RUNNING,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+            "config": config,
+            "steps": steps,
+            "only": None,
+            "stages": {},
+            "items": {},
+        })
+        manifest.save(force=True)
+        return manifest
+
+    @classmethod
+    def load(cls, runs_dir: str, run_id: str) -> "RunManifest":
+        """Carrega uma execução; `run_id="latest"` pega a mais recente."""
+        if run_id == "latest":
+            runs = sorted(p.parent.name for p in Path(runs_dir).glob(f"*/{MANIFEST_FILENAME}"))
+            if not runs:
+                raise FileNotFoundError(f"Nenhuma execução encontrada em: {runs_dir}")
+            run_id = runs[-1]
+        path = os.path.join(runs_dir, run_id, MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Manifesto não encontrado: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def save(self, force: bool = False):
+        with self._lock:
+            now = time.time()
+            if not force and now - self._last_save < SAVE_INTERVAL:
+                return
+            self.data["updated_at"] = now
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._last_save = now
+
+    # ------------------------
+    # Passos do run.py
+    # ------------------------
+
+    def stage_status(self, stage: str) -> str:
+        return self.data["stages"].get(stage, {}).get("status", PENDING)
+
+    def step_unfinished_items(self, stage: str) -> Dict[str, List[str]]:
+        """Itens não concluídos nos estágios de item do passo."""
+        unfinished = {}
+        for item_stage in STEP_ITEM_STAGES.get(stage, ()):
+            unfinished.update(self.unfinished_items(item_stage))
+        return unfinished
+
+    def is_finished(self, stage: str) -> bool:
+        """Passo concluído e sem itens pendentes (senão o --resume entra nele de novo)."""
+        return self.stage_status(stage) == DONE and not self.step_unfinished_items(stage)
+
+    def start_stage(self, stage: str):
+        with self._lock:
+            self.data["stages"][stage] = {"status": RUNNING, "started_at": time.time()}
+            self.save(force=True)
+
+    def finish_stage(self, stage: str, error: Optional[str] = None):
+        with self._lock:
+            info = self.data["stages"].setdefault(stage, {"started_at": time.time()})
+            info["finished_at"] = time.time()
+            info["seconds"] = round(info["finished_at"] - info["started_at"], 3)
+            unfinished = self.step_unfinished_items(stage)
+            if error:
+                info["status"] = FAILED
+                info["error"] = error
+            elif unfinished:
+                info["status"] = PARTIAL
+                info["unfinished"] = sum(len(items) for items in unfinished.values())
+            else:
+                info["status"] = DONE
+            self.save(force=True)
+
+    def finish(self):
+        with self._lock:
+            unfinished = self.unfinished_items()
+            self.data["status"] = FAILED if unfinished or any(
+                info.get("status") != DONE for info in self.data["stages"].values()
+            ) else DONE
+            self.save(force=True)
+
+    # ------------------------
+    # Itens dentro dos estágios
+    # ------------------------
+
+    def mark(self, stage: str, item: str, status: str, seconds: Optional[float] = None, error: Optional[str] = None):
+        with self._lock:
+            entry = {"status": status, "updated_at": time.time()}
+            if seconds is not None:
+                entry["seconds"] = round(seconds, 3)
+            if error:
+                entry["error"] = error
+            self.data["items"].setdefault(stage, {})[item] = entry
+            self.save()
+
+    def is_pending(self, stage: str, item: str) -> bool:
+        """Item ainda precisa rodar: não concluído e dentro do recorte de `retry_items`."""
+        only = self.data.get("only")
+        if only and not (item_aliases(item) & set(only)):
+            return False
+        return self.data["items"].get(stage, {}).get(item, {}).get("status") != DONE
+
+    @contextmanager
+    def track(self, stage: str, item: str):
+        """
+        Marca o item como concluído ao sair do bloco, ou como falho (com a
+        mensagem de erro) sem interromper o estágio: o próximo `--resume` o refaz.
+        """
+        start = time.perf_counter()
+        self.mark(stage, item, RUNNING)
+        try:
+            yield
+        except Exception as e:
+            print(f"[Run {self.run_id}] Falha em {stage} ({item}): {e}")
+            self.mark(stage, item, FAILED, time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+        else:
+            self.mark(stage, item, DONE, time.perf_counter() - start)
+
+    def unfinished_items(self, stage: Optional[str] = None) -> Dict[str, List[str]]:
+        stages = [stage] if stage else list(self.data["items"])
+        unfinished = {}
+        for name in stages:
+            items = [item for item, entry in self.data["items"].get(name, {}).items() if entry["status"] != DONE]
+            if items:
+                unfinished[name] = items
+        return unfinished
+
+    def retry_items(self, items: Iterable[str]):
+        """
+        Restringe a execução aos documentos informados (caminho de entrada ou
+        `<nome>_ocr.md`) e os reabre em todos os estágios e passos.
+        """
+        with self._lock:
+            keys = set()
+            for item in items:
+                keys |= item_aliases(item)
+            self.data["only"] = sorted(keys)
+            for stage_items in self.data["items"].values():
+                for item, entry in stage_items.items():
+                    if item_aliases(item) & keys:
+                        entry["status"] = PENDING
+            for info in self.data["stages"].values():
+                info["status"] = PENDING
+            self.data["status"] = RUNNING
+            self.save(force=True)
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        summary = {}
+        for stage, items in self.data["items"].items():
+            counts = {}
+            for entry in items.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            summary[stage] = counts
+        return summary
+
+def is_pending(manifest: Optional[RunManifest], stage: str, item: str) -> bool:
+    return manifest is None or manifest.is_pending(stage, item)
+
+def track(manifest: Optional[RunManifest], stage: str, item: str):
+    """`manifest.track(...)`, ou um contexto nulo quando não há manifesto."""
+    return manifest.track(stage, item) if manifest is not None else nullcontext()
+
+def mark(manifest: Optional[RunManifest], stage: str, item: str, status: str, **kwargs):
+    if manifest is not None:
+        manifest.mark(stage, item, status, **kwargs)
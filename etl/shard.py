@@ -0,0 +1,222 @@
+"""
+Ingestão particionada: cada nó (ou processo) recebe uma fatia determinística
+dos arquivos de origem, pelo hash do caminho relativo, e roda o pipeline em
+streaming para um diretório próprio (`<raw_dir>/shards/<i>-of-<n>/`), com
+chunks, Chroma e BM25 parciais. O passo de merge junta as saídas parciais no
+índice servido, sem duplicar chunks (ids determinísticos).
+
+Nós:
+    python run.py --run-streaming-exec --shard 0/4     # em cada nó, com i = 0..3
+    python run.py --run-shard-merge-exec               # depois que todos terminarem
+
+Local (vários processos na mesma máquina, seguido do merge):
+    python -m etl.shard --num-shards 4
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import click
+from langchain_chroma import Chroma
+
+from etl.load.bm25_index import sync_bm25_from_jsonl
+from etl.load.index_version import bump_index_version
+from etl.load.metadata_index import MetadataIndex
+from etl.load.vector_gc import store_lock
+from etl.load.vector_reader import iter_collection
+from etl.load.vector_writer import make_chunk_id
+
+SHARDS_DIRNAME = "shards"  # fora das transformações de raw_dir (PIPELINE_DIRNAMES)
+
+def parse_shard(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Converte "2/4" em (2, 4)."""
+    if not spec:
+        return None
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard inválido: '{spec}'. Use <índice>/<total>, com 0 <= índice < total.")
+    return index, count
+
+def shard_of(file: str, root: str, count: int) -> int:
+    """
+    Shard de um arquivo: hash do caminho relativo à raiz configurada (com o nome
+    da raiz), estável entre máquinas com pontos de montagem diferentes.
+    """
+    key = f"{Path(root).name}/{Path(os.path.relpath(file, root)).as_posix()}"
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") % count
+
+def shard_layout(raw_dir: str, index: int, count: int) -> Dict[str, str]:
+    """Diretórios e arquivos de saída parciais de um shard."""
+    base = Path(raw_dir) / SHARDS_DIRNAME / f"{index}-of-{count}"
+    return {
+        "raw_dir": str(base / "raw"),
+        "clean_dir": str(base / "clean"),
+        "chunks_path": str(base / "chunks" / "chunks_output.jsonl"),
+        "embeddings_dir": str(base / "embeddings"),
+        "bm25_index_path": str(base / "bm25" / "bm25_index.pkl"),
+    }
+
+def _find_shards(raw_dir: str) -> List[Tuple[int, int]]:
+    """Shards (índice, total) com saída em `<raw_dir>/shards`."""
+    shards_dir = Path(raw_dir) / SHARDS_DIRNAME
+    if not shards_dir.exists():
+        return []
+    shards = []
+    for path in shards_dir.iterdir():
+        index, sep, count = path.name.partition("-of-")
+        if path.is_dir() and sep and index.isdigit() and count.isdigit():
+            shards.append((int(index), int(count)))
+    return sorted(shards)
+
+def merge_shards(
+    raw_dir: str,
+    clean_dir: str,
+    chunks_path: str,
+    embeddings_dir: str,
+    bm25_index_path: Optional[str] = None,
+    batch_size: int = 1000,
+) -> Dict:
+    """
+    Junta as saídas parciais de todos os shards em `<raw_dir>/shards` no índice
+    servido: vetores (com os embeddings já calculados), índice de metadados,
+    JSONL de chunks, cópias limpas (usadas pelo GC) e BM25. Chunks cujo id já
+    existe no destino são ignorados, então o merge pode ser repetido.
+
+    Returns:
+        dict: Contagens do merge.
+    """
+    print("\n🟢 Juntando shards...")
+    start = time.perf_counter()
+    shards = _find_shards(raw_dir)
+    if not shards:
+        raise FileNotFoundError(f"Nenhum shard encontrado em: {Path(raw_dir) / SHARDS_DIRNAME}")
+
+    counts = {count for _, count in shards}
+    if len(counts) > 1:
+        raise ValueError(f"Shards de particionamentos diferentes em {Path(raw_dir) / SHARDS_DIRNAME}: {sorted(counts)}")
+    missing = sorted(set(range(counts.pop())) - {index for index, _ in shards})
+    if missing:
+        print(f"⚠️ Shards ausentes (ainda não gerados?): {missing}")
+    layouts = [(f"{index}-of-{count}", shard_layout(raw_dir, index, count)) for index, count in shards]
+
+    report = {"shards": len(shards), "vectors": 0, "vectors_skipped": 0, "chunks": 0, "clean_files": 0}
+
+    # ------------------------
+    # JSONL de chunks e cópias limpas
+    # ------------------------
+
+    known_ids = set()
+    if os.path.exists(chunks_path):
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    known_ids.add(make_chunk_id(json.loads(line)))
+                except json.JSONDecodeError:
+                    continue
+
+    if os.path.dirname(chunks_path):
+        os.makedirs(os.path.dirname(chunks_path), exist_ok=True)
+    with open(chunks_path, "a", encoding="utf-8") as out:
+        for _, layout in layouts:
+            if os.path.exists(layout["chunks_path"]):
+                with open(layout["chunks_path"], "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            chunk = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        chunk_id = make_chunk_id(chunk)
+                        if chunk_id in known_ids:
+                            continue
+                        known_ids.add(chunk_id)
+                        out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                        report["chunks"] += 1
+
+            shard_clean = Path(layout["clean_dir"])
+            for path in shard_clean.rglob("*.md") if shard_clean.exists() else []:
+                target = Path(clean_dir) / path.relative_to(shard_clean)
+                if not target.exists() or target.read_bytes() != path.read_bytes():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(path, target)
+                    report["clean_files"] += 1
+
+    # ------------------------
+    # Vetores e índice de metadados
+    # ------------------------
+
+    os.makedirs(embeddings_dir, exist_ok=True)
+    with store_lock(embeddings_dir):
+        collection = Chroma(persist_directory=embeddings_dir)._collection
+        metadata_index = MetadataIndex.load(embeddings_dir)
+        if not metadata_index.exists():
+            metadata_index.rebuild(collection)
+
+        for name, layout in layouts:
+            if not os.path.exists(layout["embeddings_dir"]):
+                continue
+            shard_collection = Chroma(persist_directory=layout["embeddings_dir"])._collection
+            for page in iter_collection(
+                shard_collection, batch_size=batch_size, fields=("embeddings", "metadatas", "documents")
+            ):
+                existing = set(collection.get(ids=page["ids"], include=[])["ids"])
+                keep = [i for i, doc_id in enumerate(page["ids"]) if doc_id not in existing]
+                report["vectors_skipped"] += len(page["ids"]) - len(keep)
+                if not keep:
+                    continue
+                collection.upsert(
+                    ids=[page["ids"][i] for i in keep],
+                    embeddings=page["embeddings"][keep],
+                    documents=[page["documents"][i] for i in keep],
+                    metadatas=[page["metadatas"][i] for i in keep],
+                )
+                for i in keep:
+                    metadata_index.add(page["ids"][i], page["metadatas"][i] or {})
+                report["vectors"] += len(keep)
+            print(f"[Merge] {name}: {report['vectors']} vetores novos até aqui.")
+
+        metadata_index.save()
+        total = collection.count()
+
+    if bm25_index_path and os.path.exists(chunks_path):
+        sync_bm25_from_jsonl(chunks_path, bm25_index_path)
+
+    marker = bump_index_version(embeddings_dir, stage="merge", count=total)
+    report["index_version"] = marker["version"]
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    print(
+        f"✅ {report['shards']} shards: {report['vectors']} vetores e {report['chunks']} chunks novos "
+        f"({report['vectors_skipped']} já existentes), {report['clean_files']} arquivos limpos copiados "
+        f"em {report['seconds']}s. Índice na versão {marker['version']}."
+    )
+    return report
+
+@click.command(help="Roda N shards do pipeline em streaming como processos locais e depois o merge.")
+@click.option("--num-shards", required=True, type=int, help="Número de shards (processos).")
+@click.option("--stream-workers", default=None, help="Workers por estágio em cada shard (ex: extract=2,embed=1).")
+@click.option("--skip-merge", is_flag=True, default=False, help="Não junta os shards ao final.")
+def main(num_shards, stream_workers, skip_merge):
+    run_py = str(Path(__file__).resolve().parent.parent / "run.py")
+    processes = []
+    for index in range(num_shards):
+        command = [sys.executable, run_py, "--run-streaming-exec", "--shard", f"{index}/{num_shards}"]
+        if stream_workers:
+            command += ["--stream-workers", stream_workers]
+        print(f"[Shard] Iniciando {index}/{num_shards}: {' '.join(command)}")
+        processes.append(subprocess.Popen(command))
+
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        print(f"❌ Shards com falha: {failed} (retome com run.py --resume, sem merge).")
+        sys.exit(1)
+    if not skip_merge:
+        sys.exit(subprocess.call([sys.executable, run_py, "--run-shard-merge-exec"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Orquestrador em streaming: cada documento percorre extract -> clean -> chunk
+-> embed -> write por filas limitadas, com workers próprios por estágio.
+Assim o embedding dos primeiros documentos acontece enquanto os seguintes
+ainda estão no OCR, em vez de fases em lote que esperam a anterior terminar.
+
+Os artefatos intermediários continuam sendo gravados (`_ocr.md` da extração,
+cópia limpa e linhas do JSONL de chunks), mas os dois últimos saem por uma
+thread separada, fora do caminho crítico. Os ids, metadados e caminhos
+relativos são os mesmos do modo em lote, então os dois modos se misturam
+(GC, BM25, manifesto de chunks).
+"""
+import os
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from etl.extract.smart_loader import collect_files, extract_document, VALID_EXTENSIONS
+from etl.transform.text_cleaner import clean_document
+from etl.transform.text_splitter import chunk_text, load_processed_files
+from etl.load.vector_writer import VectorWriter, make_chunk_id
+from etl.load.bm25_index import BM25Index
+from etl.load.index_version import bump_index_version
+from etl.run_manifest import is_pending, mark
+from etl.shard import shard_of
+from utils.instrumentation import span, incr
+from utils.resources import apply_thread_limits, get_governor
+from etl.extract.ocr_cache import get_ocr_cache
+from etl.extract.ocr_files import shutdown_ocr_pool
+
+STAGES = ("extract", "clean", "chunk", "embed", "write")
+
+# Workers por estágio; `write` é sempre 1 (Chroma, BM25 e índice de metadados)
+DEFAULT_WORKERS = {"extract": 2, "clean": 2, "chunk": 1, "embed": 1}
+# Itens em espera entre dois estágios: limita a memória e aplica contrapressão
+QUEUE_SIZE = 8
+# Chunks por chamada ao modelo de embeddings (documentos são agrupados até esse total)
+EMBED_BATCH_SIZE = 64
+
+_DONE = object()
+
+def parse_workers(spec: Optional[str]) -> Dict[str, int]:
+    """Converte "extract=4,embed=2" em contagens de workers (demais estágios no padrão)."""
+    workers = dict(DEFAULT_WORKERS)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_WORKERS:
+            raise ValueError(f"Estágio inválido: '{name}'. Use um de {tuple(DEFAULT_WORKERS)}.")
+        workers[name] = max(1, int(value))
+    return workers
+
+class _Stage:
+    """
+    Um estágio com `workers` threads lendo de `inbox` e escrevendo em `outbox`.
+    `fn` recebe uma lista de itens e devolve os itens que seguem adiante.
+    Com `batch_limit`, cada worker junta itens já disponíveis até esse peso
+    (ex: total de chunks) antes de chamar `fn`. Falhas não param o estágio:
+    `on_error(item, mensagem)` é chamado para cada item do lote perdido.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[Dict]], List[Dict]],
+        workers: int,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        batch_limit: Optional[int] = None,
+        weight: Callable[[Dict], int] = lambda item: 1,
+        on_error: Optional[Callable[[Dict, str], None]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.batch_limit = batch_limit
+        self.weight = weight
+        self.on_error = on_error
+        self.downstream_workers = 1
+        self.stats = {"items": 0, "errors": 0, "busy_s": 0.0}
+        self._lock = threading.Lock()
+        self._remaining = workers
+        self._threads = []
+
+    def _next_batch(self) -> Optional[List[Dict]]:
+        item = self.inbox.get()
+        if item is _DONE:
+            return None
+        batch = [item]
+        if self.batch_limit:
+            total = self.weight(item)
+            while total < self.batch_limit:
+                try:
+                    item = self.inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    # Devolve o sinal de fim para o próximo `get` deste estágio
+                    self.inbox.put(_DONE)
+                    break
+                batch.append(item)
+                total += self.weight(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            start = time.perf_counter()
+            try:
+                with span(f"stream.{self.name}", items=len(batch)):
+                    results = self.fn(batch)
+            except Exception as e:
+                print(f"[Stream] Falha no estágio {self.name} ({', '.join(i['file'] for i in batch)}): {e}")
+                incr("stream_errors", stage=self.name)
+                if self.on_error is not None:
+                    for item in batch:
+                        self.on_error(item, f"{self.name}: {type(e).__name__}: {e}")
+                results = []
+                with self._lock:
+                    self.stats["errors"] += len(batch)
+            with self._lock:
+                self.stats["items"] += len(batch)
+                self.stats["busy_s"] += time.perf_counter() - start
+            if self.outbox is not None:
+                for result in results:
+                    self.outbox.put(result)
+
+        # O último worker a sair avisa cada worker do estágio seguinte
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last and self.outbox is not None:
+            for _ in range(self.downstream_workers):
+                self.outbox.put(_DONE)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, daemon=True, name=f"stream-{self.name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+def run_streaming_pipeline(
+    paths: List[str],
+    raw_dir: str,
+    clean_dir: str,
+    chunks_path: str,
+    embeddings_dir: str,
+    bm25_index_path: Optional[str] = None,
+    workers: Optional[Dict[str, int]] = None,
+    queue_size: int = QUEUE_SIZE,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    manifest=None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Dict:
+    """
+    Executa extração, limpeza, chunking, embeddings e escrita de forma
+    sobreposta. Documentos cujo `relative_path` já está no JSONL de chunks são
+    pulados (mesma regra do chunking em lote). Com `manifest` (RunManifest),
+    cada arquivo é registrado no estágio `stream`: concluído quando seus chunks
+    chegam ao JSONL, ou falho com o estágio e o erro. Com `shard=(i, n)`, só
+    processa os arquivos cujo `shard_of` é `i` (ver `etl.shard`).
+
+    Returns:
+        dict: Contagens, tempo total e utilização de cada estágio.
+    """
+    print("\n🟢 Iniciando pipeline em streaming...")
+    workers = {**DEFAULT_WORKERS, **(workers or {})}
+    start = time.perf_counter()
+
+    # Embeddings dividem a máquina com os pools de OCR: torch deste processo fica com a fatia `embed`
+    governor = get_governor()
+    apply_thread_limits(governor.threads_for("embed"))
+
+    writer = VectorWriter(persist_directory=embeddings_dir)
+    if not writer.metadata_index.exists():
+        writer.metadata_index.rebuild(writer.vectorstore._collection)
+    bm25_index = BM25Index.load_or_create(bm25_index_path) if bm25_index_path else None
+    processed = load_processed_files(chunks_path)
+
+    counts = {"documents": 0, "skipped": 0, "discarded": 0, "chunks": 0, "vectors": 0}
+    counts_lock = threading.Lock()
+
+    def count(key: str, value: int = 1):
+        with counts_lock:
+            counts[key] += value
+
+    # ------------------------
+    # Estágios
+    # ------------------------
+
+    def extract(batch: List[Dict]) -> List[Dict]:
+        for item in batch:
+            governor.wait_for_memory()
+            item["text"] = extract_document(item["file"], raw_dir) or ""
+            if not item["text"].strip():
+                mark(manifest, "stream", item["file"], "done")
+        return [item for item in batch if item["text"].strip()]
+
+    def clean(batch: List[Dict]) -> List[Dict]:
+        results = []
+        for item in batch:
+            cleaned, skip_reason = clean_document(item.pop("text"))
+            if skip_reason:
+                print(f"[Stream] Descartado ({skip_reason}): {item['rel_path']}")
+                incr("files_skipped", reason=skip_reason)
+                count("discarded")
+                mark(manifest, "stream", item["file"], "done")
+                continue
+            item["cleaned"] = cleaned
+            artifacts.put(("clean", item["rel_path"], cleaned))
+            results.append(item)
+        return results
+
+    def chunk(batch: List[Dict]) -> List[Dict]:
+        for item in batch:
+            chunks = {}
+            for chunk_data in chunk_text(item.pop("cleaned"), item["rel_path"]):
+                chunks.setdefault(make_chunk_id(chunk_data), chunk_data)
+            item["ids"] = list(chunks)
+            item["chunks"] = list(chunks.values())
+            incr("chunks_created", len(chunks))
+            if not chunks:
+                mark(manifest, "stream", item["file"], "done")
+        return [item for item in batch if item["chunks"]]
+
+    def embed(batch: List[Dict]) -> List[Dict]:
+        ids = [chunk_id for item in batch for chunk_id in item["ids"]]
+        existing = writer.existing_ids(ids)
+        pending = [
+            (item, i) for item in batch for i, chunk_id in enumerate(item["ids"]) if chunk_id not in existing
+        ]
+        vectors = writer.embeddings.embed_documents([item["chunks"][i]["content"] for item, i in pending])
+        for item in batch:
+            item["vectors"] = {}
+        for (item, i), vector in zip(pending, vectors):
+            item["vectors"][i] = vector
+        incr("chunks_deduplicated", len(ids) - len(pending))
+        return batch
+
+    def write(batch: List[Dict]) -> List[Dict]:
+        for item in batch:
+            new = sorted(item["vectors"])
+            writer.write_embedded_chunks(
+                [item["ids"][i] for i in new], [item["chunks"][i] for i in new], [item["vectors"][i] for i in new]
+            )
+            if bm25_index is not None:
+                bm25_index.update_source(item["rel_path"], item["chunks"])
+            count("documents")
+            count("chunks", len(item["chunks"]))
+            count("vectors", len(new))
+            # Manifesto só depois do store: se o processo cair antes, o documento é refeito
+            artifacts.put(("chunks", item["file"], item["chunks"]))
+        return []
+
+    # ------------------------
+    # Artefatos (fora do caminho crítico)
+    # ------------------------
+
+    artifacts: queue.Queue = queue.Queue()
+
+    def write_artifacts():
+        if os.path.dirname(chunks_path):
+            os.makedirs(os.path.dirname(chunks_path), exist_ok=True)
+        with open(chunks_path, "a", encoding="utf-8") as chunks_file:
+            while True:
+                entry = artifacts.get()
+                if entry is _DONE:
+                    break
+                kind, key, payload = entry
+                if kind == "clean":
+                    output_path = Path(clean_dir) / key
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    output_path.write_text(payload, encoding="utf-8")
+                else:
+                    for chunk_data in payload:
+                        chunks_file.write(json.dumps(chunk_data, ensure_ascii=False) + "\n")
+                    chunks_file.flush()
+                    mark(manifest, "stream", key, "done")
+
+    artifact_thread = threading.Thread(target=write_artifacts, daemon=True, name="stream-artifacts")
+    artifact_thread.start()
+
+    # ------------------------
+    # Montagem das filas e execução
+    # ------------------------
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in STAGES]
+    stage_specs = [
+        ("extract", extract, workers["extract"], None),
+        ("clean", clean, workers["clean"], None),
+        ("chunk", chunk, workers["chunk"], None),
+        ("embed", embed, workers["embed"], embed_batch_size),
+        ("write", write, 1, embed_batch_size),
+    ]
+    stages = []
+    for i, (name, fn, n_workers, batch_limit) in enumerate(stage_specs):
+        outbox = queues[i + 1] if i + 1 < len(queues) else None
+        stages.append(_Stage(
+            name, fn, n_workers, queues[i], outbox,
+            batch_limit=batch_limit, weight=lambda item: len(item.get("ids", ())),
+            on_error=lambda item, error: mark(manifest, "stream", item["file"], "failed", error=error),
+        ))
+    for stage, downstream in zip(stages, stages[1:]):
+        stage.downstream_workers = downstream.workers
+    for stage in stages:
+        stage.start()
+
+    # Alimenta o primeiro estágio; a fila limitada segura a leitura adiantada
+    for path in paths:
+        for file in collect_files(path, extensions=VALID_EXTENSIONS):
+            if shard is not None and shard_of(file, path, shard[1]) != shard[0]:
+                continue
+            rel_path = f"{Path(file).stem}_ocr.md"
+            if rel_path in processed or not is_pending(manifest, "stream", file):
+                count("skipped")
+                continue
+            queues[0].put({"file": file, "rel_path": rel_path})
+    for _ in range(stages[0].workers):
+        queues[0].put(_DONE)
+
+    for stage in stages:
+        stage.join()
+    shutdown_ocr_pool()
+    artifacts.put(_DONE)
+    artifact_thread.join()
+
+    writer.metadata_index.save()
+    if bm25_index is not None and counts["documents"]:
+        bm25_index.save(bm25_index_path)
+    marker = bump_index_version(embeddings_dir, stage="stream", count=writer.vectorstore._collection.count())
+
+    elapsed = time.perf_counter() - start
+    ocr_cache = get_ocr_cache()
+    summary = {
+        **counts,
+        "resources": governor.snapshot(),
+        "ocr_cache": ocr_cache.stats() if ocr_cache else None,
+        "seconds": round(elapsed, 2),
+        "index_version": marker["version"],
+        "stages": {
+            stage.name: {
+                **stage.stats,
+                "workers": stage.workers,
+                "busy_s": round(stage.stats["busy_s"], 2),
+                "utilization": round(stage.stats["busy_s"] / (stage.workers * elapsed), 3) if elapsed else 0.0,
+            }
+            for stage in stages
+        },
+    }
+
+    for name, stats in summary["stages"].items():
+        print(
+            f"[Stream] {name:<8} workers={stats['workers']} itens={stats['items']} "
+            f"erros={stats['errors']} ocupado={stats['busy_s']}s ({stats['utilization']:.0%})"
+        )
+    print(
+        f"✅ {counts['documents']} documentos, {counts['chunks']} chunks ({counts['vectors']} vetores novos) "
+        f"em {summary['seconds']}s; {counts['skipped']} já processados, {counts['discarded']} descartados."
+    )
+    return summary
@@ -1,10 +1,31 @@
 import os
 import re
 from langdetect import detect
+from etl.run_manifest import is_pending, track
+from utils.instrumentation import span, incr
 
 # Define o número mínimo de palavras para considerar um arquivo relevante para processamento
 MIN_WORDS = 40  # mínimo de palavras para considerar o arquivo relevante
 
+# Subpastas de raw_dir criadas pelo próprio pipeline (shards, manifestos, métricas, perfis): não são fontes
+PIPELINE_DIRNAMES = ("shards", "runs", "metrics", "profiles")
+
+def walk_sources(input_folder, exclude=()):
+    """
+    os.walk de `input_folder` sem descer nas subpastas do pipeline
+    (PIPELINE_DIRNAMES, na raiz) nem nas pastas de `exclude` (ex.: a pasta
+    limpa quando fica dentro de raw_dir). Sem isso, saídas parciais de shards
+    já juntadas voltariam a ser chunkadas como fontes novas.
+    """
+    excluded = {os.path.abspath(path) for path in exclude if path}
+    for root, dirs, files in os.walk(input_folder):
+        dirs[:] = [
+            d for d in dirs
+            if not (root == input_folder and d in PIPELINE_DIRNAMES)
+            and os.path.abspath(os.path.join(root, d)) not in excluded
+        ]
+        yield root, dirs, files
+
 def detect_lang(text):
     """
     Detecta o idioma do texto usando a biblioteca langdetect.
@@ -48,7 +69,26 @@ def clean_markdown_text(text: str) -> str:
 
     return text.strip()
 
-def process_markdown_folder(input_folder: str, output_folder: str):
+def clean_document(content: str):
+    """
+    Limpa o texto de um documento e decide se ele segue no pipeline.
+
+    Returns:
+        (texto limpo, motivo do descarte ou None): motivo "english" ou "short".
+    """
+    cleaned = clean_markdown_text(content)
+
+    # Ignora arquivos em inglês
+    if detect_lang(cleaned) == "en":
+        return cleaned, "english"
+
+    # Ignora arquivos com pouco conteúdo (menos que MIN_WORDS)
+    if len(cleaned.split()) < MIN_WORDS:
+        return cleaned, "short"
+
+    return cleaned, None
+
+def process_markdown_folder(input_folder: str, output_folder: str, manifest=None):
     """
     Percorre recursivamente a pasta 'input_folder' buscando arquivos com extensão .md.
     Para cada arquivo Markdown:
@@ -59,8 +99,9 @@ def process_markdown_folder(input_folder: str, output_folder: str):
     - Ignora arquivos com menos de MIN_WORDS palavras
     - Salva o texto limpo na mesma estrutura de pastas dentro de 'output_folder'
     - Exibe no console mensagens informando se o arquivo foi processado, ignorado ou descartado
+    - Com `manifest` (RunManifest), pula arquivos já concluídos na execução e registra o status de cada um
     """
-    for root, _, files in os.walk(input_folder):
+    for root, _, files in walk_sources(input_folder, exclude=[output_folder]):
         # calcula o caminho relativo da pasta atual para replicar a estrutura
         rel_path = os.path.relpath(root, input_folder)
         dest_dir = os.path.join(output_folder, rel_path)
@@ -70,29 +111,34 @@ def process_markdown_folder(input_folder: str, output_folder: str):
             if filename.lower().endswith('.md'):
                 input_path = os.path.join(root, filename)
                 output_path = os.path.join(dest_dir, filename)
+                item = os.path.relpath(input_path, input_folder)
+                if not is_pending(manifest, "clean", item):
+                    continue
 
                 try:
-                    with open(input_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
+                    with track(manifest, "clean", item):
+                        with span("transform.clean", file=filename):
+                            with open(input_path, 'r', encoding='utf-8') as f:
+                                content = f.read()
 
-                    cleaned = clean_markdown_text(content)
-                    lang = detect_lang(cleaned)
+                            cleaned, skip_reason = clean_document(content)
 
-                    # Ignora arquivos em inglês
-                    if lang == "en":
-                        print(f'Ignorado (inglês): {input_path}')
-                        continue
+                        if skip_reason == "english":
+                            print(f'Ignorado (inglês): {input_path}')
+                            incr("files_skipped", reason=skip_reason)
+                            continue
 
-                    # Ignora arquivos com pouco conteúdo (menos que MIN_WORDS)
-                    if len(cleaned.split()) < MIN_WORDS:
-                        print(f'Descartado (pouco conteúdo): {input_path}')
-                        continue
+                        if skip_reason == "short":
+                            print(f'Descartado (pouco conteúdo): {input_path}')
+                            incr("files_skipped", reason=skip_reason)
+                            continue
 
-                    # Salva arquivo limpo na pasta de destino
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        f.write(cleaned)
+                        # Salva arquivo limpo na pasta de destino
+                        with open(output_path, 'w', encoding='utf-8') as f:
+                            f.write(cleaned)
 
-                    print(f'Processado: {input_path} -> {output_path}')
+                        print(f'Processado: {input_path} -> {output_path}')
+                        incr("files_cleaned")
 
                 except Exception as e:
                     print(f'Erro ao processar {input_path}: {e}')
@@ -1,6 +1,12 @@
 import os
 import json
+import time
+import hashlib
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from etl.load.bm25_index import BM25Index
+from etl.transform.text_cleaner import detect_lang, walk_sources
+from etl.run_manifest import is_pending, mark
+from utils.instrumentation import span, incr
 
 # Configurações para dividir o texto em chunks:
 CHUNK_SIZE = 800         # tamanho máximo de cada chunk em caracteres
@@ -14,7 +20,9 @@ def process_markdown_file(file_path, base_dir):
     - Divide o texto em chunks utilizando RecursiveCharacterTextSplitter da LangChain,
       que respeita separadores hierárquicos para cortes naturais.
     - Para cada chunk, cria um dicionário com o conteúdo e metadados (nome do arquivo,
-      caminho relativo e índice do chunk).
+      caminho relativo, índice do chunk, idioma do arquivo, data de ingestão em epoch
+      e hash do conteúdo do arquivo), usados pelos filtros da busca com escopo e pela
+      reconciliação do vector store.
     Retorna a lista de dicionários de chunks.
     
     Parâmetros:
@@ -24,6 +32,14 @@ def process_markdown_file(file_path, base_dir):
     with open(file_path, 'r', encoding='utf-8') as f:
         text = f.read()
 
+    return chunk_text(text, os.path.relpath(file_path, base_dir))
+
+def chunk_text(text, rel_path):
+    """
+    Divide um texto já limpo em chunks com os mesmos metadados de
+    process_markdown_file. `rel_path` é o caminho relativo do arquivo limpo
+    (identifica a fonte no manifesto, no BM25 e nos ids do vector store).
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
@@ -31,8 +47,10 @@ def process_markdown_file(file_path, base_dir):
     )
 
     chunks = splitter.split_text(text)
-    rel_path = os.path.relpath(file_path, base_dir)
-    filename = os.path.basename(file_path)
+    filename = os.path.basename(rel_path)
+    language = detect_lang(text[:2000])
+    ingested_at = int(time.time())
+    source_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
 
     chunk_dicts = []
     for i, chunk in enumerate(chunks):
@@ -41,7 +59,10 @@ def process_markdown_file(file_path, base_dir):
             "metadata": {
                 "source_file": filename,
                 "relative_path": rel_path,
-                "chunk_index": i
+                "chunk_index": i,
+                "language": language,
+                "ingested_at": ingested_at,
+                "source_hash": source_hash
             }
         }
         chunk_dicts.append(chunk_data)
@@ -73,7 +94,25 @@ def load_processed_files(output_jsonl):
                     continue
     return processed_files
 
-def chunk_markdown_folder(input_folder, output_jsonl="chunks_output.jsonl"):
+def load_ingested_at(output_jsonl):
+    """
+    Como load_processed_files, mas devolve o `ingested_at` de cada arquivo já
+    processado (o do primeiro chunk, o mesmo que o GC do vector store compara).
+    """
+    ingested = {}
+    if os.path.exists(output_jsonl):
+        with open(output_jsonl, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    metadata = json.loads(line).get("metadata", {})
+                except json.JSONDecodeError:
+                    continue
+                source_file = metadata.get("relative_path")
+                if source_file and source_file not in ingested:
+                    ingested[source_file] = metadata.get("ingested_at")
+    return ingested
+
+def chunk_markdown_folder(input_folder, output_jsonl="chunks_output.jsonl", bm25_index_path=None, manifest=None):
     """
     Processa todos os arquivos Markdown dentro da pasta 'input_folder' (recursivamente).
     Para cada arquivo .md que ainda não foi processado:
@@ -85,21 +124,41 @@ def chunk_markdown_folder(input_folder, output_jsonl="chunks_output.jsonl"):
     Parâmetros:
     - input_folder: pasta raiz com arquivos Markdown a serem processados.
     - output_jsonl: arquivo JSONL onde os chunks serão salvos (padrão: "chunks_output.jsonl").
+    - bm25_index_path: se informado, atualiza incrementalmente o índice BM25 com os novos arquivos.
+    - manifest: RunManifest opcional; cada arquivo só é marcado como concluído depois
+      que seus chunks foram gravados no JSONL, e uma falha não interrompe os demais.
     """
     processed_files = load_processed_files(output_jsonl)
+    bm25_index = BM25Index.load_or_create(bm25_index_path) if bm25_index_path else None
     all_chunks = []
+    chunked_files = []
 
-    for root, _, files in os.walk(input_folder):
+    for root, _, files in walk_sources(input_folder):
         for file in files:
             if file.endswith(".md"):
                 file_path = os.path.join(root, file)
                 rel_path = os.path.relpath(file_path, input_folder)
+                if not is_pending(manifest, "chunk", rel_path):
+                    continue
                 if rel_path in processed_files:
                     print(f"Ignorando já processado: {rel_path}")
+                    incr("files_skipped", reason="already_chunked")
                     continue
                 print(f"Processando: {file_path}")
-                chunks = process_markdown_file(file_path, input_folder)
+                try:
+                    with span("transform.chunk", file=rel_path):
+                        chunks = process_markdown_file(file_path, input_folder)
+                except Exception as e:
+                    if manifest is None:
+                        raise
+                    print(f"Erro ao gerar chunks de {file_path}: {e}")
+                    mark(manifest, "chunk", rel_path, "failed", error=f"{type(e).__name__}: {e}")
+                    continue
                 all_chunks.extend(chunks)
+                chunked_files.append(rel_path)
+                if bm25_index is not None:
+                    bm25_index.update_source(rel_path, chunks)
+                incr("chunks_created", len(chunks))
 
     # Append os novos chunks ao arquivo jsonl, mantendo os anteriores
     output_dir = os.path.dirname(output_jsonl)
@@ -109,5 +168,11 @@ def chunk_markdown_folder(input_folder, output_jsonl="chunks_output.jsonl"):
     with open(output_jsonl, 'a', encoding='utf-8') as f:
         for chunk in all_chunks:
             f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+    for rel_path in chunked_files:
+        mark(manifest, "chunk", rel_path, "done")
 
     print(f"\n✅ {len(all_chunks)} chunks novos salvos em: {output_jsonl}")
+
+    if bm25_index is not None and all_chunks:
+        bm25_index.save(bm25_index_path)
+        print(f"[BM25] Índice atualizado em: {bm25_index_path}")
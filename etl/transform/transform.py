@@ -1,7 +1,133 @@
-from etl.transform.text_cleaner import process_markdown_folder
-from etl.transform.text_splitter import chunk_markdown_folder
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from etl.load.bm25_index import BM25Index
+from etl.run_manifest import is_pending, mark, track
+from etl.transform.text_cleaner import clean_document, process_markdown_folder, walk_sources
+from etl.transform.text_splitter import chunk_markdown_folder, chunk_text, load_ingested_at
+from utils.instrumentation import span, incr
 
-def run_transformation(input_folder: str, output_clean: str, output_chunks: str):
+def _write_text(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _needs_clean_refresh(input_path: str, clean_path: str, ingested_at) -> bool:
+    """Arquivo já chunkado cuja cópia limpa falta ou cuja origem mudou desde a ingestão."""
+    return not os.path.exists(clean_path) or not ingested_at or os.path.getmtime(input_path) > ingested_at
+
+def clean_and_chunk_folder(
+    input_folder: str,
+    output_clean: str,
+    output_chunks: str,
+    bm25_index_path: str = None,
+    manifest=None,
+    write_clean: bool = True,
+):
+    """
+    Limpeza e chunking em uma única passada: cada `_ocr.md` é lido uma vez,
+    limpo, filtrado (inglês / pouco conteúdo) e dividido em memória, e seus
+    chunks vão direto para o JSONL. A cópia limpa (usada pelo GC do vector
+    store e pelo merge de shards) é gravada em segundo plano quando
+    `write_clean` é True.
+
+    Produz os mesmos chunks (e `relative_path`) que process_markdown_folder
+    seguido de chunk_markdown_folder, sem reler a pasta limpa. Arquivos já
+    presentes no JSONL não geram chunks; como no caminho em duas etapas, sua
+    cópia limpa é regravada se a origem mudou desde o `ingested_at` (ou se a
+    cópia falta), para o GC detectar a edição. Os demais nem são lidos.
+    """
+    ingested = load_ingested_at(output_chunks)
+    bm25_index = BM25Index.load_or_create(bm25_index_path) if bm25_index_path else None
+    output_dir = os.path.dirname(output_chunks)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    total_chunks = 0
+    pending_writes = []
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="clean-writer") as writer, \
+            open(output_chunks, 'a', encoding='utf-8') as chunks_file:
+        for root, _, files in walk_sources(input_folder, exclude=[output_clean]):
+            for filename in files:
+                if not filename.lower().endswith('.md'):
+                    continue
+                input_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(input_path, input_folder)
+                if not is_pending(manifest, "chunk", rel_path):
+                    continue
+                clean_path = os.path.join(output_clean, rel_path)
+                already_chunked = rel_path in ingested
+                if already_chunked and not (
+                    write_clean and _needs_clean_refresh(input_path, clean_path, ingested[rel_path])
+                ):
+                    print(f"Ignorando já processado: {rel_path}")
+                    incr("files_skipped", reason="already_chunked")
+                    continue
+
+                try:
+                    with track(manifest, "clean", rel_path):
+                        with span("transform.clean", file=filename):
+                            with open(input_path, 'r', encoding='utf-8') as f:
+                                content = f.read()
+                            cleaned, skip_reason = clean_document(content)
+
+                        if skip_reason:
+                            print(f'Descartado ({skip_reason}): {input_path}')
+                            incr("files_skipped", reason=skip_reason)
+                            mark(manifest, "chunk", rel_path, "done")
+                            continue
+
+                        if write_clean:
+                            pending_writes.append(writer.submit(_write_text, clean_path, cleaned))
+                        incr("files_cleaned")
+
+                        if already_chunked:
+                            # Chunks antigos ficam: o GC compara a cópia limpa nova com o source_hash
+                            print(f"Ignorando já processado: {rel_path} (cópia limpa atualizada)")
+                            incr("files_skipped", reason="already_chunked")
+                            continue
+
+                        with span("transform.chunk", file=rel_path):
+                            chunks = chunk_text(cleaned, rel_path)
+                        for chunk in chunks:
+                            chunks_file.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                        chunks_file.flush()
+                        mark(manifest, "chunk", rel_path, "done")
+
+                        if bm25_index is not None:
+                            bm25_index.update_source(rel_path, chunks)
+                        incr("chunks_created", len(chunks))
+                        total_chunks += len(chunks)
+                        print(f'Processado: {input_path} ({len(chunks)} chunks)')
+
+                except Exception as e:
+                    print(f'Erro ao processar {input_path}: {e}')
+                    mark(manifest, "chunk", rel_path, "failed", error=f"{type(e).__name__}: {e}")
+
+    # Cópias limpas: falhas de gravação não invalidam os chunks já emitidos
+    for future in pending_writes:
+        if future.exception():
+            print(f'Erro ao salvar arquivo limpo: {future.exception()}')
+
+    print(f"\n✅ {total_chunks} chunks novos salvos em: {output_chunks}")
+
+    if bm25_index is not None and total_chunks:
+        bm25_index.save(bm25_index_path)
+        print(f"[BM25] Índice atualizado em: {bm25_index_path}")
+
+def run_transformation(
+    input_folder: str,
+    output_clean: str,
+    output_chunks: str,
+    bm25_index_path: str = None,
+    manifest=None,
+    fused: bool = False,
+):
     print("\n🟢 Iniciando transformação (limpeza e chunking)...")
-    process_markdown_folder(input_folder, output_clean)
-    chunk_markdown_folder(output_clean, output_chunks)
\ No newline at end of file
+    if fused:
+        clean_and_chunk_folder(
+            input_folder, output_clean, output_chunks, bm25_index_path=bm25_index_path, manifest=manifest
+        )
+        return
+    process_markdown_folder(input_folder, output_clean, manifest=manifest)
+    chunk_markdown_folder(output_clean, output_chunks, bm25_index_path=bm25_index_path, manifest=manifest)
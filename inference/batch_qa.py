@@ -0,0 +1,177 @@
+import os
+import json
+import time
+from typing import Dict, List, Optional
+
+from inference.rag_pipeline import RagPipeline, GENERATION_ERROR_MESSAGE, RETRIEVAL_MODES
+from etl.load.metadata_index import normalize_filters
+
+BATCH_SIZE = 8
+
+def _question_id(record: Dict, line_number: int) -> str:
+    return str(record.get("id", line_number))
+
+def _validate_record(record: Dict) -> Dict:
+    """
+    Valida `k`, `filters` e `mode` de uma linha (ValueError se inválidos). Na
+    recuperação, esses erros virariam respostas "sem contexto" gravadas como
+    respondidas, e um `k` não numérico derrubaria a execução inteira.
+    """
+    if "k" in record:
+        try:
+            record["k"] = int(record["k"])
+        except (TypeError, ValueError):
+            raise ValueError(f"'k' inválido: {record['k']!r}.")
+        if record["k"] < 1:
+            raise ValueError(f"'k' deve ser positivo: {record['k']}.")
+    filters = record.get("filters")
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError("'filters' deve ser um objeto JSON.")
+    record["filters"] = normalize_filters(filters)
+    mode = record.get("mode")
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Modo de recuperação inválido: '{mode}'. Use um de {RETRIEVAL_MODES}.")
+    return record
+
+def load_questions(questions_path: str) -> List[Dict]:
+    """
+    Lê o arquivo JSONL de perguntas. Cada linha: {"question": ..., "id"?, "k"?, "filters"?, "mode"?}
+    (também aceita "query"). Sem "id", usa o número da linha. Linhas com
+    `k`, `filters` ou `mode` inválidos são ignoradas com aviso.
+    """
+    questions = []
+    with open(questions_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[Batch] Linha {line_number} ignorada: JSON inválido.")
+                continue
+            question = record.get("question") or record.get("query")
+            if not question:
+                print(f"[Batch] Linha {line_number} ignorada: sem 'question'.")
+                continue
+            try:
+                record = _validate_record(record)
+            except ValueError as e:
+                print(f"[Batch] Linha {line_number} ignorada: {e}")
+                continue
+            questions.append({**record, "id": _question_id(record, line_number), "question": question})
+    return questions
+
+def load_answered_ids(output_path: str) -> set:
+    """Ids já respondidos em uma execução anterior (para retomar)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (json.JSONDecodeError, KeyError):
+                # Última linha truncada por interrupção: será respondida de novo
+                continue
+    return done
+
+def _drop_partial_line(output_path: str):
+    """Remove a última linha incompleta (escrita interrompida) antes de retomar."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def run_batch_qa(
+    questions_path: str,
+    output_path: str,
+    k: int = 5,
+    max_tokens: int = 512,
+    batch_size: int = BATCH_SIZE,
+    retrieval_mode: str = "dense",
+    filters: Optional[Dict] = None,
+    model_name: Optional[str] = None,
+) -> Dict:
+    """
+    Responde um arquivo de perguntas em lotes e grava as respostas (com fontes e
+    tempos por etapa) em JSONL, uma linha por pergunta.
+
+    - Cada lote embeda todas as perguntas de uma vez, recupera em bloco e gera com
+      o lote do backend quando possível (`RagPipeline.answer_batch`).
+    - As respostas são gravadas ao fim de cada lote; se a execução for
+      interrompida, rodar de novo pula os ids já presentes no arquivo de saída.
+
+    Returns:
+        dict: Resumo com contagens e tempo total.
+    """
+    print("\n🟢 Respondendo perguntas em lote...")
+    start = time.perf_counter()
+
+    questions = load_questions(questions_path)
+    _drop_partial_line(output_path)
+    done = load_answered_ids(output_path)
+    pending = [q for q in questions if q["id"] not in done]
+    print(f"[Batch] {len(questions)} perguntas, {len(done)} já respondidas, {len(pending)} pendentes.")
+
+    rag = RagPipeline(
+        persist_directory="./data/output/embeddings", retrieval_mode=retrieval_mode, model_name=model_name
+    )
+    if pending:
+        rag.load()
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    answered = 0
+    failed = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+
+            # Perguntas do lote só são agrupadas se compartilham k, modo e filtros
+            groups = {}
+            for record in batch:
+                record_k = record.get("k", k)
+                record_mode = record.get("mode") or retrieval_mode
+                record_filters = record.get("filters") or filters
+                key = (record_k, record_mode, json.dumps(record_filters, sort_keys=True, default=str))
+                groups.setdefault(key, (record_k, record_mode, record_filters, []))[3].append(record)
+
+            for record_k, record_mode, record_filters, records in groups.values():
+                results = rag.answer_batch(
+                    [r["question"] for r in records],
+                    k=record_k,
+                    max_tokens=max_tokens,
+                    mode=record_mode,
+                    filters=record_filters,
+                )
+                for record, result in zip(records, results):
+                    # Falhas de geração não são gravadas: a próxima execução tenta de novo
+                    if result["answer"] == GENERATION_ERROR_MESSAGE:
+                        failed += 1
+                        continue
+                    answered += 1
+                    out.write(json.dumps({
+                        "id": record["id"],
+                        "question": record["question"],
+                        "answer": result["answer"].strip(),
+                        "sources": result["sources"],
+                        "timings": result["timings"],
+                        "model": rag.model_name,
+                        "retrieval_mode": record_mode,
+                    }, ensure_ascii=False) + "\n")
+
+            out.flush()
+            os.fsync(out.fileno())
+            print(f"[Batch] {len(done) + answered}/{len(questions)} respondidas ({failed} falhas).")
+
+    summary = {
+        "questions": len(questions),
+        "skipped": len(done),
+        "answered": answered,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(f"✅ Respostas salvas em {output_path} ({answered} novas em {summary['seconds']}s).")
+    return summary
@@ -0,0 +1,113 @@
+"""
+Benchmark dos modos de decodificação (normal, prompt lookup e assistida) dos
+backends transformers: tokens/s e equivalência das saídas com decodificação gulosa.
+
+Exemplo:
+    python -m inference.benchmark_decoding --model gemma --modes standard,prompt_lookup
+    python -m inference.benchmark_decoding --model gemma --assistant-model-id <rascunho com o mesmo tokenizer>
+"""
+import json
+import time
+from typing import Dict, List
+
+import click
+
+from inference.model_registry import get_backend
+from inference.rag_pipeline import RagPipeline
+from inference.speculative import DECODING_MODES
+
+DEFAULT_QUERIES = [
+    "Quais são os principais tópicos das minhas anotações?",
+    "Resuma o que eu escrevi sobre aprendizado de máquina.",
+    "Quais ferramentas aparecem com mais frequência?",
+]
+
+def build_prompts(rag: RagPipeline, queries: List[str], k: int, max_tokens: int) -> List[str]:
+    """Monta prompts reais de RAG (contexto recuperado e empacotado) para as perguntas."""
+    prompts = []
+    for query in queries:
+        documents = rag.pack_documents(query, rag.retrieve_documents(query, k=k), max_tokens)
+        if documents:
+            prompts.append(rag.build_prompt(query, [doc.page_content for doc in documents]))
+    return prompts
+
+def run_mode(module, prompts: List[str], decoding: str, max_tokens: int) -> Dict:
+    llm = module.get_llm()
+    kwargs = {**module.generation_kwargs(max_tokens, decoding), "do_sample": False}
+    if decoding == "assisted" and "assistant_model" not in kwargs:
+        raise click.ClickException("Modo assistido sem modelo rascunho compatível (assistant_model_id).")
+
+    outputs, tokens, seconds = [], 0, 0.0
+    for prompt in prompts:
+        start = time.perf_counter()
+        text = llm(prompt.strip(), return_full_text=False, **kwargs)[0]["generated_text"]
+        seconds += time.perf_counter() - start
+        outputs.append(text)
+        tokens += len(llm.tokenizer.encode(text, add_special_tokens=False))
+    return {"outputs": outputs, "tokens": tokens, "seconds": seconds}
+
+@click.command(help="Compara tokens/s e equivalência (greedy) entre modos de decodificação.")
+@click.option("--model", "model_name", default="gemma", help="Modelo do registro (backend transformers).")
+@click.option("--modes", default="standard,prompt_lookup,assisted", help="Modos separados por vírgula.")
+@click.option("--assistant-model-id", default=None, help="Sobrescreve o rascunho do registro.")
+@click.option("--queries-file", type=click.Path(exists=True), default=None, help="Uma pergunta por linha.")
+@click.option("--retrieval-mode", default="lexical", help="Recuperação usada para montar os prompts.")
+@click.option("--k", default=5, type=int)
+@click.option("--max-tokens", default=128, type=int)
+@click.option("--output", type=click.Path(), default=None, help="Salva os resultados em JSON.")
+def main(model_name, modes, assistant_model_id, queries_file, retrieval_mode, k, max_tokens, output):
+    modes = [m.strip() for m in modes.split(",") if m.strip()]
+    invalid = [m for m in modes if m not in DECODING_MODES]
+    if invalid:
+        raise click.BadParameter(f"Modos inválidos: {invalid}. Use {DECODING_MODES}.")
+
+    module = get_backend(model_name)
+    if not hasattr(module, "generation_kwargs"):
+        raise click.ClickException(f"O backend de '{model_name}' não suporta decodificação especulativa.")
+    if assistant_model_id:
+        module.configure({"assistant_model_id": assistant_model_id})
+
+    queries = DEFAULT_QUERIES
+    if queries_file:
+        with open(queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()] or DEFAULT_QUERIES
+
+    rag = RagPipeline(
+        persist_directory="./data/output/embeddings", retrieval_mode=retrieval_mode, model_name=model_name
+    )
+    prompts = build_prompts(rag, queries, k, max_tokens)
+    if not prompts:
+        raise click.ClickException("Nenhum contexto recuperado para montar os prompts.")
+
+    # Aquecimento: a primeira geração inclui alocação de buffers
+    run_mode(module, prompts[:1], "standard", 4)
+
+    results = {}
+    for mode in modes:
+        if mode == "assisted" and module.get_assistant() is None:
+            print("[Benchmark] Modo 'assisted' ignorado: sem rascunho compatível configurado.")
+            continue
+        results[mode] = run_mode(module, prompts, mode, max_tokens)
+
+    baseline = results.get("standard")
+    report = []
+    print(f"\n{'modo':<14} {'tokens':>7} {'tempo(s)':>9} {'tok/s':>7} {'speedup':>8} {'iguais':>7}")
+    for mode, r in results.items():
+        tps = r["tokens"] / r["seconds"] if r["seconds"] else 0.0
+        row = {"mode": mode, "tokens": r["tokens"], "seconds": round(r["seconds"], 3), "tokens_per_s": round(tps, 2)}
+        if baseline:
+            base_tps = baseline["tokens"] / baseline["seconds"] if baseline["seconds"] else 0.0
+            row["speedup"] = round(tps / base_tps, 2) if base_tps else None
+            row["identical"] = sum(a == b for a, b in zip(r["outputs"], baseline["outputs"]))
+        report.append(row)
+        speedup = f"{row['speedup']:.2f}x" if row.get("speedup") else "-"
+        identical = f"{row['identical']}/{len(prompts)}" if "identical" in row else "-"
+        print(f"{mode:<14} {r['tokens']:>7} {r['seconds']:>9.2f} {tps:>7.2f} {speedup:>8} {identical:>7}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "prompts": len(prompts), "max_tokens": max_tokens, "results": report}, f, indent=2)
+        print(f"✅ Resultados salvos em {output}")
+
+if __name__ == "__main__":
+    main()
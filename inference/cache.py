@@ -0,0 +1,194 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Limites padrão dos caches da inferência
+QUERY_CACHE_SIZE = 256
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL = 6 * 60 * 60      # segundos
+SEMANTIC_THRESHOLD = 0.95           # similaridade coseno mínima entre perguntas
+
+def normalize_query(query: str) -> str:
+    """Normaliza a pergunta para chave de cache (minúsculas, espaços e pontuação final)."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.;")
+
+def index_fingerprint(*paths: str) -> Tuple:
+    """Assinatura (mtime, tamanho) dos arquivos do índice; muda quando o índice é reescrito."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except (OSError, TypeError):
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class CacheStats:
+    """Contadores de acerto/erro e latência economizada de um cache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+class LRUCache:
+    """
+    Cache LRU simples e thread-safe. Cada entrada guarda o custo (segundos) de
+    produzi-la, somado em `stats.saved_seconds` a cada acerto.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[object, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.saved_seconds += entry[1]
+            return entry[0]
+
+    def peek(self, key: Hashable):
+        """Lê sem alterar a ordem LRU nem as estatísticas."""
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, value, cost_seconds: float = 0.0):
+        with self._lock:
+            self._data[key] = (value, cost_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class AnswerCache:
+    """
+    Cache de respostas do LLM.
+
+    A chave exata é (pergunta normalizada, ids dos chunks recuperados, modelo,
+    max_tokens). Em caso de erro exato, procura uma pergunta semanticamente
+    parecida (coseno >= `threshold`) que tenha recuperado os mesmos chunks para o
+    mesmo modelo e max_tokens. Entradas expiram após `ttl` segundos.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = SEMANTIC_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return now - entry["created"] > self.ttl
+
+    def lookup(
+        self,
+        query: str,
+        chunk_ids: Sequence[str],
+        model: str,
+        max_tokens: int,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> Optional[str]:
+        group = (tuple(chunk_ids), model, max_tokens)
+        key = (normalize_query(query), *group)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+
+            if entry is None and query_embedding is not None:
+                query_vec = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+                best = None
+                for other_key, other in self._entries.items():
+                    if other_key[1:] != group or other["embedding"] is None or self._expired(other, now):
+                        continue
+                    similarity = float(np.dot(query_vec, other["embedding"]))
+                    if similarity >= self.threshold and (best is None or similarity > best[0]):
+                        best = (similarity, other_key)
+                if best is not None:
+                    key = best[1]
+                    entry = self._entries[key]
+                    self.stats.semantic_hits += 1
+
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.saved_seconds += entry["cost"]
+            return entry["answer"]
+
+    def store(
+        self,
+        query: str,
+        chunk_ids: Sequence[str],
+        model: str,
+        max_tokens: int,
+        answer: str,
+        query_embedding: Optional[np.ndarray] = None,
+        cost_seconds: float = 0.0,
+    ):
+        key = (normalize_query(query), tuple(chunk_ids), model, max_tokens)
+        embedding = None
+        if query_embedding is not None:
+            embedding = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": embedding,
+                "created": time.time(),
+                "cost": cost_seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,12 +1,40 @@
 import sys
+import time
 from inference.rag_pipeline import RagPipeline
+from inference.model_registry import load_registry
+from etl.load.metadata_index import normalize_filters
 
-def cli_app():
+def parse_filters(text: str) -> dict:
+    """
+    Converte 'chave=valor chave2=valor2' em dicionário de filtros.
+    Ex: 'path_prefix=Livros/ language=pt'
+    """
+    filters = {}
+    for item in text.split():
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Filtro inválido: '{item}'. Use chave=valor.")
+        filters[key] = value
+    return normalize_filters(filters)
+
+def cli_app(retrieval_mode: str = "dense", filters: dict = None, model_name: str = None):
     # Inicializa a pipeline com o diretório persistente de embeddings
-    rag = RagPipeline(persist_directory="./data/output/embeddings/")
+    rag = RagPipeline(
+        persist_directory="./data/output/embeddings/", retrieval_mode=retrieval_mode, model_name=model_name
+    )
+    # Carrega recuperador e modelo em segundo plano enquanto o usuário digita
+    if load_registry().get("preload", True):
+        rag.preload()
+    filters = normalize_filters(filters)
 
     print("=== RAG CLI App ===")
-    print("Digite sua pergunta ou 'sair' para encerrar.\n")
+    print(f"Modo de recuperação: {retrieval_mode}")
+    print(f"Modelo: {rag.model_name}")
+    print("Digite sua pergunta ou 'sair' para encerrar.")
+    print("Use ':filtro chave=valor ...' para restringir a busca (':filtro' limpa).")
+    print("Use ':stats' para ver as estatísticas de cache.\n")
+    if filters:
+        print(f"Filtros ativos: {filters}\n")
 
     while True:
         query = input("Pergunta: ").strip()
@@ -18,14 +46,50 @@ def cli_app():
             print("⚠️ Por favor, digite uma pergunta válida.\n")
             continue
 
+        if query == ":stats":
+            all_stats = rag.cache_stats()
+            prefix_stats = all_stats.pop("prefix", None)
+            for level, stats in all_stats.items():
+                print(
+                    f"[Cache {level}] acertos={stats['hits']} (semânticos={stats['semantic_hits']}) "
+                    f"erros={stats['misses']} taxa={stats['hit_rate']:.0%} "
+                    f"economizado={stats['saved_seconds']:.2f}s"
+                )
+            if prefix_stats:
+                print(
+                    f"[Cache prefixo] {prefix_stats['prefix_tokens']} tokens, acertos={prefix_stats['hits']} "
+                    f"prefill economizado={prefix_stats['saved_seconds']:.2f}s"
+                )
+            print()
+            continue
+
+        if query.startswith(":filtro"):
+            try:
+                filters = parse_filters(query[len(":filtro"):])
+            except ValueError as e:
+                print(f"⚠️ {e}\n")
+                continue
+            print(f"Filtros ativos: {filters or 'nenhum'}\n")
+            continue
+
+        print("\nResposta:")
         try:
-            # Geração da resposta com k e max_tokens configuráveis
-            resposta = rag.generate_answer(query, k=3, max_tokens=512)
+            # Geração em streaming: imprime os trechos assim que o modelo os produz
+            start = time.perf_counter()
+            first_token_at = None
+            for text in rag.stream_answer(query, k=3, max_tokens=512, filters=filters):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                print(text, end="", flush=True)
         except Exception as e:
             print(f"❌ Erro ao gerar resposta: {e}")
             continue
 
-        print("\nResposta:")
-        print(resposta)
+        print()
+        if first_token_at is not None:
+            timing = f"primeiro token em {first_token_at:.2f}s, total {time.perf_counter() - start:.2f}s"
+            prefix_stats = rag.cache_stats().get("prefix")
+            if prefix_stats and prefix_stats["last_saved_seconds"]:
+                timing += f", prefill economizado {prefix_stats['last_saved_seconds']:.2f}s"
+            print(f"\n[{timing}]")
         print("\n" + "=" * 40 + "\n")
-
@@ -0,0 +1,133 @@
+import re
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from inference.llm_api import context_window, count_tokens
+
+# Parâmetros do empacotamento de contexto
+MMR_LAMBDA = 0.7                # peso da relevância vs. diversidade no MMR
+DUPLICATE_THRESHOLD = 0.95      # coseno acima do qual dois chunks são considerados duplicados
+OVERLAP_THRESHOLD = 0.8         # fração de trigramas em comum (sobreposição entre chunks vizinhos)
+PROMPT_SAFETY_MARGIN = 32       # folga de tokens para tokens especiais/template do backend
+MIN_CONTEXT_TOKENS = 128        # contexto mínimo mesmo quando max_tokens ocupa a janela toda
+CHUNK_SEPARATOR = "\n---\n"
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+def text_overlap(a: set, b: set) -> float:
+    """Fração dos trigramas do menor texto contidos no outro (detecta overlap do splitter)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def mmr_order(
+    query_vector: Optional[np.ndarray],
+    doc_vectors: np.ndarray,
+    lambda_mult: float = MMR_LAMBDA,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD,
+) -> List[int]:
+    """
+    Ordena os documentos por Maximal Marginal Relevance e descarta quase-duplicatas
+    (coseno >= `duplicate_threshold` com um já escolhido).
+    Sem vetor da consulta, a relevância é a ordem original da recuperação.
+    """
+    n = len(doc_vectors)
+    docs = _normalize(np.asarray(doc_vectors, dtype=np.float32))
+    if query_vector is not None:
+        relevance = docs @ _normalize(np.asarray(query_vector, dtype=np.float32))
+    else:
+        relevance = np.linspace(1.0, 0.5, n, dtype=np.float32)
+    similarity = docs @ docs.T
+
+    selected: List[int] = []
+    candidates = list(range(n))
+    while candidates:
+        if selected:
+            redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates), dtype=np.float32)
+        scores = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy
+        best = int(np.argmax(scores))
+        chosen = candidates.pop(best)
+        if redundancy[best] < duplicate_threshold:
+            selected.append(chosen)
+    return selected
+
+def _truncate_to_budget(text: str, budget: int, model_name: str) -> str:
+    """Corta o texto até caber em `budget` tokens (proporcional aos caracteres, refinado)."""
+    tokens = count_tokens(text, model_name)
+    while tokens > budget and text:
+        text = text[: max(int(len(text) * budget / tokens) - 1, 0)]
+        tokens = count_tokens(text, model_name)
+    return text
+
+def pack_context(
+    query: str,
+    documents: List[Document],
+    template: str,
+    model_name: str,
+    max_tokens: int,
+    query_vector: Optional[np.ndarray] = None,
+    doc_vectors: Optional[np.ndarray] = None,
+    max_context_tokens: Optional[int] = None,
+    lambda_mult: float = MMR_LAMBDA,
+) -> List[Document]:
+    """
+    Seleciona os chunks que entram no prompt dentro do orçamento de tokens.
+
+    1. Com embeddings dos chunks: ordena por MMR e remove quase-duplicatas;
+       sem eles (ex: modo lexical), mantém a ordem da recuperação. Em ambos os
+       casos descarta chunks cuja maioria dos trigramas já está em outro escolhido.
+    2. Orçamento = janela do modelo - max_tokens - tokens do template e da
+       pergunta - folga (limitado por `max_context_tokens`, se informado).
+    3. Adiciona chunks enquanto couberem; se nem o primeiro couber, ele é cortado.
+
+    Returns:
+        List[Document]: Documentos a usar, na ordem em que entram no prompt.
+    """
+    if not documents:
+        return []
+
+    if doc_vectors is not None and len(doc_vectors) == len(documents):
+        order = mmr_order(query_vector, doc_vectors, lambda_mult)
+    else:
+        order = list(range(len(documents)))
+
+    budget = context_window(model_name) - max_tokens - PROMPT_SAFETY_MARGIN
+    budget -= count_tokens(template.format(query=query, context=""), model_name)
+    if max_context_tokens is not None:
+        budget = min(budget, max_context_tokens)
+    budget = max(budget, MIN_CONTEXT_TOKENS)
+    separator_tokens = count_tokens(CHUNK_SEPARATOR, model_name)
+
+    packed: List[Document] = []
+    packed_shingles: List[set] = []
+    used = 0
+    for i in order:
+        doc = documents[i]
+        shingles = _shingles(doc.page_content)
+        if any(text_overlap(shingles, other) >= OVERLAP_THRESHOLD for other in packed_shingles):
+            continue
+
+        cost = count_tokens(doc.page_content, model_name) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(doc)
+            packed_shingles.append(shingles)
+            used += cost
+        elif not packed:
+            content = _truncate_to_budget(doc.page_content, budget, model_name)
+            if content:
+                packed.append(Document(page_content=content, metadata=doc.metadata, id=doc.id))
+                packed_shingles.append(shingles)
+                used = budget
+    return packed
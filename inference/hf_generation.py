@@ -0,0 +1,70 @@
+from threading import Thread
+from typing import Callable, Dict, Iterator, List, Optional
+
+from transformers import TextIteratorStreamer
+
+from inference.speculative import NUM_ASSISTANT_TOKENS, decoding_kwargs, load_assistant
+
+def stream_generate(llm, prompt: str, **kwargs) -> Iterator[str]:
+    """
+    Geração em streaming com um pipeline `text-generation` do transformers:
+    roda a geração em uma thread e devolve os trechos de texto à medida que o
+    TextIteratorStreamer os recebe. Erros da geração são relançados ao final.
+    """
+    streamer = TextIteratorStreamer(llm.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def _generate():
+        try:
+            llm(prompt.strip(), streamer=streamer, **kwargs)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = Thread(target=_generate, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+    if errors:
+        raise errors[0]
+
+def batch_generate(llm, prompts: List[str], max_tokens: int, batch_size: int) -> List[str]:
+    """Geração em lote com um pipeline `text-generation` do transformers."""
+    # Modelos decoder-only precisam de padding à esquerda para gerar em lote
+    if llm.tokenizer.pad_token is None:
+        llm.tokenizer.pad_token = llm.tokenizer.eos_token
+    llm.tokenizer.padding_side = "left"
+    # Geração assistida/prompt lookup só suporta lote de 1: o lote usa decodificação normal
+    outputs = llm(
+        [prompt.strip() for prompt in prompts], max_new_tokens=max_tokens, batch_size=batch_size, return_full_text=False
+    )
+    return [output[0]["generated_text"].strip() for output in outputs]
+
+def load_configured_assistant(config: Dict, tokenizer, backend: str):
+    """
+    Modelo rascunho da geração assistida (`assistant_model_id` do registro)
+    para o modelo com o `tokenizer` dado; None se ausente ou incompatível.
+    """
+    model_id = config.get("assistant_model_id")
+    if not model_id:
+        return None
+    try:
+        return load_assistant(
+            model_id, tokenizer, config["device_map"], config.get("num_assistant_tokens", NUM_ASSISTANT_TOKENS)
+        )
+    except Exception as e:
+        print(f"[{backend}] Geração assistida desativada: {e}")
+        return None
+
+def build_generation_kwargs(
+    config: Dict, max_tokens: int, decoding: Optional[str] = None, get_assistant: Optional[Callable] = None
+) -> Dict:
+    """
+    Argumentos de geração, incluindo o modo de decodificação (`decoding` do
+    registro por padrão). `get_assistant` só é chamado no modo `assisted`.
+    """
+    decoding = decoding or config.get("decoding", "standard")
+    assistant = get_assistant() if decoding == "assisted" and get_assistant else None
+    return {"max_new_tokens": max_tokens, **decoding_kwargs(config, decoding, assistant)}
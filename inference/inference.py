@@ -1,12 +1,28 @@
 # Inferência
 from inference.streamlite_app import chat_app
 from inference.cli_app import cli_app
+from inference.server import run_server
+from inference.batch_qa import run_batch_qa
 
-def run_inference(mode="cli"):
+def run_inference(
+    mode="cli", retrieval_mode="dense", filters=None, model_name=None, questions_path=None, answers_path=None
+):
     print("\n🟢 Iniciando interface de inferência...")
     if mode == "cli":
-        cli_app()
+        cli_app(retrieval_mode=retrieval_mode, filters=filters, model_name=model_name)
     elif mode == "chat":
         chat_app()
+    elif mode == "server":
+        run_server(retrieval_mode=retrieval_mode, model_name=model_name)
+    elif mode == "batch":
+        if not questions_path:
+            raise ValueError("O modo 'batch' precisa de um arquivo de perguntas (JSONL).")
+        run_batch_qa(
+            questions_path,
+            answers_path,
+            retrieval_mode=retrieval_mode,
+            filters=filters,
+            model_name=model_name,
+        )
     else:
-        raise ValueError("Modo de inferência inválido. Use 'cli' ou 'chat'.")
\ No newline at end of file
+        raise ValueError("Modo de inferência inválido. Use 'cli', 'chat', 'server' ou 'batch'.")
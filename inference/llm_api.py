@@ -1,14 +1,90 @@
-import importlib
+from typing import Iterator, List
+
+from inference.model_registry import get_backend, get_model_config, wait_for_model
+
+# Usados quando o módulo do modelo não informa janela de contexto ou tokenizer
+DEFAULT_CONTEXT_WINDOW = 2048
+CHARS_PER_TOKEN = 4
+
+def strip_prompt_echo(prompt: str, output: str) -> str:
+    """Remove o prompt ecoado no início da saída (backends que devolvem o texto completo)."""
+    prompt = prompt.strip()
+    output = output.strip()
+    if prompt and output.startswith(prompt):
+        output = output[len(prompt):].strip()
+    return output
+
+def _get_module(model_name: str):
+    """Módulo do backend do modelo (configurado pelo registro), aguardando pré-carga em curso."""
+    module = get_backend(model_name)
+    wait_for_model(model_name)
+    return module
 
 def call_llm(prompt: str, model_name: str, max_tokens: int = 256) -> str:
     """
     Chamada genérica que delega para o módulo do modelo específico.
     """
-    try:
-        module = importlib.import_module(f"inference.lmms.{model_name}")
-        return module.call_llm(prompt, max_tokens=max_tokens)
-    except ModuleNotFoundError:
-        raise ValueError(f"Modelo '{model_name}' não encontrado.")
-    except AttributeError:
+    module = _get_module(model_name)
+    if not hasattr(module, "call_llm"):
         raise ValueError(f"O módulo '{model_name}' deve definir 'call_llm(prompt, max_tokens)'.")
+    return strip_prompt_echo(prompt, module.call_llm(prompt, max_tokens=max_tokens))
+
+def stream_llm(prompt: str, model_name: str, max_tokens: int = 256) -> Iterator[str]:
+    """
+    Geração em streaming: devolve um gerador de trechos de texto à medida que os
+    tokens são produzidos. Módulos sem `stream_llm` caem no `call_llm` (um único trecho).
+    """
+    module = _get_module(model_name)
+    if hasattr(module, "stream_llm"):
+        yield from module.stream_llm(prompt, max_tokens=max_tokens)
+    elif hasattr(module, "call_llm"):
+        yield strip_prompt_echo(prompt, module.call_llm(prompt, max_tokens=max_tokens))
+    else:
+        raise ValueError(f"O módulo '{model_name}' deve definir 'call_llm(prompt, max_tokens)'.")
+
+def call_llm_batch(prompts: List[str], model_name: str, max_tokens: int = 256) -> List[str]:
+    """
+    Geração em lote. Usa `call_llm_batch` do módulo quando existir (ex: pipelines
+    transformers com padding); caso contrário, gera sequencialmente.
+    """
+    module = _get_module(model_name)
+    if hasattr(module, "call_llm_batch"):
+        outputs = module.call_llm_batch(prompts, max_tokens=max_tokens)
+    else:
+        outputs = [module.call_llm(prompt, max_tokens=max_tokens) for prompt in prompts]
+    return [strip_prompt_echo(prompt, output) for prompt, output in zip(prompts, outputs)]
+
+def context_window(model_name: str) -> int:
+    """Tamanho da janela de contexto (tokens): `n_ctx` do registro ou do módulo."""
+    config = get_model_config(model_name)
+    if config.get("n_ctx"):
+        return int(config["n_ctx"])
+    return getattr(get_backend(model_name), "CONTEXT_WINDOW", DEFAULT_CONTEXT_WINDOW)
+
+def count_tokens(text: str, model_name: str) -> int:
+    """
+    Conta tokens com o tokenizer do modelo. Sem `count_tokens` no módulo, usa a
+    estimativa de ~4 caracteres por token.
+    """
+    module = get_backend(model_name)
+    if hasattr(module, "count_tokens"):
+        return module.count_tokens(text)
+    return len(text) // CHARS_PER_TOKEN + 1
 
+def warm_prefix(prefix: str, model_name: str):
+    """
+    Pré-avalia o prefixo fixo do prompt no backend (cache de estado KV), quando o
+    módulo suporta (`warm_prefix`). Retorna None para backends sem suporte.
+    """
+    module = _get_module(model_name)
+    if hasattr(module, "warm_prefix"):
+        return module.warm_prefix(prefix)
+    return None
+
+def prefix_cache_stats(model_name: str):
+    """Estatísticas do cache de prefixo do backend, ou None se não houver."""
+    try:
+        module = get_backend(model_name)
+    except ValueError:
+        return None
+    return module.prefix_cache_stats() if hasattr(module, "prefix_cache_stats") else None
@@ -1,24 +1,151 @@
+import os
+import time
+import pickle
+import hashlib
+from threading import Lock
+from typing import Dict, Iterator, Optional
 from llama_cpp import Llama
+from utils.resources import get_governor
+
+MODEL_PATH = "./data/models/phi-2.Q2_K.gguf"
+CONTEXT_WINDOW = 2048
+
+# Estados KV do prefixo fixo do prompt salvos em disco (None desativa)
+PREFIX_CACHE_DIR = "./data/models/prefix_cache"
+
+# Padrões; sobrescritos pelo registro de modelos (configs/models.yml) via `configure`
+_config = {
+    "model_path": MODEL_PATH,
+    "n_ctx": CONTEXT_WINDOW,
+    "n_threads": "auto",  # "auto": núcleos físicos menos um (governador de recursos)
+    "n_batch": 256,
+    "use_mmap": True,
+    "use_mlock": True,
+}
 
 # Instância cacheada (pode usar decorators do seu framework, se quiser)
 _llm = None
+_load_lock = Lock()
+
+# Estado do prefixo já avaliado: {"tokens", "state", "seconds"}
+_prefix = None
+_prefix_stats = {"hits": 0, "saved_seconds": 0.0, "last_saved_seconds": 0.0}
+
+def configure(config: Dict):
+    """Aplica a configuração do registro de modelos; descarta instância e prefixo já carregados."""
+    global _llm, _prefix
+    _config.update({key: value for key, value in config.items() if key in _config and value is not None})
+    _llm = None
+    _prefix = None
+
+def _resolve_threads(value) -> int:
+    if value in (None, "auto"):
+        return get_governor().threads_for("llm")
+    return int(value)
 
 def get_llm():
     global _llm
-    if _llm is None:
-        _llm = Llama(
-            model_path="./data/models/phi-2.Q2_K.gguf",
-            n_ctx=2048,
-            n_threads=4,
-            n_batch=256,
-            use_mmap=True,
-            use_mlock=True,
-            verbose=False
-        )
+    with _load_lock:
+        if _llm is None:
+            _llm = Llama(
+                model_path=_config["model_path"],
+                n_ctx=_config["n_ctx"],
+                n_threads=_resolve_threads(_config["n_threads"]),
+                n_batch=_config["n_batch"],
+                use_mmap=_config["use_mmap"],
+                use_mlock=_config["use_mlock"],
+                verbose=False
+            )
     return _llm
 
+def count_tokens(text: str) -> int:
+    return len(get_llm().tokenize(text.encode("utf-8"), add_bos=False))
+
+def _prefix_cache_path(prefix: str) -> Optional[str]:
+    if not PREFIX_CACHE_DIR:
+        return None
+    model_path = _config["model_path"]
+    try:
+        model_mtime = os.path.getmtime(model_path)
+    except OSError:
+        model_mtime = 0
+    key = hashlib.sha1(f"{model_path}::{model_mtime}::{_config['n_ctx']}::{prefix}".encode("utf-8")).hexdigest()
+    return os.path.join(PREFIX_CACHE_DIR, f"{key}.pkl")
+
+def warm_prefix(prefix: str) -> Dict:
+    """
+    Avalia o prefixo fixo do prompt uma única vez e guarda o estado KV resultante
+    (em memória e, se PREFIX_CACHE_DIR estiver definido, em disco). Chamadas
+    seguintes cujo prompt começa pelo prefixo retomam desse estado e só avaliam
+    o restante (contexto e pergunta).
+    """
+    global _prefix
+    llm = get_llm()
+    prefix = prefix.strip()
+    tokens = llm.tokenize(prefix.encode("utf-8"), special=True)
+    if _prefix is not None and _prefix["tokens"] == tokens:
+        return {"tokens": len(tokens), "seconds": _prefix["seconds"]}
+
+    cache_path = _prefix_cache_path(prefix)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached["tokens"] == tokens:
+                _prefix = cached
+                return {"tokens": len(tokens), "seconds": cached["seconds"]}
+        except Exception as e:
+            print(f"[phi-2] Cache de prefixo inválido, reavaliando: {e}")
+
+    start = time.perf_counter()
+    llm.reset()
+    llm.eval(tokens)
+    seconds = time.perf_counter() - start
+    _prefix = {"tokens": tokens, "state": llm.save_state(), "seconds": seconds}
+
+    if cache_path:
+        os.makedirs(PREFIX_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(_prefix, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return {"tokens": len(tokens), "seconds": seconds}
+
+def _resume_from_prefix(llm: Llama, prompt: str):
+    """
+    Restaura o estado do prefixo antes da geração. O llama.cpp compara os tokens
+    já avaliados com os do prompt e só processa o sufixo diferente.
+    """
+    if _prefix is None:
+        return
+    prefix_tokens = _prefix["tokens"]
+    prompt_tokens = llm.tokenize(prompt.encode("utf-8"), special=True)
+    reused = Llama.longest_token_prefix(prefix_tokens, prompt_tokens)
+    if reused == 0:
+        _prefix_stats["last_saved_seconds"] = 0.0
+        return
+
+    # Se o contexto atual já compartilha o prefixo (ex: chamada anterior), não precisa restaurar
+    current = llm.input_ids[: llm.n_tokens].tolist()
+    if Llama.longest_token_prefix(current, prompt_tokens) < reused:
+        llm.load_state(_prefix["state"])
+
+    saved = _prefix["seconds"] * reused / len(prefix_tokens)
+    _prefix_stats["hits"] += 1
+    _prefix_stats["saved_seconds"] += saved
+    _prefix_stats["last_saved_seconds"] = saved
+
+def prefix_cache_stats() -> Dict:
+    """Acertos do cache de prefixo e tempo de prefill economizado (total e na última consulta)."""
+    return {
+        **_prefix_stats,
+        "prefix_tokens": len(_prefix["tokens"]) if _prefix else 0,
+        "prefix_seconds": round(_prefix["seconds"], 4) if _prefix else 0.0,
+    }
+
 def call_llm(prompt: str, max_tokens: int = 256) -> str:
     llm = get_llm()
+    _resume_from_prefix(llm, prompt.strip())
     response = llm(
         prompt.strip(),
         max_tokens=max_tokens,
@@ -27,3 +154,18 @@ def call_llm(prompt: str, max_tokens: int = 256) -> str:
         stop=["</s>", "Question:"]
     )
     return response["choices"][0]["text"].strip()
+
+def stream_llm(prompt: str, max_tokens: int = 256) -> Iterator[str]:
+    llm = get_llm()
+    _resume_from_prefix(llm, prompt.strip())
+    for chunk in llm(
+        prompt.strip(),
+        max_tokens=max_tokens,
+        temperature=0.7,
+        top_p=0.95,
+        stop=["</s>", "Question:"],
+        stream=True
+    ):
+        text = chunk["choices"][0]["text"]
+        if text:
+            yield text
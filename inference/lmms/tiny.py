@@ -1,19 +1,70 @@
-from transformers import pipeline
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+from transformers import AutoTokenizer, pipeline
+from inference.hf_generation import (
+    batch_generate, build_generation_kwargs, load_configured_assistant, stream_generate
+)
+
+MODEL_ID = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+CONTEXT_WINDOW = 2048
+
+# Padrões; sobrescritos pelo registro de modelos (configs/models.yml) via `configure`
+_config = {"model_id": MODEL_ID, "device_map": "auto", "torch_dtype": None, "batch_size": 4}
 
 _llm = None
+_tokenizer = None
+_assistant = None
+_load_lock = Lock()
+
+def configure(config: Dict):
+    """Aplica a configuração do registro de modelos; descarta instâncias já carregadas."""
+    global _llm, _tokenizer, _assistant
+    _config.update({key: value for key, value in config.items() if value is not None})
+    _llm = None
+    _tokenizer = None
+    _assistant = None
 
 def get_llm():
     global _llm
-    if _llm is None:
-        _llm = pipeline(
-            "text-generation",
-            model="TinyLlama/TinyLlama-1.1B-Chat-v1.0",
-            device_map="auto",
-            trust_remote_code=True
-        )
+    with _load_lock:
+        if _llm is None:
+            _llm = pipeline(
+                "text-generation",
+                model=_config["model_id"],
+                device_map=_config["device_map"],
+                torch_dtype=_config["torch_dtype"],
+                trust_remote_code=True
+            )
     return _llm
 
+def get_tokenizer():
+    """Tokenizer do modelo, sem carregar os pesos (usado para contar tokens do prompt)."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = _llm.tokenizer if _llm is not None else AutoTokenizer.from_pretrained(_config["model_id"])
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+def get_assistant():
+    """Modelo rascunho da geração assistida (`assistant_model_id`); None se ausente ou incompatível."""
+    global _assistant
+    if _assistant is None:
+        _assistant = load_configured_assistant(_config, get_llm().tokenizer, "tiny") or False
+    return _assistant or None
+
+def generation_kwargs(max_tokens: int, decoding: Optional[str] = None) -> Dict:
+    """Argumentos de geração, incluindo o modo de decodificação (`decoding` do registro por padrão)."""
+    return build_generation_kwargs(_config, max_tokens, decoding, get_assistant)
+
 def call_llm(prompt: str, max_tokens: int = 256) -> str:
     llm = get_llm()
-    output = llm(prompt.strip(), max_new_tokens=max_tokens)
+    output = llm(prompt.strip(), return_full_text=False, **generation_kwargs(max_tokens))
     return output[0]["generated_text"].strip()
+
+def call_llm_batch(prompts: List[str], max_tokens: int = 256, batch_size: Optional[int] = None) -> List[str]:
+    return batch_generate(get_llm(), prompts, max_tokens, batch_size or _config["batch_size"])
+
+def stream_llm(prompt: str, max_tokens: int = 256) -> Iterator[str]:
+    yield from stream_generate(get_llm(), prompt, **generation_kwargs(max_tokens))
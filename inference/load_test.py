@@ -0,0 +1,108 @@
+"""
+Teste de carga do servidor HTTP local do RAG.
+
+Exemplo:
+    python -m inference.load_test --concurrency 1,4,8 --requests 32
+"""
+import json
+import time
+import asyncio
+from typing import Dict, List
+
+import click
+import numpy as np
+
+from inference.server import DEFAULT_HOST, DEFAULT_PORT
+
+DEFAULT_QUERIES = [
+    "Quais são os principais tópicos das minhas anotações?",
+    "Resuma o que eu escrevi sobre aprendizado de máquina.",
+    "Quais ferramentas aparecem com mais frequência?",
+    "O que foi decidido nas últimas reuniões?",
+]
+
+async def _post_query(host: str, port: int, payload: Dict, timeout: float) -> int:
+    body = json.dumps(payload).encode("utf-8")
+    request = (
+        f"POST /query HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("latin-1") + body
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+async def _run_level(host: str, port: int, queries: List[str], concurrency: int, total: int, k: int, max_tokens: int, timeout: float) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], []
+
+    async def one(i: int):
+        payload = {"query": queries[i % len(queries)], "k": k, "max_tokens": max_tokens}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = await _post_query(host, port, payload, timeout)
+            except (OSError, asyncio.TimeoutError):
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    ok = [lat for lat, status in zip(latencies, statuses) if status == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(ok),
+        "rejected": statuses.count(503),
+        "timeouts": statuses.count(504),
+        "errors": sum(1 for s in statuses if s not in (200, 503, 504)),
+        "p50_s": float(np.percentile(ok, 50)) if ok else None,
+        "p95_s": float(np.percentile(ok, 95)) if ok else None,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+    }
+
+@click.command(help="Mede latência (p50/p95) e vazão do servidor RAG em vários níveis de concorrência.")
+@click.option("--host", default=DEFAULT_HOST)
+@click.option("--port", default=DEFAULT_PORT, type=int)
+@click.option("--concurrency", default="1,2,4,8", help="Níveis de concorrência separados por vírgula.")
+@click.option("--requests", "total", default=32, type=int, help="Pedidos por nível.")
+@click.option("--queries-file", type=click.Path(exists=True), default=None, help="Arquivo com uma pergunta por linha.")
+@click.option("--k", default=5, type=int)
+@click.option("--max-tokens", default=128, type=int)
+@click.option("--timeout", default=300.0, type=float, help="Timeout por pedido no cliente (s).")
+@click.option("--output", type=click.Path(), default=None, help="Salva os resultados em JSON.")
+def main(host, port, concurrency, total, queries_file, k, max_tokens, timeout, output):
+    queries = DEFAULT_QUERIES
+    if queries_file:
+        with open(queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()] or DEFAULT_QUERIES
+
+    results = []
+    print(f"{'conc':>5} {'ok':>5} {'503':>5} {'504':>5} {'err':>5} {'p50(s)':>8} {'p95(s)':>8} {'req/s':>7}")
+    for level in [int(c) for c in concurrency.split(",") if c.strip()]:
+        r = asyncio.run(_run_level(host, port, queries, level, total, k, max_tokens, timeout))
+        results.append(r)
+        p50 = f"{r['p50_s']:.2f}" if r["p50_s"] is not None else "-"
+        p95 = f"{r['p95_s']:.2f}" if r["p95_s"] is not None else "-"
+        print(
+            f"{r['concurrency']:>5} {r['ok']:>5} {r['rejected']:>5} {r['timeouts']:>5} "
+            f"{r['errors']:>5} {p50:>8} {p95:>8} {r['throughput_rps']:>7.2f}"
+        )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Resultados salvos em {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import time
+import threading
+import importlib
+from pathlib import Path
+from typing import Dict, Optional
+
+import yaml
+
+MODELS_CONFIG_PATH = Path(__file__).resolve().parent.parent / "configs" / "models.yml"
+
+# Estados de carregamento de um modelo
+STATUS_IDLE = "idle"
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_ERROR = "error"
+
+_registry: Optional[Dict] = None
+_modules: Dict[str, object] = {}
+_status: Dict[str, Dict] = {}
+_loaded: Dict[str, threading.Event] = {}
+_lock = threading.Lock()
+
+def load_registry(path: Path = MODELS_CONFIG_PATH) -> Dict:
+    """Lê configs/models.yml (uma vez por processo)."""
+    global _registry
+    if _registry is None:
+        if not Path(path).exists():
+            raise FileNotFoundError(f"Registro de modelos não encontrado: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            _registry = yaml.safe_load(f) or {}
+        _registry.setdefault("models", {})
+    return _registry
+
+def default_model() -> str:
+    return load_registry().get("default_model", "tiny")
+
+def get_model_config(model_name: str) -> Dict:
+    """
+    Configuração do modelo no registro. Modelos fora do registro usam o módulo
+    de mesmo nome em inference/lmms com os padrões do próprio módulo.
+    """
+    config = dict(load_registry()["models"].get(model_name) or {})
+    config.setdefault("backend", model_name)
+    return config
+
+def get_backend(model_name: str):
+    """Importa e configura o módulo do backend do modelo (uma vez por modelo)."""
+    with _lock:
+        module = _modules.get(model_name)
+        if module is None:
+            config = get_model_config(model_name)
+            try:
+                module = importlib.import_module(f"inference.lmms.{config['backend']}")
+            except ModuleNotFoundError:
+                raise ValueError(f"Modelo '{model_name}' não encontrado.")
+            if hasattr(module, "configure"):
+                module.configure(config)
+            _modules[model_name] = module
+    return module
+
+def model_status(model_name: str) -> Dict:
+    """Estado de carregamento do modelo: idle, loading, ready ou error."""
+    return dict(_status.get(model_name, {"status": STATUS_IDLE}))
+
+def load_model(model_name: str, warmup: bool = True) -> Dict:
+    """
+    Carrega os pesos do modelo e, opcionalmente, faz uma geração curta de
+    aquecimento (aloca buffers e compila kernels antes da primeira pergunta).
+    """
+    with _lock:
+        current = _status.get(model_name, {})
+        if current.get("status") in (STATUS_LOADING, STATUS_READY):
+            return dict(current)
+        _status[model_name] = {"status": STATUS_LOADING}
+        loaded = _loaded.setdefault(model_name, threading.Event())
+        loaded.clear()
+
+    registry = load_registry()
+    try:
+        module = get_backend(model_name)
+        start = time.perf_counter()
+        module.get_llm()
+        load_seconds = time.perf_counter() - start
+
+        warmup_seconds = 0.0
+        if warmup:
+            start = time.perf_counter()
+            module.call_llm(registry.get("warmup_prompt", "Olá"), max_tokens=registry.get("warmup_tokens", 1))
+            warmup_seconds = time.perf_counter() - start
+
+        _status[model_name] = {
+            "status": STATUS_READY,
+            "load_seconds": round(load_seconds, 2),
+            "warmup_seconds": round(warmup_seconds, 2),
+        }
+        print(f"[Modelos] '{model_name}' pronto (carga {load_seconds:.1f}s, aquecimento {warmup_seconds:.1f}s).")
+    except Exception as e:
+        _status[model_name] = {"status": STATUS_ERROR, "error": str(e)}
+        print(f"[Modelos] Falha ao carregar '{model_name}': {e}")
+    finally:
+        loaded.set()
+    return model_status(model_name)
+
+def wait_for_model(model_name: str, timeout: Optional[float] = None) -> Dict:
+    """Bloqueia enquanto o modelo estiver carregando em segundo plano."""
+    loaded = _loaded.get(model_name)
+    if loaded is not None:
+        loaded.wait(timeout)
+    return model_status(model_name)
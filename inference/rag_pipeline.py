@@ -1,66 +1,580 @@
-from typing import List
+import os
+import time
+import threading
+from typing import Dict, Iterator, List, Optional
+from langchain_core.documents import Document
 from utils.sanitizers import format_chunks_for_prompt
-from etl.load.vector_writer import VectorWriter
-from inference.llm_api import call_llm
-from etl.load.vector_reader import EmbeddingSearcher
+from utils.instrumentation import incr, observe
+from inference.llm_api import call_llm, call_llm_batch, stream_llm, warm_prefix, prefix_cache_stats
+from inference.context_packer import pack_context
+from inference.model_registry import default_model, load_registry, load_model, model_status
+from inference.cache import LRUCache, AnswerCache, normalize_query, index_fingerprint
+from etl.load.bm25_index import BM25Index, DEFAULT_INDEX_PATH, chunk_key, reciprocal_rank_fusion
+from etl.load.metadata_index import METADATA_INDEX_FILENAME, normalize_filters
+from etl.load.index_version import read_index_version
 
-# Definindo prompts como constantes para maior modularidade
-PROMPT_GENERATION_TEMPLATE = """
-Responda à pergunta com base nas informações do contexto abaixo.
+# Definindo prompts como constantes para maior modularidade.
+# A parte fixa (instruções) vem primeiro para que backends com cache de estado KV
+# (llama.cpp) avaliem esse prefixo uma única vez e só processem contexto e pergunta.
+PROMPT_PREFIX = """Responda à pergunta com base nas informações do contexto abaixo.
 
 Regras:
 - Use o contexto, validando com o que você conhece.
 - Na reposta dê um resumo coerente e claro e em português, máximo 4 parágrafos.
 - Se a resposta não estiver no contexto, diga apenas: "Não foi possível encontrar uma resposta com base nas informações fornecidas."
 
-[Pergunta]
-{query}
+"""
 
-[Contexto]
+PROMPT_GENERATION_TEMPLATE = PROMPT_PREFIX + """[Contexto]
 {context}
 
+[Pergunta]
+{query}
+
 [Resposta]
 
 """
 
-MODEL_NAME = "tiny"
+NO_CONTEXT_MESSAGE = "⚠️ Desculpe, não encontrei informações relevantes na base de conhecimento."
+GENERATION_ERROR_MESSAGE = "⚠️ Ocorreu um erro ao tentar gerar a resposta."
+
+# Modos de recuperação suportados:
+# - dense: busca vetorial (embeddings)
+# - lexical: apenas BM25, não carrega modelo de embeddings (nem torch)
+# - hybrid: funde BM25 e busca vetorial com Reciprocal Rank Fusion
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+# Quantos candidatos cada recuperador devolve antes da fusão, por resultado final
+HYBRID_FETCH_FACTOR = 4
+
+# Intervalo mínimo (s) entre verificações de mudança do índice (marcador de versão)
+INDEX_CHECK_INTERVAL = 5.0
 
 class RagPipeline:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        self.vector_writer = VectorWriter(persist_directory=persist_directory)
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        retrieval_mode: str = "dense",
+        bm25_index_path: str = DEFAULT_INDEX_PATH,
+        use_cache: bool = True,
+        max_context_tokens: Optional[int] = None,
+        model_name: Optional[str] = None,
+    ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperação inválido: '{retrieval_mode}'. Use um de {RETRIEVAL_MODES}.")
+        self.persist_directory = persist_directory
+        self.retrieval_mode = retrieval_mode
+        # Modelo do registro (configs/models.yml); padrão: `default_model`
+        self.model_name = model_name or default_model()
+        self.bm25_index_path = bm25_index_path
+        self._searcher = None
+        self._bm25 = None
+        self._load_lock = threading.Lock()
+        # Teto opcional de tokens de contexto (prefill), além do limite da janela do modelo
+        self.max_context_tokens = max_context_tokens
+        self._prefix_warmed = False
+        self._prefix_lock = threading.Lock()
+
+        # Cache em dois níveis: consulta -> embedding/top-k e resposta do LLM
+        self.use_cache = use_cache
+        self.embedding_cache = LRUCache()
+        self.results_cache = LRUCache()
+        self.answer_cache = AnswerCache()
+        self._index_signature = self._current_index_signature()
+        self._last_index_check = time.monotonic()
+        self._reloading = False
+        self._watcher = None
+        self.index_generation = 0
+
+    @property
+    def searcher(self):
+        """Buscador vetorial, criado sob demanda (carrega o modelo de embeddings)."""
+        with self._load_lock:
+            if self._searcher is None:
+                # Import tardio: o modo lexical não deve carregar torch/sentence-transformers
+                from etl.load.vector_reader import EmbeddingSearcher
+                self._searcher = EmbeddingSearcher(persist_directory=self.persist_directory)
+        return self._searcher
 
-    def retrieve_context(self, query: str, k: int = 5) -> List[str]:
+    @property
+    def bm25(self) -> BM25Index:
+        """Índice BM25, carregado do disco na primeira consulta lexical."""
+        if self._bm25 is None:
+            self._bm25 = BM25Index.load(self.bm25_index_path)
+        return self._bm25
+
+    def load(self, warmup: Optional[bool] = None):
         """
-        Recupera os trechos (chunks) mais relevantes da base de conhecimento.
-        Adiciona tratamento de exceções para falhas na busca.
+        Carrega (bloqueante) o recuperador e o modelo de linguagem, faz a geração
+        de aquecimento (`warmup` do registro, se não informado) e pré-avalia o
+        prefixo do prompt.
+        """
+        if warmup is None:
+            warmup = load_registry().get("warmup", True)
+        if self.retrieval_mode == "lexical":
+            _ = self.bm25
+        else:
+            _ = self.searcher
+        load_model(self.model_name, warmup=warmup)
+        self._warm_prefix()
+
+    def preload(self, warmup: Optional[bool] = None) -> threading.Thread:
+        """Executa `load` em segundo plano; a primeira pergunta aguarda só o que faltar."""
+        thread = threading.Thread(target=self.load, args=(warmup,), daemon=True, name="rag-preload")
+        thread.start()
+        return thread
+
+    def status(self) -> Dict:
+        """Prontidão do recuperador e do modelo (para health checks e interfaces)."""
+        retriever_ready = self._bm25 is not None if self.retrieval_mode == "lexical" else self._searcher is not None
+        model = model_status(self.model_name)
+        return {
+            "ready": retriever_ready and model["status"] == "ready",
+            "retriever_ready": retriever_ready,
+            "model": self.model_name,
+            **{f"model_{key}": value for key, value in model.items()},
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.status()["ready"]
+
+    def _current_index_signature(self):
+        """
+        Versão do índice gravada pelo estágio de carga (index_version.json). Sem o
+        marcador (índices antigos), usa mtime/tamanho dos arquivos do índice.
+        """
+        marker = read_index_version(self.persist_directory)
+        if marker is not None:
+            return ("version", marker.get("version"))
+        return index_fingerprint(
+            os.path.join(self.persist_directory, "chroma.sqlite3"),
+            os.path.join(self.persist_directory, METADATA_INDEX_FILENAME),
+            self.bm25_index_path,
+        )
+
+    def _check_index(self):
+        """Dispara a recarga em segundo plano quando a versão do índice em disco muda."""
+        now = time.monotonic()
+        if self._reloading or now - self._last_index_check < INDEX_CHECK_INTERVAL:
+            return
+        self._last_index_check = now
+        signature = self._current_index_signature()
+        if signature != self._index_signature:
+            self._reloading = True
+            threading.Thread(target=self._reload_index, args=(signature,), daemon=True, name="rag-reload").start()
+
+    def _reload_index(self, signature):
+        """
+        Abre o novo índice (Chroma, metadados e BM25) ao lado do atual e troca as
+        referências de uma vez. Consultas em andamento terminam no índice antigo;
+        os modelos de embeddings e de linguagem não são recarregados.
         """
         try:
-            searcher = EmbeddingSearcher()
-            documents = searcher.query(query, k=k)
-            return [doc.page_content for doc in documents]
+            start = time.perf_counter()
+            searcher = self._searcher.reloaded() if self._searcher is not None else None
+            bm25 = None
+            if self._bm25 is not None and os.path.exists(self.bm25_index_path):
+                bm25 = BM25Index.load(self.bm25_index_path)
+
+            if searcher is not None:
+                self._searcher = searcher
+            if bm25 is not None:
+                self._bm25 = bm25
+            self.index_generation += 1
+            self._index_signature = signature
+            # Embeddings de consultas não dependem do índice; top-k e respostas sim
+            self.results_cache.clear()
+            self.answer_cache.clear()
+            print(f"[RAG] Índice recarregado em {time.perf_counter() - start:.2f}s ({signature}).")
+        except Exception as e:
+            # Mantém o índice atual; nova tentativa na próxima verificação
+            print(f"Erro ao recarregar o índice: {e}")
+        finally:
+            self._reloading = False
+
+    def watch_index(self, interval: float = INDEX_CHECK_INTERVAL) -> threading.Thread:
+        """
+        Verifica a versão do índice periodicamente mesmo sem consultas (processos
+        de longa duração como o servidor e o app Streamlit).
+        """
+        if self._watcher is None:
+            def _watch():
+                while True:
+                    time.sleep(interval)
+                    self._check_index()
+
+            self._watcher = threading.Thread(target=_watch, daemon=True, name="rag-index-watch")
+            self._watcher.start()
+        return self._watcher
+
+    def clear_cache(self):
+        self.embedding_cache.clear()
+        self.results_cache.clear()
+        self.answer_cache.clear()
+
+    def cache_stats(self) -> Dict:
+        """Taxas de acerto e latência economizada de cada nível de cache."""
+        stats = {
+            "embeddings": self.embedding_cache.stats.as_dict(),
+            "results": self.results_cache.stats.as_dict(),
+            "answers": self.answer_cache.stats.as_dict(),
+        }
+        prefix_stats = prefix_cache_stats(self.model_name) if self._prefix_warmed else None
+        if prefix_stats:
+            stats["prefix"] = prefix_stats
+        return stats
+
+    def _warm_prefix(self):
+        """Avalia o prefixo fixo do prompt no backend uma vez (cache de estado KV)."""
+        if self._prefix_warmed:
+            return
+        with self._prefix_lock:
+            if self._prefix_warmed:
+                return
+            try:
+                info = warm_prefix(PROMPT_PREFIX, self.model_name)
+                if info:
+                    print(f"[RAG] Prefixo do prompt em cache: {info['tokens']} tokens ({info['seconds']:.2f}s de prefill).")
+            except Exception as e:
+                print(f"Erro ao pré-avaliar o prefixo do prompt: {e}")
+            finally:
+                self._prefix_warmed = True
+
+    def _embed_query(self, query: str):
+        key = normalize_query(query)
+        vector = self.embedding_cache.get(key) if self.use_cache else None
+        if vector is None:
+            start = time.perf_counter()
+            vector = self.searcher.embed_query(query)
+            if self.use_cache:
+                self.embedding_cache.put(key, vector, time.perf_counter() - start)
+        return vector
+
+    def _embed_queries(self, queries: List[str]) -> List:
+        """Embeda as consultas ainda fora do cache em uma única chamada em lote."""
+        keys = [normalize_query(q) for q in queries]
+        vectors = [self.embedding_cache.get(key) if self.use_cache else None for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            start = time.perf_counter()
+            batch = self.searcher.embed_queries([queries[i] for i in missing])
+            cost = (time.perf_counter() - start) / len(missing)
+            for i, vector in zip(missing, batch):
+                vectors[i] = vector
+                if self.use_cache:
+                    self.embedding_cache.put(keys[i], vector, cost)
+        return vectors
+
+    def _dense_search(
+        self, query: str, k: int, filters: Optional[Dict] = None, query_vector=None
+    ) -> List[Document]:
+        if query_vector is None:
+            query_vector = self._embed_query(query)
+        return self.searcher.query_by_vector(query_vector, k=k, filters=filters)
+
+    def _lexical_search(self, query: str, k: int, filters: Optional[Dict] = None) -> List[Document]:
+        sources = self.bm25.sources_matching(filters) if filters else None
+        documents = []
+        for doc_id, score in self.bm25.search(query, k=k, sources=sources):
+            content, metadata = self.bm25.get(doc_id)
+            documents.append(Document(page_content=content, metadata={**metadata, "bm25_score": score}))
+        return documents
+
+    def retrieve_documents(
+        self,
+        query: str,
+        k: int = 5,
+        mode: str = None,
+        filters: Optional[Dict] = None,
+        query_vector=None,
+    ) -> List[Document]:
+        """
+        Recupera os documentos mais relevantes segundo o modo de recuperação.
+        `filters` restringe a busca (path_prefix, source_file, language,
+        ingested_after, ingested_before) diretamente nos índices.
+        Resultados top-k ficam em cache LRU por (pergunta normalizada, k, modo, filtros).
+        """
+        mode = mode or self.retrieval_mode
+        filters = normalize_filters(filters)
+        request_start = time.perf_counter()
+        self._check_index()
+        if not self.use_cache:
+            documents = self._search(query, k, mode, filters, query_vector)
+            observe("retrieval_seconds", time.perf_counter() - request_start, mode=mode)
+            return documents
+
+        generation = self.index_generation
+        key = (normalize_query(query), k, mode, tuple(sorted((f, str(v)) for f, v in filters.items())))
+        documents = self.results_cache.get(key)
+        if documents is None:
+            start = time.perf_counter()
+            documents = self._search(query, k, mode, filters, query_vector)
+            # Não guarda resultados do índice antigo se houve troca durante a busca
+            if generation == self.index_generation:
+                self.results_cache.put(key, documents, time.perf_counter() - start)
+        else:
+            incr("cache_hits", cache="results")
+        observe("retrieval_seconds", time.perf_counter() - request_start, mode=mode)
+        return list(documents)
+
+    def _search(self, query: str, k: int, mode: str, filters: Dict, query_vector=None) -> List[Document]:
+        if mode == "dense":
+            return self._dense_search(query, k, filters, query_vector)
+        if mode == "lexical":
+            return self._lexical_search(query, k, filters)
+        if mode == "hybrid":
+            fetch_k = k * HYBRID_FETCH_FACTOR
+            dense_docs = self._dense_search(query, fetch_k, filters, query_vector)
+            lexical_docs = self._lexical_search(query, fetch_k, filters)
+
+            by_key = {}
+            rankings = []
+            for docs in (dense_docs, lexical_docs):
+                ranking = []
+                for doc in docs:
+                    key = chunk_key(doc.metadata)
+                    by_key.setdefault(key, doc)
+                    ranking.append(key)
+                rankings.append(ranking)
+
+            return [by_key[key] for key, _ in reciprocal_rank_fusion(rankings)[:k]]
+        raise ValueError(f"Modo de recuperação inválido: '{mode}'. Use um de {RETRIEVAL_MODES}.")
+
+    def _safe_retrieve(
+        self, query: str, k: int = 5, mode: str = None, filters: Optional[Dict] = None, query_vector=None
+    ) -> List[Document]:
+        try:
+            return self.retrieve_documents(query, k=k, mode=mode, filters=filters, query_vector=query_vector)
         except Exception as e:
             print(f"Erro na recuperação de contexto: {e}")
             return []
 
+    def retrieve_batch(
+        self, queries: List[str], k: int = 5, mode: str = None, filters: Optional[Dict] = None
+    ) -> List[List[Document]]:
+        """
+        Recupera contexto para várias perguntas, embedando todas em um único lote.
+        """
+        mode = mode or self.retrieval_mode
+        vectors = [None] * len(queries)
+        if mode != "lexical" and queries:
+            try:
+                vectors = self._embed_queries(queries)
+            except Exception as e:
+                print(f"Erro ao embedar consultas em lote: {e}")
+        return [
+            self._safe_retrieve(query, k=k, mode=mode, filters=filters, query_vector=vector)
+            for query, vector in zip(queries, vectors)
+        ]
+
+    def retrieve_context(
+        self, query: str, k: int = 5, mode: str = None, filters: Optional[Dict] = None
+    ) -> List[str]:
+        """
+        Recupera os trechos (chunks) mais relevantes da base de conhecimento.
+        Adiciona tratamento de exceções para falhas na busca.
+        """
+        return [doc.page_content for doc in self._safe_retrieve(query, k=k, mode=mode, filters=filters)]
+
     def build_prompt(self, query: str, context_chunks: List[str]) -> str:
         """
         Cria um prompt de geração a partir do template pré-definido.
         """
         context = format_chunks_for_prompt(context_chunks)
         return PROMPT_GENERATION_TEMPLATE.format(context=context, query=query)
-    
-    def generate_answer(self, query: str, k: int = 5, max_tokens: int = 512) -> str:
-        context_chunks = self.retrieve_context(query, k=k)
 
-        if not context_chunks:
-            return "⚠️ Desculpe, não encontrei informações relevantes na base de conhecimento."
+    def _document_vectors(self, documents: List[Document]):
+        """Embeddings já armazenados dos documentos (para MMR); None se indisponíveis."""
+        if self._searcher is None:
+            return None
+        from etl.load.vector_writer import make_chunk_id
+        ids = [
+            doc.id or make_chunk_id({"content": doc.page_content, "metadata": doc.metadata})
+            for doc in documents
+        ]
+        try:
+            return self.searcher.get_embeddings(ids)
+        except Exception:
+            return None
+
+    def pack_documents(self, query: str, documents: List[Document], max_tokens: int) -> List[Document]:
+        """
+        Reduz os documentos recuperados ao que cabe no prompt: remove redundância
+        (MMR/sobreposição) e respeita a janela do modelo descontando `max_tokens`.
+        """
+        if not documents:
+            return documents
+        try:
+            return pack_context(
+                query,
+                documents,
+                PROMPT_GENERATION_TEMPLATE,
+                self.model_name,
+                max_tokens,
+                query_vector=self.embedding_cache.peek(normalize_query(query)),
+                doc_vectors=self._document_vectors(documents),
+                max_context_tokens=self.max_context_tokens,
+            )
+        except Exception as e:
+            print(f"Erro ao empacotar contexto: {e}")
+            return documents
+
+    def _cached_answer(self, query: str, documents: List[Document], max_tokens: int):
+        """Consulta o cache de respostas. Retorna (resposta ou None, ids dos chunks, embedding)."""
+        chunk_ids = [doc.id or chunk_key(doc.metadata) for doc in documents]
+        query_embedding = self.embedding_cache.peek(normalize_query(query))
+        cached = None
+        if self.use_cache:
+            cached = self.answer_cache.lookup(query, chunk_ids, self.model_name, max_tokens, query_embedding)
+        return cached, chunk_ids, query_embedding
 
-        prompt = self.build_prompt(query, context_chunks)
+    def generate_answer(
+        self,
+        query: str,
+        k: int = 5,
+        max_tokens: int = 512,
+        mode: str = None,
+        filters: Optional[Dict] = None,
+    ) -> str:
+        documents = self._safe_retrieve(query, k=k, mode=mode, filters=filters)
+
+        if not documents:
+            return NO_CONTEXT_MESSAGE
+        documents = self.pack_documents(query, documents, max_tokens)
+
+        # Cache de respostas: mesma pergunta (ou parecida) com os mesmos chunks
+        cached, chunk_ids, query_embedding = self._cached_answer(query, documents, max_tokens)
+        if cached is not None:
+            incr("cache_hits", cache="answer")
+            return cached
+
+        prompt = self.build_prompt(query, [doc.page_content for doc in documents])
+        self._warm_prefix()
+        try:
+            start = time.perf_counter()
+            raw_answer = call_llm(prompt, model_name=self.model_name, max_tokens=max_tokens)
+            elapsed = time.perf_counter() - start
+            observe("generation_seconds", elapsed, model=self.model_name)
+        except Exception as e:
+            print(f"Erro ao gerar a resposta: {e}")
+            return GENERATION_ERROR_MESSAGE
+
+        answer = f"\n\n{raw_answer}"
+        if self.use_cache:
+            self.answer_cache.store(query, chunk_ids, self.model_name, max_tokens, answer, query_embedding, elapsed)
+        return answer
+
+    def stream_answer(
+        self,
+        query: str,
+        k: int = 5,
+        max_tokens: int = 512,
+        mode: str = None,
+        filters: Optional[Dict] = None,
+    ) -> Iterator[str]:
+        """
+        Versão em streaming de `generate_answer`: devolve os trechos da resposta à
+        medida que o modelo os gera. Respostas em cache saem em um único trecho.
+        """
+        documents = self._safe_retrieve(query, k=k, mode=mode, filters=filters)
+
+        if not documents:
+            yield NO_CONTEXT_MESSAGE
+            return
+        documents = self.pack_documents(query, documents, max_tokens)
+
+        cached, chunk_ids, query_embedding = self._cached_answer(query, documents, max_tokens)
+        if cached is not None:
+            incr("cache_hits", cache="answer")
+            yield cached
+            return
+
+        prompt = self.build_prompt(query, [doc.page_content for doc in documents])
+        self._warm_prefix()
+        parts = []
+        start = time.perf_counter()
         try:
-            
-            raw_answer = call_llm(prompt, model_name=MODEL_NAME, max_tokens=max_tokens)
+            for text in stream_llm(prompt, model_name=self.model_name, max_tokens=max_tokens):
+                parts.append(text)
+                yield text
         except Exception as e:
             print(f"Erro ao gerar a resposta: {e}")
-            return "⚠️ Ocorreu um erro ao tentar gerar a resposta."
+            yield GENERATION_ERROR_MESSAGE
+            return
+        observe("generation_seconds", time.perf_counter() - start, model=self.model_name)
+
+        if self.use_cache and parts:
+            answer = "".join(parts).strip()
+            self.answer_cache.store(
+                query, chunk_ids, self.model_name, max_tokens, f"\n\n{answer}",
+                query_embedding, time.perf_counter() - start
+            )
+
+    def answer_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        max_tokens: int = 512,
+        mode: str = None,
+        filters: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        Responde várias perguntas de uma vez: recuperação com embeddings em lote e
+        geração em lote quando o backend suporta (`call_llm_batch`).
+
+        Returns:
+            List[Dict]: Para cada pergunta, {"answer", "sources", "timings"}.
+        """
+        start = time.perf_counter()
+        documents_list = self.retrieve_batch(queries, k=k, mode=mode, filters=filters)
+        retrieval_seconds = (time.perf_counter() - start) / max(len(queries), 1)
+
+        results = []
+        pending = []
+        for i, (query, documents) in enumerate(zip(queries, documents_list)):
+            documents = self.pack_documents(query, documents, max_tokens)
+            result = {
+                "answer": None,
+                "sources": [
+                    {key: doc.metadata.get(key) for key in ("source_file", "relative_path", "chunk_index")}
+                    for doc in documents
+                ],
+                "timings": {"retrieval_s": round(retrieval_seconds, 4), "generation_s": 0.0, "cached": False},
+            }
+            results.append(result)
+            if not documents:
+                result["answer"] = NO_CONTEXT_MESSAGE
+                continue
+            cached, chunk_ids, query_embedding = self._cached_answer(query, documents, max_tokens)
+            if cached is not None:
+                result["answer"] = cached
+                result["timings"]["cached"] = True
+                incr("cache_hits", cache="answer")
+                continue
+            prompt = self.build_prompt(query, [doc.page_content for doc in documents])
+            pending.append((i, prompt, chunk_ids, query_embedding))
+
+        if pending:
+            self._warm_prefix()
+            start = time.perf_counter()
+            try:
+                answers = call_llm_batch([prompt for _, prompt, _, _ in pending], self.model_name, max_tokens)
+            except Exception as e:
+                print(f"Erro ao gerar respostas em lote: {e}")
+                answers = [None] * len(pending)
+            generation_seconds = (time.perf_counter() - start) / len(pending)
 
-        return f"\n\n{raw_answer}"
\ No newline at end of file
+            for (i, _, chunk_ids, query_embedding), raw_answer in zip(pending, answers):
+                results[i]["timings"]["generation_s"] = round(generation_seconds, 4)
+                observe("generation_seconds", generation_seconds, model=self.model_name, batched=True)
+                if raw_answer is None:
+                    results[i]["answer"] = GENERATION_ERROR_MESSAGE
+                    continue
+                answer = f"\n\n{raw_answer}"
+                results[i]["answer"] = answer
+                if self.use_cache:
+                    self.answer_cache.store(
+                        queries[i], chunk_ids, self.model_name, max_tokens, answer, query_embedding, generation_seconds
+                    )
+        return results
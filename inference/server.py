@@ -0,0 +1,330 @@
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from inference.rag_pipeline import RagPipeline, RETRIEVAL_MODES
+from etl.load.metadata_index import normalize_filters
+from utils import instrumentation
+
+# Parâmetros padrão do servidor
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_QUEUE_SIZE = 64          # pedidos aguardando; acima disso responde 503 (backpressure)
+MAX_BATCH_SIZE = 8           # pedidos agrupados por lote de recuperação/geração
+BATCH_WAIT_MS = 15           # janela para completar um lote após o primeiro pedido
+REQUEST_TIMEOUT = 180.0      # segundos por pedido (fila + processamento)
+MAX_BODY_BYTES = 1 << 20
+
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class BadRequest(ValueError):
+    """Requisição HTTP malformada (respondida com 400)."""
+
+
+class QueryRequest:
+    """Pedido enfileirado, com o futuro que recebe a resposta."""
+
+    def __init__(self, payload: Dict, future: asyncio.Future):
+        self.query = payload["query"]
+        self.k = int(payload.get("k", 5))
+        self.max_tokens = int(payload.get("max_tokens", 512))
+        self.mode = payload.get("mode")
+        # Validados aqui: na recuperação, erros viram "sem contexto" com 200
+        if self.mode is not None and self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperação inválido: '{self.mode}'. Use um de {RETRIEVAL_MODES}.")
+        filters = payload.get("filters")
+        if filters is not None and not isinstance(filters, dict):
+            raise ValueError("Campo 'filters' deve ser um objeto JSON.")
+        self.filters = normalize_filters(filters) or None
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+    @property
+    def batch_key(self) -> Tuple:
+        """Pedidos só são agrupados se compartilham parâmetros de recuperação e geração."""
+        return (self.k, self.max_tokens, self.mode, json.dumps(self.filters, sort_keys=True, default=str))
+
+
+class RagServer:
+    """
+    Servidor HTTP local (asyncio, sem dependências externas) em torno do RagPipeline.
+
+    - Pedidos entram numa fila limitada; fila cheia responde 503 com Retry-After.
+    - Um worker forma lotes dinâmicos (até `max_batch` pedidos ou `batch_wait_ms`)
+      e os processa em uma thread dedicada: embeddings das consultas em lote e
+      geração em lote quando o backend permite. Um único executor evita que
+      pedidos concorrentes disputem o mesmo modelo.
+    - Cada pedido tem timeout próprio (504); pedidos expirados são descartados
+      antes de entrar em um lote.
+    - GET /health (vivo), GET /ready (pipeline carregado), GET /stats, GET /metrics
+      (Prometheus) e POST /query.
+    """
+
+    def __init__(
+        self,
+        rag: Optional[RagPipeline] = None,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_queue: int = MAX_QUEUE_SIZE,
+        max_batch: int = MAX_BATCH_SIZE,
+        batch_wait_ms: int = BATCH_WAIT_MS,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.rag = rag
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.request_timeout = request_timeout
+        self.max_queue = max_queue
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-worker")
+        self.ready = False
+        self.stats = {"requests": 0, "completed": 0, "rejected": 0, "timeouts": 0, "errors": 0, "batches": 0}
+
+    # ------------------------
+    # Ciclo de vida
+    # ------------------------
+
+    def _load_pipeline(self):
+        if self.rag is None:
+            self.rag = RagPipeline(persist_directory="./data/output/embeddings")
+        # Carrega recuperador e modelo (com aquecimento) antes de aceitar consultas
+        self.rag.load()
+        if not self.rag.ready:
+            raise RuntimeError(f"Pipeline não ficou pronto: {self.rag.status()}")
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        asyncio.create_task(self._batch_worker())
+        print(f"[Server] Escutando em http://{self.host}:{self.port}")
+
+        try:
+            await loop.run_in_executor(self.executor, self._load_pipeline)
+        except Exception as e:
+            print(f"[Server] Falha ao carregar o pipeline: {e}")
+            return server
+        self.ready = True
+        self.rag.watch_index()
+        print("[Server] Pipeline carregado, pronto para receber consultas.")
+        return server
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    # ------------------------
+    # Lotes
+    # ------------------------
+
+    async def _collect_batch(self) -> List[QueryRequest]:
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Descarta pedidos cujo cliente já desistiu (timeout)
+        return [request for request in batch if not request.future.done()]
+
+    async def _batch_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            groups: Dict[Tuple, List[QueryRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.batch_key, []).append(request)
+
+            for requests in groups.values():
+                self.stats["batches"] += 1
+                first = requests[0]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.rag.answer_batch(
+                            [r.query for r in requests],
+                            k=first.k,
+                            max_tokens=first.max_tokens,
+                            mode=first.mode,
+                            filters=first.filters,
+                        ),
+                    )
+                except Exception as e:
+                    self.stats["errors"] += len(requests)
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+                    continue
+
+                for request, result in zip(requests, results):
+                    if not request.future.done():
+                        result["timings"]["queue_s"] = round(time.perf_counter() - request.enqueued_at, 4)
+                        instrumentation.observe("server_request_seconds", time.perf_counter() - request.enqueued_at)
+                        result["timings"]["batch_size"] = len(requests)
+                        request.future.set_result(result)
+
+    # ------------------------
+    # HTTP
+    # ------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise BadRequest("Linha de requisição inválida.")
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise BadRequest("Content-Length inválido.")
+        if length < 0:
+            raise BadRequest("Content-Length inválido.")
+        if length > MAX_BODY_BYTES:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload,
+        extra_headers: Dict = None,
+        content_type: str = "application/json; charset=utf-8",
+    ):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {
+            "Content-Type": content_type,
+            "Content-Length": str(len(body)),
+            "Connection": "close",
+            **(extra_headers or {}),
+        }
+        head = f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            parsed = await self._read_request(reader)
+            if parsed is None:
+                return
+            method, path, _, body = parsed
+            path = path.split("?", 1)[0]
+
+            if path == "/health":
+                await self._send(writer, 200, {"status": "ok"})
+            elif path == "/ready":
+                status = 200 if self.ready else 503
+                details = self.rag.status() if self.rag is not None else {}
+                await self._send(writer, status, {**details, "ready": self.ready, "queued": self.queue.qsize()})
+            elif path == "/stats":
+                cache = self.rag.cache_stats() if self.ready else {}
+                await self._send(writer, 200, {**self.stats, "queued": self.queue.qsize(), "cache": cache})
+            elif path == "/metrics":
+                await self._send(
+                    writer, 200, instrumentation.prometheus_text(), content_type="text/plain; version=0.0.4"
+                )
+            elif path == "/query":
+                if method != "POST":
+                    await self._send(writer, 405, {"error": "Use POST."})
+                elif body is None:
+                    await self._send(writer, 413, {"error": "Corpo da requisição muito grande."})
+                else:
+                    await self._handle_query(writer, body)
+            else:
+                await self._send(writer, 404, {"error": f"Rota não encontrada: {path}"})
+        except BadRequest as e:
+            await self._send(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_query(self, writer: asyncio.StreamWriter, body: bytes):
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("O corpo deve ser um objeto JSON.")
+            if not str(payload.get("query", "")).strip():
+                raise ValueError("Campo 'query' é obrigatório.")
+            request = QueryRequest(payload, asyncio.get_running_loop().create_future())
+        except (ValueError, TypeError) as e:
+            await self._send(writer, 400, {"error": str(e)})
+            return
+
+        self.stats["requests"] += 1
+        if not self.ready:
+            self.stats["rejected"] += 1
+            await self._send(writer, 503, {"error": "Servidor ainda carregando."}, {"Retry-After": "5"})
+            return
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            await self._send(writer, 503, {"error": "Fila cheia, tente novamente."}, {"Retry-After": "1"})
+            return
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(request.future), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            request.future.cancel()
+            await self._send(writer, 504, {"error": "Tempo limite excedido."})
+            return
+        except Exception as e:
+            await self._send(writer, 503, {"error": f"Erro ao processar consulta: {e}"})
+            return
+
+        self.stats["completed"] += 1
+        await self._send(writer, 200, result)
+
+
+def run_server(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    retrieval_mode: str = "dense",
+    model_name: Optional[str] = None,
+    **kwargs,
+):
+    """Sobe o servidor HTTP local do RAG (bloqueante). Métricas ficam em GET /metrics."""
+    instrumentation.enable()
+    rag = RagPipeline(
+        persist_directory="./data/output/embeddings", retrieval_mode=retrieval_mode, model_name=model_name
+    )
+    server = RagServer(rag, host=host, port=port, **kwargs)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n[Server] Encerrado.")
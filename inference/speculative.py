@@ -0,0 +1,50 @@
+from typing import Dict, Optional
+
+# Modos de decodificação dos backends transformers:
+# - standard: geração autoregressiva normal
+# - assisted: um modelo rascunho menor propõe tokens que o modelo principal verifica
+# - prompt_lookup: os rascunhos são n-gramas copiados do próprio prompt (contexto recuperado)
+DECODING_MODES = ("standard", "assisted", "prompt_lookup")
+
+NUM_ASSISTANT_TOKENS = 5
+PROMPT_LOOKUP_NUM_TOKENS = 10
+
+def vocab_compatible(main_tokenizer, draft_tokenizer) -> bool:
+    """
+    A geração assistida do transformers exige que rascunho e modelo principal
+    compartilhem o vocabulário (mesmos ids para os mesmos tokens).
+    """
+    return main_tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+
+def load_assistant(model_id: str, main_tokenizer, device_map: str = "auto", num_assistant_tokens: int = NUM_ASSISTANT_TOKENS):
+    """
+    Carrega o modelo rascunho para geração assistida.
+
+    Raises:
+        ValueError: se o rascunho não usar o mesmo vocabulário do modelo principal.
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    draft_tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if not vocab_compatible(main_tokenizer, draft_tokenizer):
+        raise ValueError(f"O modelo rascunho '{model_id}' não compartilha o tokenizer do modelo principal.")
+
+    assistant = AutoModelForCausalLM.from_pretrained(model_id, device_map=device_map)
+    assistant.generation_config.num_assistant_tokens = num_assistant_tokens
+    return assistant
+
+def decoding_kwargs(config: Dict, decoding: Optional[str] = None, assistant=None) -> Dict:
+    """
+    Argumentos extras de `generate` para o modo de decodificação (o do registro
+    se `decoding` não for informado). Sem rascunho carregado, `assisted` cai para
+    geração normal.
+    """
+    decoding = decoding or config.get("decoding", "standard")
+    if decoding not in DECODING_MODES:
+        raise ValueError(f"Modo de decodificação inválido: '{decoding}'. Use um de {DECODING_MODES}.")
+
+    if decoding == "assisted" and assistant is not None:
+        return {"assistant_model": assistant}
+    if decoding == "prompt_lookup":
+        return {"prompt_lookup_num_tokens": config.get("prompt_lookup_num_tokens", PROMPT_LOOKUP_NUM_TOKENS)}
+    return {}
@@ -1,13 +1,20 @@
 import streamlit as st
 import warnings
-from inference.rag_pipeline import RagPipeline
+from inference.rag_pipeline import RagPipeline, RETRIEVAL_MODES
+from inference.model_registry import load_registry
 
 warnings.filterwarnings("ignore", message=".*was not set")
 
 # 1. Função cacheada para carregar o RagPipeline
 @st.cache_resource
 def load_rag_pipeline():
-    return RagPipeline(persist_directory="./data/output/embeddings")
+    rag = RagPipeline(persist_directory="./data/output/embeddings")
+    # Carrega recuperador e modelo em segundo plano: a página abre sem esperar
+    if load_registry().get("preload", True):
+        rag.preload()
+    # O recurso fica em cache entre sessões: acompanha novas versões do índice sem reiniciar
+    rag.watch_index()
+    return rag
 
 # 2. Função principal do app
 def chat_app():
@@ -16,24 +23,52 @@ def chat_app():
 
     # Carrega pipeline RAG
     rag = load_rag_pipeline()
+    status = rag.status()
+    if status["ready"]:
+        st.caption(f"Modelo: {rag.model_name} ✅ pronto")
+    else:
+        st.caption(f"Modelo: {rag.model_name} ⏳ {status['model_status']}")
 
     user_prompt = st.text_area("Digite sua pergunta:", height=150)
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         k = st.slider("Docs de contexto (top-k)", 1, 10, 5)
     with col2:
         max_tokens = st.slider("Máx. Tokens", 100, 1024, 512)
+    with col3:
+        mode = st.selectbox("Recuperação", RETRIEVAL_MODES, index=0)
+
+    with st.expander("Filtros de escopo"):
+        fcol1, fcol2 = st.columns(2)
+        with fcol1:
+            path_prefix = st.text_input("Prefixo de pasta", placeholder="Livros/")
+            language = st.text_input("Idioma", placeholder="pt")
+        with fcol2:
+            source_file = st.text_input("Arquivo de origem", placeholder="notas.md")
+            use_date = st.checkbox("Ingeridos a partir de")
+            ingested_after = st.date_input("Data de ingestão") if use_date else None
+
+    filters = {
+        "path_prefix": path_prefix.strip(),
+        "source_file": source_file.strip(),
+        "language": language.strip(),
+        "ingested_after": ingested_after,
+    }
 
     if st.button("Responder"):
         if user_prompt.strip():
-            with st.spinner("Buscando contexto e gerando resposta..."):
-                resposta = rag.generate_answer(user_prompt, k=k, max_tokens=max_tokens)
-                st.markdown("### 💡 Resposta:")
-                st.write(resposta)
+            st.markdown("### 💡 Resposta:")
+            # Renderiza os tokens à medida que são gerados
+            st.write_stream(
+                rag.stream_answer(user_prompt, k=k, max_tokens=max_tokens, mode=mode, filters=filters)
+            )
         else:
             st.warning("Digite uma pergunta primeiro.")
 
+    with st.expander("Estatísticas de cache"):
+        st.table(rag.cache_stats())
+
 # 3. Executa o app
 if __name__ == "__main__":
     chat_app()
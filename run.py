@@ -5,11 +5,33 @@ import click
 import logging
 
 from etl.extract.extract import run_extraction
+from etl.extract.ocr_cache import get_ocr_cache
+from etl.load.metadata_index import normalize_filters
 from etl.load.load import run_embedding_generation
 from etl.load.evaluate_load import run_embedding_metrics
 from etl.load.evaluate_load import run_chunk_metrics
+from etl.load.vector_gc import run_vector_gc
+from etl.stream_pipeline import run_streaming_pipeline, parse_workers
+from etl.run_manifest import RunManifest, RUNS_DIRNAME
+from etl.shard import merge_shards, parse_shard, shard_layout
 from etl.transform.transform import run_transformation
 from inference.inference import run_inference
+from utils import instrumentation
+from utils.profiling import PROFILE_MODES, new_profile_dir, profile_step
+from utils.resources import get_governor
+
+def parse_filter_option(ctx, param, value) -> dict:
+    """Callback do --filter: converte ('chave=valor', ...) em filtros validados."""
+    filters = {}
+    for item in value:
+        key, sep, filter_value = item.partition("=")
+        if not sep:
+            raise click.BadParameter(f"Filtro inválido: '{item}'. Use chave=valor.", ctx=ctx, param=param)
+        filters[key] = filter_value
+    try:
+        return normalize_filters(filters)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx=ctx, param=param)
 
 @click.command(
     help="""
@@ -39,10 +61,40 @@ from inference.inference import run_inference
     # Run only embedding generation
     python run.py --run-embedding-generation-exec
 
+    \b
+    # Clean and chunk in a single pass over the extracted files
+    python run.py --run-transformation-exec --fused-transform
+
+    \b
+    # Extract, clean, chunk and embed as one overlapped streaming step
+    python run.py --run-streaming-exec --stream-workers extract=4,embed=1
+
     \b
     # Run inference step only
     python run.py --run-inference-exec
 
+    \b
+    # Serve inference over local HTTP (POST /query)
+    python run.py --run-inference-exec --inference-mode server
+
+    \b
+    # Answer a JSONL file of questions in batches (resumable)
+    python run.py --run-inference-exec --inference-mode batch --questions-file questions.jsonl
+
+    \b
+    # Profile a step (cProfile or stack sampling, plus allocations)
+    python run.py --run-transformation-exec --profile sampling --profile-memory
+
+    \b
+    # Sharded ingestion: one streaming shard per node, then merge into the serving index
+    python run.py --run-streaming-exec --shard 0/4
+    python run.py --run-shard-merge-exec
+
+    \b
+    # Resume an interrupted run (unfinished steps and items only), or retry one document
+    python run.py --resume latest
+    python run.py --resume 20250101_120000 --retry-item D:/ARQUIVOS/relatorio.pdf
+
     \b
     # Export pipeline settings
     python run.py --export-settings
@@ -78,12 +130,114 @@ from inference.inference import run_inference
     default=False,
     help="Run the transformation step explicitly.",
 )
+@click.option(
+    "--fused-transform",
+    is_flag=True,
+    default=False,
+    help="With --run-transformation-exec, clean and chunk each extracted file in a single read (clean copies written in the background).",
+)
+@click.option(
+    "--run-streaming-exec",
+    is_flag=True,
+    default=False,
+    help="Run extraction, transformation and embedding generation as one streaming step (documents flow through bounded stage queues).",
+)
+@click.option(
+    "--stream-workers",
+    default=None,
+    help="Workers per streaming stage, e.g. extract=4,clean=2,chunk=1,embed=1.",
+)
+@click.option(
+    "--shard",
+    default=None,
+    help="With --run-streaming-exec, process only shard INDEX/COUNT of the source files into <raw_dir>/shards/INDEX-of-COUNT.",
+)
+@click.option(
+    "--run-shard-merge-exec",
+    is_flag=True,
+    default=False,
+    help="Merge the partial outputs in <raw_dir>/shards into the serving chunks, vector store and BM25 index.",
+)
+@click.option(
+    "--run-vector-gc-exec",
+    is_flag=True,
+    default=False,
+    help="Remove stale vectors (deleted/edited sources) and compact the store.",
+)
 @click.option(
     "--run-inference-exec",
     is_flag=True,
     default=False,
     help="Run the inference step explicitly.",
 )
+@click.option(
+    "--inference-mode",
+    type=click.Choice(["cli", "chat", "server", "batch"]),
+    default="cli",
+    help="Inference interface: interactive CLI, Streamlit chat, local HTTP server or batch over a questions file.",
+)
+@click.option(
+    "--questions-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSONL file with one {\"question\": ...} per line (batch inference mode).",
+)
+@click.option(
+    "--answers-file",
+    type=click.Path(dir_okay=False),
+    default="data/output/answers/answers.jsonl",
+    show_default=True,
+    help="Output JSONL for batch answers; existing ids are skipped on resume.",
+)
+@click.option(
+    "--model",
+    "model_name",
+    default=None,
+    help="Language model from configs/models.yml (defaults to its default_model).",
+)
+@click.option(
+    "--retrieval-mode",
+    type=click.Choice(["dense", "lexical", "hybrid"]),
+    default="dense",
+    help="Retrieval mode used by inference (dense, lexical BM25 or hybrid).",
+)
+@click.option(
+    "--filter",
+    "filters",
+    multiple=True,
+    callback=parse_filter_option,
+    help="Scope inference retrieval with key=value (path_prefix, source_file, language, ingested_after, ingested_before).",
+)
+@click.option(
+    "--instrument",
+    is_flag=True,
+    default=False,
+    help="Collect per-stage spans, counters and latency histograms; writes JSON and Prometheus reports to <raw_dir>/metrics.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILE_MODES),
+    default=None,
+    help="Profile each selected step (deterministic cProfile or stack sampling); artefacts go to <raw_dir>/profiles/<timestamp>.",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="Track memory allocations (tracemalloc) per step and write top-allocation reports.",
+)
+@click.option(
+    "--resume",
+    "resume_run_id",
+    default=None,
+    help="Resume a previous run by id (or 'latest') from <raw_dir>/runs, using its config snapshot and skipping finished steps and items.",
+)
+@click.option(
+    "--retry-item",
+    "retry_items",
+    multiple=True,
+    help="With --resume, rerun only this document (input path or <name>_ocr.md) through the run's steps.",
+)
 @click.option(
     "--export-settings",
     is_flag=True,
@@ -97,16 +251,38 @@ def main(
     run_embedding_metrics_exec: bool = False,
     run_chunk_metrics_exec: bool = False,
     run_transformation_exec: bool = False,
+    fused_transform: bool = False,
+    run_streaming_exec: bool = False,
+    stream_workers: str = None,
+    shard: str = None,
+    run_shard_merge_exec: bool = False,
+    run_vector_gc_exec: bool = False,
     run_inference_exec: bool = False,
+    inference_mode: str = "cli",
+    model_name: str = None,
+    questions_file: str = None,
+    answers_file: str = "data/output/answers/answers.jsonl",
+    retrieval_mode: str = "dense",
+    filters: dict = None,
+    instrument: bool = False,
+    profile: str = None,
+    profile_memory: bool = False,
+    resume_run_id: str = None,
+    retry_items: tuple = (),
     export_settings: bool = False,      
 ) -> None:
+    assert not retry_items or resume_run_id, "--retry-item requires --resume <run-id>."
     assert (
         run_extraction_exec
         or run_embedding_generation_exec
         or run_embedding_metrics_exec
         or run_chunk_metrics_exec
         or run_transformation_exec
+        or run_streaming_exec
+        or run_shard_merge_exec
+        or run_vector_gc_exec
         or run_inference_exec
+        or resume_run_id
         or export_settings
     ), "Please specify an action to run."
 
@@ -121,31 +297,133 @@ def main(
     with open(pipeline_config_path, "r", encoding="utf-8") as f:
         pipeline_config = yaml.safe_load(f)
 
+    # --- Manifesto da execução (nova ou retomada) ---
+    runs_dir = str(Path(pipeline_config.get("raw_dir")) / RUNS_DIRNAME)
+    step_flags = {
+        "extraction": run_extraction_exec,
+        "transformation": run_transformation_exec,
+        "embedding_generation": run_embedding_generation_exec,
+        "streaming": run_streaming_exec,
+        "shard_merge": run_shard_merge_exec,
+        "vector_gc": run_vector_gc_exec,
+        "chunk_metrics": run_chunk_metrics_exec,
+        "embedding_metrics": run_embedding_metrics_exec,
+        "inference": run_inference_exec,
+    }
+    options = {
+        "fused_transform": fused_transform,
+        "stream_workers": stream_workers,
+        "shard": shard,
+        "inference_mode": inference_mode,
+        "model_name": model_name,
+        "questions_file": questions_file,
+        "answers_file": answers_file,
+        "retrieval_mode": retrieval_mode,
+        "filters": filters or {},
+    }
+    if resume_run_id:
+        manifest = RunManifest.load(runs_dir, resume_run_id)
+        if retry_items:
+            manifest.retry_items(retry_items)
+        pipeline_config = manifest.config["pipeline"]
+        options = manifest.config["options"]
+        step_flags = {name: name in manifest.steps for name in step_flags}
+        logging.info(f"Resuming run {manifest.run_id}: {manifest.unfinished_items() or 'no unfinished items'}")
+    else:
+        manifest = RunManifest.create(
+            runs_dir,
+            config={"pipeline": pipeline_config, "options": options},
+            steps=[name for name, selected in step_flags.items() if selected],
+        )
+
     # Extrair variáveis
     paths = pipeline_config.get("paths", [])
     raw_dir = pipeline_config.get("raw_dir")
     clean_dir = pipeline_config.get("clean_dir")
     chunks_path = pipeline_config.get("chunks_path")
     embeddings_dir = pipeline_config.get("embeddings_dir")
+    bm25_index_path = pipeline_config.get("bm25_index_path")
 
-    # --- Run steps usando pipeline_paths.yml ---
-    if run_extraction_exec:
-        run_extraction(paths=paths)
-
-    if run_transformation_exec:
-        run_transformation(raw_dir, clean_dir, chunks_path)
+    # Shard: saídas parciais em <raw_dir>/shards/<i>-of-<n>, juntadas depois por --run-shard-merge-exec
+    shard_spec = parse_shard(options.get("shard"))
+    if shard_spec:
+        assert {name for name, selected in step_flags.items() if selected} <= {"streaming"}, (
+            "--shard only applies to --run-streaming-exec."
+        )
+        layout = shard_layout(raw_dir, *shard_spec)
+        raw_dir, clean_dir, chunks_path = layout["raw_dir"], layout["clean_dir"], layout["chunks_path"]
+        embeddings_dir, bm25_index_path = layout["embeddings_dir"], layout["bm25_index_path"]
 
-    if run_embedding_generation_exec:
-        run_embedding_generation(chunks_path, embeddings_dir)
+    if instrument:
+        instrumentation.enable()
 
-    if run_chunk_metrics_exec:
-        run_chunk_metrics(chunks_path, embeddings_dir, k=5, sample_size=500)
-
-    if run_embedding_metrics_exec:
-        run_embedding_metrics(label_key="source_file", limit=100)
+    # --- Run steps usando pipeline_paths.yml ---
+    steps = [
+        ("extraction", lambda: run_extraction(paths=paths, manifest=manifest)),
+        ("transformation", lambda: run_transformation(
+            raw_dir, clean_dir, chunks_path, bm25_index_path=bm25_index_path, manifest=manifest,
+            fused=options.get("fused_transform", False),
+        )),
+        ("embedding_generation", lambda: run_embedding_generation(
+            chunks_path, embeddings_dir, bm25_index_path=bm25_index_path, manifest=manifest
+        )),
+        ("streaming", lambda: run_streaming_pipeline(
+            paths, raw_dir, clean_dir, chunks_path, embeddings_dir,
+            bm25_index_path=bm25_index_path, workers=parse_workers(options["stream_workers"]), manifest=manifest,
+            shard=shard_spec,
+        )),
+        ("shard_merge", lambda: merge_shards(
+            raw_dir, clean_dir, chunks_path, embeddings_dir, bm25_index_path=bm25_index_path
+        )),
+        ("vector_gc", lambda: run_vector_gc(
+            chunks_path, clean_dir, embeddings_dir, bm25_index_path=bm25_index_path
+        )),
+        ("chunk_metrics", lambda: run_chunk_metrics(chunks_path, embeddings_dir, k=5)),
+        ("embedding_metrics", lambda: run_embedding_metrics(label_key="source_file")),
+        ("inference", lambda: run_inference(
+            mode=options["inference_mode"],
+            retrieval_mode=options["retrieval_mode"],
+            filters=options["filters"],
+            model_name=options["model_name"],
+            questions_path=options["questions_file"],
+            answers_path=options["answers_file"],
+        )),
+    ]
+    selected_steps = [name for name, _ in steps if step_flags[name]]
+    profile_dir = new_profile_dir(str(Path(raw_dir) / "profiles")) if profile or profile_memory else None
 
-    if run_inference_exec:
-        run_inference(mode="cli")
+    try:
+        for name, step in steps:
+            if not step_flags[name]:
+                continue
+            if manifest.is_finished(name):
+                logging.info(f"Skipping {name}: already finished in run {manifest.run_id}")
+                continue
+            manifest.start_stage(name)
+            try:
+                with instrumentation.span(f"stage.{name}"), profile_step(name, profile_dir, profile, profile_memory):
+                    step()
+            except BaseException as e:
+                manifest.finish_stage(name, error=f"{type(e).__name__}: {e}")
+                raise
+            manifest.finish_stage(name)
+    finally:
+        manifest.finish()
+        unfinished = manifest.unfinished_items()
+        if unfinished:
+            logging.warning(
+                f"Run {manifest.run_id} has unfinished items {manifest.summary()}; "
+                f"rerun them with: python run.py --resume {manifest.run_id}"
+            )
+        else:
+            logging.info(f"Run manifest saved to {manifest.path}")
+        if instrumentation.enabled():
+            ocr_cache = get_ocr_cache()
+            json_path, prom_path = instrumentation.write_run_report(
+                str(Path(raw_dir) / "metrics"), steps=selected_steps, resources=get_governor().snapshot(),
+                ocr_cache=ocr_cache.stats() if ocr_cache else None,
+            )
+            logging.info(f"Run report saved to {json_path} and {prom_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,277 @@
+"""
+Instrumentação leve do pipeline: spans cronometrados, contadores e histogramas,
+exportáveis como relatório JSON e como texto no formato do Prometheus.
+
+Desativada por padrão: `span` devolve um contexto nulo compartilhado e
+`incr`/`observe` retornam de imediato, então o custo fica em uma checagem de
+flag. Ative com `enable()` (ex: `run.py --instrument`) ou com a variável de
+ambiente `MYMIND_INSTRUMENTATION=1`.
+
+Exemplo:
+    with span("extract.document", path=path):
+        ...
+    incr("files_extracted")
+    observe("retrieval_seconds", elapsed, mode="dense")
+"""
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Limites (em segundos) dos buckets dos histogramas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Eventos de span guardados individualmente no relatório (os agregados não têm limite)
+MAX_SPAN_EVENTS = 20000
+# Amostras por série de histograma usadas para os percentis do relatório JSON
+MAX_SAMPLES = 10000
+
+METRIC_PREFIX = "mymind"
+
+_enabled = os.environ.get("MYMIND_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_local = threading.local()
+_started_at = time.time()
+
+_counters: Dict[Tuple, float] = {}
+_histograms: Dict[Tuple, Dict] = {}
+_span_stats: Dict[str, Dict] = {}
+_span_events = deque(maxlen=MAX_SPAN_EVENTS)
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def enabled() -> bool:
+    return _enabled
+
+def reset():
+    """Descarta tudo o que foi coletado (início de uma nova execução)."""
+    global _started_at
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _span_stats.clear()
+        _span_events.clear()
+        _started_at = time.time()
+
+def _series_key(name: str, labels: Dict) -> Tuple:
+    return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+def incr(name: str, value: float = 1, **labels):
+    """Incrementa um contador (ex: arquivos, páginas com OCR, chunks, acertos de cache)."""
+    if not _enabled:
+        return
+    key = _series_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, **labels):
+    """Registra um valor (em segundos, por convenção) em um histograma."""
+    if not _enabled:
+        return
+    key = _series_key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {
+                "buckets": [0] * (len(DEFAULT_BUCKETS) + 1),
+                "sum": 0.0,
+                "count": 0,
+                "samples": deque(maxlen=MAX_SAMPLES),
+            }
+        index = next((i for i, bound in enumerate(DEFAULT_BUCKETS) if value <= bound), len(DEFAULT_BUCKETS))
+        hist["buckets"][index] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+        hist["samples"].append(value)
+
+def record_span(name: str, seconds: float, start: Optional[float] = None, **attrs):
+    """
+    Registra um span já cronometrado em outro lugar (ex: páginas de OCR medidas
+    dentro dos workers do pool de processos).
+    """
+    if not _enabled:
+        return
+    stack = getattr(_local, "stack", None) or []
+    with _lock:
+        stats = _span_stats.get(name)
+        if stats is None:
+            stats = _span_stats[name] = {"count": 0, "total_s": 0.0, "min_s": seconds, "max_s": seconds}
+        stats["count"] += 1
+        stats["total_s"] += seconds
+        stats["min_s"] = min(stats["min_s"], seconds)
+        stats["max_s"] = max(stats["max_s"], seconds)
+        _span_events.append({
+            "name": name,
+            "start": round((start if start is not None else time.time() - seconds) - _started_at, 6),
+            "duration_s": round(seconds, 6),
+            "parent": stack[-1] if stack else None,
+            "thread": threading.current_thread().name,
+            **({"attrs": {key: str(value) for key, value in attrs.items()}} if attrs else {}),
+        })
+
+class _Span:
+    __slots__ = ("name", "attrs", "_start", "_wall")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        stack.append(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        _local.stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record_span(self.name, seconds, start=self._wall, **self.attrs)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name: str, **attrs):
+    """Contexto cronometrado (aninhável): `with span("load.batch", size=500): ...`."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, attrs)
+
+def traced(name: Optional[str] = None):
+    """Decorador equivalente a envolver a função inteira em `span`."""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> Dict:
+    """Estado atual (contadores, histogramas com percentis, spans agregados e eventos)."""
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        histograms = []
+        for (name, labels), hist in sorted(_histograms.items(), key=lambda item: item[0]):
+            samples = np.fromiter(hist["samples"], dtype=np.float64)
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+            histograms.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": hist["count"],
+                "sum": hist["sum"],
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "buckets": dict(zip([str(b) for b in DEFAULT_BUCKETS] + ["+Inf"], hist["buckets"])),
+            })
+        spans = {name: dict(stats) for name, stats in sorted(_span_stats.items())}
+        events = list(_span_events)
+    return {
+        "started_at": datetime.fromtimestamp(_started_at).isoformat(timespec="seconds"),
+        "elapsed_s": round(time.time() - _started_at, 3),
+        "counters": counters,
+        "histograms": histograms,
+        "spans": spans,
+        "span_events": events,
+    }
+
+def _metric_name(name: str) -> str:
+    return f"{METRIC_PREFIX}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+def _format_labels(labels: Dict, extra: Optional[Dict] = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in items.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(items, escaped)) + "}"
+
+def prometheus_text() -> str:
+    """Métricas no formato de exposição de texto do Prometheus."""
+    data = snapshot()
+    lines = []
+
+    seen = set()
+    for counter in data["counters"]:
+        name = _metric_name(counter["name"]) + "_total"
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+
+    for hist in data["histograms"]:
+        name = _metric_name(hist["name"])
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, count in hist["buckets"].items():
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(hist['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(hist['labels'])} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(hist['labels'])} {hist['count']}")
+
+    if data["spans"]:
+        for suffix, key, kind in (("seconds_total", "total_s", "counter"), ("calls_total", "count", "counter"), ("seconds_max", "max_s", "gauge")):
+            name = f"{METRIC_PREFIX}_span_{suffix}"
+            lines.append(f"# TYPE {name} {kind}")
+            for span_name, stats in data["spans"].items():
+                lines.append(f"{name}{_format_labels({'span': span_name})} {stats[key]}")
+
+    return "\n".join(lines) + "\n"
+
+def export_json(path: str, **meta) -> str:
+    """Grava o relatório da execução em JSON (com metadados extras opcionais)."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, **snapshot()}, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+def export_prometheus(path: str) -> str:
+    """Grava as métricas em um arquivo `.prom` (ex: para o textfile collector do node_exporter)."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+def write_run_report(output_dir: str = "data/output/metrics", **meta) -> Tuple[str, str]:
+    """Exporta JSON e Prometheus com o mesmo carimbo de tempo. Retorna os dois caminhos."""
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = export_json(os.path.join(output_dir, f"run_{stamp}.json"), **meta)
+    prom_path = export_prometheus(os.path.join(output_dir, f"run_{stamp}.prom"))
+    return json_path, prom_path
@@ -1,110 +1,138 @@
 from typing import List, Dict, Tuple, Optional
 import numpy as np
 from sklearn.metrics import silhouette_score, adjusted_rand_score, normalized_mutual_info_score
-from sklearn.neighbors import NearestNeighbors
-import random
+import time
 
-def evaluate_hits(
-    vw,
-    chunks: List[Dict],
-    k: int
-) -> Tuple[int, List[str]]:
-    """
-    Realiza consultas no vector store e contabiliza hits.
-
-    Args:
-        vw: objeto vector store com método query_with_score(query, k)
-        chunks: lista de chunks com 'content' e 'metadata'
-        k: número de documentos top-k para recuperar
-
-    Returns:
-        hits: número de queries com documento esperado recuperado
-        logs: lista de mensagens para debug
-    """
-    hits = 0
-    logs = []
-
-    for i, chunk in enumerate(chunks, 1):
-        query_text = chunk.get("content", "")
-        metadata = chunk.get("metadata", {})
-        expected_id = f"{metadata.get('source_file', '')}_{metadata.get('chunk_index', '')}"
-
-        try:
-            results = vw.query_with_score(query_text, k=k)
-        except Exception as e:
-            logs.append(f"[Erro] Consulta {i} falhou: {e}")
-            continue
-
-        retrieved_ids = [
-            doc.metadata.get("doc_id") or f"{doc.metadata.get('source_file', '')}_{doc.metadata.get('chunk_index', '')}"
-            for doc, _ in results
-        ]
-
-        if expected_id in retrieved_ids:
-            hits += 1
-            status = "✔ HIT"
-        else:
-            status = "✘ MISS"
-
-        logs.append(f"[{i}/{len(chunks)}] {status} - Esperado: {expected_id}")
-
-    return hits, logs
+# Itens da amostra estratificada do silhouette (O(n²) dentro da amostra)
+SILHOUETTE_SAMPLE_SIZE = 10000
+# Até quantos pares a distância euclidiana média é exata; acima, amostrada
+MAX_EXACT_PAIRS = 50_000_000
+PAIR_SAMPLE_SIZE = 200_000
+# Consultas medidas uma a uma para os percentis de latência (os blocos só dão a média)
+LATENCY_SAMPLE_SIZE = 200
 
 def calculate_chunk_metrics(
-    vw,
-    chunks: List[Dict],
+    embeddings: np.ndarray,
+    labels: List[str],
     k: int = 5,
-    sample_size: Optional[int] = 5000,
+    sample_size: Optional[int] = None,
+    query_indices: Optional[np.ndarray] = None,
+    batch_size: int = 1024,
+    space: str = "l2",
     verbose: bool = True,
-) -> Tuple[float, float, float]:
+    latency_sample_size: int = LATENCY_SAMPLE_SIZE,
+) -> Dict[str, float]:
     """
-    Calcula Precision@k, Recall@k e F1@k para chunks.
+    Avalia a recuperação dos chunks usando os próprios embeddings persistidos
+    como consultas (sem re-embedar textos nem consultar o vector store).
+
+    Cada consulta é o vetor de um chunk, e o próprio chunk é excluído do
+    ranking (como em `nearest_neighbor_accuracy`); são relevantes os demais
+    chunks com a mesma label, ex: o mesmo arquivo de origem. Consultas sem
+    nenhum outro item relevante (fontes de um chunk só) não são pontuadas.
+    A busca top-k é exata e feita em blocos de consultas contra a matriz inteira;
+    a vazão vem dessa busca e os percentis de latência de uma amostra de
+    `latency_sample_size` consultas executadas uma a uma.
 
     Args:
-        vw: vector store com método query_with_score(query, k)
-        chunks: lista de chunks com 'content' e 'metadata'
+        embeddings: matriz (N, dim) do corpus
+        labels: label de cada linha de `embeddings` (ex: `relative_path`)
         k: top-k documentos para recuperar
-        sample_size: tamanho máximo da amostra para avaliação
-        verbose: imprime logs detalhados
+        sample_size: se informado, avalia uma amostra aleatória das consultas
+        query_indices: linhas usadas como consulta (todas se None)
+        batch_size: consultas por bloco de produto matricial
+        space: métrica do índice ('l2', 'cosine' ou 'ip')
+        verbose: imprime os resultados
+        latency_sample_size: consultas medidas individualmente (0 desativa)
 
     Returns:
-        precision, recall, f1
+        dict: Precision/Recall/F1/HitRate/MRR/nDCG@k, vazão e latências por consulta (ms).
     """
-    total_chunks = len(chunks)
-    if sample_size and total_chunks > sample_size:
-        chunks = random.sample(chunks, sample_size)
-        if verbose:
-            print(f"Avaliando amostra aleatória de {sample_size} chunks (de {total_chunks})")
-    else:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if query_indices is None:
+        query_indices = np.arange(len(embeddings))
+    query_indices = np.asarray(query_indices, dtype=np.int64)
+
+    total_queries = len(query_indices)
+    if sample_size and total_queries > sample_size:
+        query_indices = np.sort(np.random.choice(query_indices, sample_size, replace=False))
         if verbose:
-            print(f"Avaliando todos os {total_chunks} chunks")
-
-    hits, logs = evaluate_hits(vw, chunks, k)
-
-    if verbose:
-        for log in logs:
-            print(log)
-
-    precision = precision_at_k(hits, len(chunks))
-    recall = recall_at_k(hits, len(chunks))
-    f1 = f1_score(precision, recall)
+            print(f"Avaliando amostra aleatória de {sample_size} chunks (de {total_queries})")
+    elif verbose:
+        print(f"Avaliando todos os {total_queries} chunks (corpus de {len(embeddings)})")
+
+    if not len(query_indices):
+        return {}
+
+    _, codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    # Relevantes de cada consulta, sem ela mesma
+    relevant_counts = np.bincount(codes) - 1
+    unscored = int((relevant_counts[codes[query_indices]] == 0).sum())
+    query_indices = query_indices[relevant_counts[codes[query_indices]] > 0]
+    if verbose and unscored:
+        print(f"{unscored} consultas sem outro chunk da mesma fonte (não pontuadas)")
+    if not len(query_indices):
+        return {}
+
+    k = min(k, len(embeddings) - 1)
+    start = time.perf_counter()
+    top, _, _ = batched_top_k(
+        embeddings[query_indices], embeddings, k + 1, batch_size=batch_size, space=space
+    )
+    top = exclude_self(top, query_indices)[:, :k]
+    elapsed = time.perf_counter() - start
+
+    results = ranking_metrics(codes[top], codes[query_indices], relevant_counts, k)
+    if latency_sample_size:
+        timed = query_indices
+        if len(timed) > latency_sample_size:
+            timed = np.random.choice(query_indices, latency_sample_size, replace=False)
+        # Blocos de 1: a latência de cada consulta é medida, não a média do bloco
+        _, _, latencies = batched_top_k(embeddings[timed], embeddings, k + 1, batch_size=1, space=space)
+        results.update(latency_summary(latencies))
+        results["latency_queries"] = len(timed)
+    results["queries"] = len(query_indices)
+    results["queries_unscored"] = unscored
+    results["queries_per_s"] = len(query_indices) / elapsed if elapsed > 0 else 0.0
 
     if verbose:
         print(f"\n🎯 Resultados Top-{k}")
-        print(f"Precision@{k}: {precision:.2%}")
-        print(f"Recall@{k}:    {recall:.2%}")
-        print(f"F1@{k}:        {f1:.2%}")
-
-    return precision, recall, f1
+        print(f"Precision@{k}: {results['precision']:.2%}")
+        print(f"Recall@{k}:    {results['recall']:.2%}")
+        print(f"F1@{k}:        {results['f1']:.2%}")
+        print(f"HitRate@{k}:   {results['hit_rate']:.2%}")
+        print(f"MRR@{k}:       {results['mrr']:.3f}")
+        print(f"nDCG@{k}:      {results['ndcg']:.3f}")
+        print(f"Vazão em blocos: {results['queries_per_s']:.0f} consultas/s")
+        if "latency_p50_ms" in results:
+            print(
+                f"Latência por consulta (ms, {results['latency_queries']} consultas): "
+                f"p50={results['latency_p50_ms']:.3f} p95={results['latency_p95_ms']:.3f} "
+                f"p99={results['latency_p99_ms']:.3f}"
+            )
+
+    return results
 
 def calculate_embedding_metrics(
     embeddings: np.ndarray,
     labels_true: np.ndarray,
     labels_pred: Optional[np.ndarray] = None,
-    verbose: bool = True
+    verbose: bool = True,
+    silhouette_sample_size: int = SILHOUETTE_SAMPLE_SIZE,
+    max_exact_pairs: int = MAX_EXACT_PAIRS,
+    pair_sample_size: int = PAIR_SAMPLE_SIZE,
+    batch_size: int = 1024,
+    seed: int = 0,
 ) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], Optional[float], Optional[float]]:
     """
-    Calcula várias métricas para avaliação de embeddings.
+    Calcula várias métricas para avaliação de embeddings, com memória limitada
+    (nenhuma matriz N x N é materializada; `embeddings` pode ser um memmap).
+
+    - Silhouette em amostra estratificada por label (`silhouette_sample_size`).
+    - Acurácia do vizinho mais próximo por produtos matriciais em blocos.
+    - Similaridade coseno média exata em O(N·d) (pela soma dos vetores normalizados).
+    - Distância euclidiana média exata em blocos até `max_exact_pairs` pares;
+      acima disso, estimada por `pair_sample_size` pares aleatórios (com IC 95%).
 
     Retorna tuple com:
     - Silhouette Score (float ou None)
@@ -114,16 +142,19 @@ def calculate_embedding_metrics(
     - Mean Pairwise Cosine Similarity (float)
     - Mean Pairwise Euclidean Distance (float)
     """
+    rng = np.random.default_rng(seed)
+    labels_true = np.asarray(labels_true, dtype=object).astype(str)
 
     # Silhouette com proteção para poucas classes
     try:
-        score_sil = silhouette(embeddings, labels_true)
+        sample = np.sort(stratified_sample(labels_true, silhouette_sample_size, rng))
+        score_sil = silhouette(np.asarray(embeddings[sample]), labels_true[sample])
     except ValueError:
         if verbose:
             print("⚠️ Silhouette Score requer pelo menos 2 classes diferentes. Pulando essa métrica.")
         score_sil = None
 
-    nn_acc = nearest_neighbor_accuracy(embeddings, labels_true)
+    nn_acc = nearest_neighbor_accuracy(embeddings, labels_true, batch_size=batch_size)
 
     ari = None
     nmi = None
@@ -131,28 +162,25 @@ def calculate_embedding_metrics(
         ari = adjusted_rand_index(labels_true, labels_pred)
         nmi = normalized_mutual_info(labels_true, labels_pred)
 
-    # Métricas gerais de similaridade/distância (média dos pares)
-    cosine_sim_matrix = pairwise_cosine_similarities(embeddings)
-    # só média dos valores acima da diagonal para evitar redundância
-    triu_indices = np.triu_indices_from(cosine_sim_matrix, k=1)
-    mean_cosine_sim = cosine_sim_matrix[triu_indices].mean()
-
-    # Distâncias euclidianas
-    # Para eficiência, calculamos só pares acima da diagonal também
-    from scipy.spatial.distance import pdist
-    euclid_dists = pdist(embeddings, metric='euclidean')
-    mean_euclid_dist = euclid_dists.mean()
+    # Métricas gerais de similaridade/distância (média dos pares i < j)
+    mean_cosine_sim = mean_pairwise_cosine(embeddings, batch_size=batch_size)
+    mean_euclid_dist, euclid_ci = mean_pairwise_euclidean(
+        embeddings, max_exact_pairs=max_exact_pairs, sample_size=pair_sample_size, batch_size=batch_size, rng=rng
+    )
 
     if verbose:
         if score_sil is not None:
-            print(f"Silhouette Score: {score_sil:.3f}")
+            print(f"Silhouette Score: {score_sil:.3f} (amostra de {min(silhouette_sample_size, len(labels_true))})")
         print(f"Nearest Neighbor Accuracy: {nn_acc:.3f}")
         if ari is not None:
             print(f"Adjusted Rand Index: {ari:.3f}")
         if nmi is not None:
             print(f"Normalized Mutual Information: {nmi:.3f}")
         print(f"Mean Pairwise Cosine Similarity: {mean_cosine_sim:.3f}")
-        print(f"Mean Pairwise Euclidean Distance: {mean_euclid_dist:.3f}")
+        if euclid_ci:
+            print(f"Mean Pairwise Euclidean Distance: {mean_euclid_dist:.3f} ± {euclid_ci:.3f} (IC 95%, amostra de pares)")
+        else:
+            print(f"Mean Pairwise Euclidean Distance: {mean_euclid_dist:.3f}")
 
     return score_sil, nn_acc, ari, nmi, mean_cosine_sim, mean_euclid_dist
 
@@ -161,20 +189,139 @@ def calculate_embedding_metrics(
 # Métricas para Avaliação de Chunks (Recuperação)
 # ------------------------
 
-def precision_at_k(hits: int, total: int) -> float:
-    """Calcula Precision@k."""
-    return hits / total if total > 0 else 0.0
-
-def recall_at_k(hits: int, total: int) -> float:
-    """Calcula Recall@k (igual a precision se 1 item relevante por consulta)."""
-    return precision_at_k(hits, total)
-
 def f1_score(precision: float, recall: float) -> float:
     """Calcula F1 score a partir de precision e recall."""
     if precision + recall == 0:
         return 0.0
     return 2 * (precision * recall) / (precision + recall)
 
+def _block_distances(block: np.ndarray, corpus_block: np.ndarray, space: str) -> np.ndarray:
+    """Distâncias (no espaço do Chroma) entre um bloco de consultas e um bloco do corpus."""
+    if space == "cosine":
+        block = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        corpus_block = corpus_block / np.maximum(np.linalg.norm(corpus_block, axis=1, keepdims=True), 1e-12)
+    scores = block @ corpus_block.T
+    if space != "l2":
+        return 1.0 - scores
+    # Distância l2 ao quadrado, como no Chroma: |q|² + |c|² - 2 q·c
+    return (
+        np.einsum("ij,ij->i", block, block)[:, None]
+        + np.einsum("ij,ij->i", corpus_block, corpus_block)[None, :]
+        - 2.0 * scores
+    )
+
+def batched_top_k(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    k: int,
+    batch_size: int = 1024,
+    space: str = "l2",
+    corpus_batch_size: int = 65536,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Busca exata top-k em blocos: cada bloco de consultas vira produtos
+    matriciais contra blocos do corpus, seguidos de `argpartition` (sem ordenar
+    tudo). A memória fica limitada a `batch_size x corpus_batch_size`
+    distâncias, e o corpus pode ser um memmap.
+
+    Returns:
+        indices (n, k), distâncias (n, k) em ordem crescente e a latência
+        amortizada de cada consulta em segundos (tempo do bloco / tamanho; só
+        é a latência individual com `batch_size=1`).
+    """
+    k = min(k, len(corpus))
+    indices = np.empty((len(queries), k), dtype=np.int64)
+    distances = np.empty((len(queries), k), dtype=np.float32)
+    latencies = np.empty(len(queries), dtype=np.float64)
+
+    for i in range(0, len(queries), batch_size):
+        start = time.perf_counter()
+        block = np.asarray(queries[i:i + batch_size], dtype=np.float32)
+        best_idx = np.empty((len(block), 0), dtype=np.int64)
+        best_dist = np.empty((len(block), 0), dtype=np.float32)
+
+        for j in range(0, len(corpus), corpus_batch_size):
+            corpus_block = np.asarray(corpus[j:j + corpus_batch_size], dtype=np.float32)
+            block_dist = _block_distances(block, corpus_block, space)
+            block_k = min(k, len(corpus_block))
+            part = np.argpartition(block_dist, block_k - 1, axis=1)[:, :block_k]
+            # Candidatos do bloco se juntam aos melhores até aqui (no máximo 2k colunas)
+            dist = np.concatenate([best_dist, np.take_along_axis(block_dist, part, axis=1)], axis=1)
+            idx = np.concatenate([best_idx, part + j], axis=1)
+            part = np.argpartition(dist, min(k, dist.shape[1]) - 1, axis=1)[:, :k]
+            best_dist = np.take_along_axis(dist, part, axis=1)
+            best_idx = np.take_along_axis(idx, part, axis=1)
+
+        order = np.argsort(best_dist, axis=1, kind="stable")
+        indices[i:i + len(block)] = np.take_along_axis(best_idx, order, axis=1)
+        distances[i:i + len(block)] = np.take_along_axis(best_dist, order, axis=1)
+        latencies[i:i + len(block)] = (time.perf_counter() - start) / len(block)
+
+    return indices, distances, latencies
+
+def exclude_self(indices: np.ndarray, query_indices: np.ndarray) -> np.ndarray:
+    """
+    Remove a própria consulta de cada linha de um top-(k+1), mantendo a ordem;
+    devolve k colunas. Com vetores duplicados o próprio ponto pode não estar no
+    top: nesse caso cai a última coluna.
+    """
+    not_self = indices != np.asarray(query_indices)[:, None]
+    order = np.argsort(~not_self, axis=1, kind="stable")
+    return np.take_along_axis(indices, order, axis=1)[:, :indices.shape[1] - 1]
+
+def ranking_metrics(
+    retrieved_labels: np.ndarray,
+    query_labels: np.ndarray,
+    relevant_counts: np.ndarray,
+    k: int,
+) -> Dict[str, float]:
+    """
+    Métricas de ranking vetorizadas (médias sobre as consultas).
+
+    Args:
+        retrieved_labels: (n, k) códigos das labels recuperadas, em ordem de rank
+        query_labels: (n,) código da label de cada consulta
+        relevant_counts: total de itens relevantes por código de label
+        k: corte do ranking
+    """
+    relevant = retrieved_labels[:, :k] == query_labels[:, None]
+    n_relevant = np.maximum(relevant_counts[query_labels], 1)
+    found = relevant.sum(axis=1)
+
+    precision = float((found / k).mean())
+    recall = float((found / n_relevant).mean())
+
+    first = np.argmax(relevant, axis=1)
+    hit = relevant.any(axis=1)
+    mrr = float(np.where(hit, 1.0 / (first + 1), 0.0).mean())
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = relevant @ discounts
+    idcg = np.cumsum(discounts)[np.minimum(n_relevant, k) - 1]
+    ndcg = float((dcg / idcg).mean())
+
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1_score(precision, recall),
+        "hit_rate": float(hit.mean()),
+        "mrr": mrr,
+        "ndcg": ndcg,
+    }
+
+def latency_summary(latencies: np.ndarray) -> Dict[str, float]:
+    """Percentis (ms) de uma distribuição de latências em segundos."""
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if not len(latencies):
+        return {}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "latency_mean_ms": float(latencies.mean()),
+        "latency_p50_ms": float(p50),
+        "latency_p95_ms": float(p95),
+        "latency_p99_ms": float(p99),
+    }
+
 # ------------------------
 # Métricas para Avaliação de Embeddings
 # ------------------------
@@ -187,11 +334,6 @@ def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
         return 0.0
     return np.dot(vec1, vec2) / (norm1 * norm2)
 
-def pairwise_cosine_similarities(embeddings: np.ndarray) -> np.ndarray:
-    """Calcula matriz de similaridade coseno entre todos os embeddings."""
-    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-    return np.dot(normed, normed.T)
-
 def euclidean_distance(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """Calcula distância Euclidiana entre dois vetores."""
     return np.linalg.norm(vec1 - vec2)
@@ -206,25 +348,100 @@ def silhouette(embeddings: np.ndarray, labels: np.ndarray) -> float:
         raise ValueError("Silhouette Score requer ao menos 2 classes diferentes")
     return silhouette_score(embeddings, labels)
 
-def nearest_neighbor_accuracy(embeddings: np.ndarray, labels: np.ndarray, n_neighbors: int = 2) -> float:
+def nearest_neighbor_accuracy(
+    embeddings: np.ndarray, labels: np.ndarray, n_neighbors: int = 2, batch_size: int = 1024
+) -> Optional[float]:
     """
     Acurácia do vizinho mais próximo (ignorando o próprio ponto).
-    Retorna a fração de casos em que o vizinho mais próximo tem mesma label.
+    Retorna a fração de casos em que algum dos `n_neighbors - 1` vizinhos mais
+    próximos tem a mesma label. A busca é feita em blocos (`batched_top_k`).
     """
-    nn = NearestNeighbors(n_neighbors=n_neighbors).fit(embeddings)
-    distances, indices = nn.kneighbors(embeddings)
+    if len(embeddings) < 2:
+        return None
+    _, codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    indices, _, _ = batched_top_k(embeddings, embeddings, n_neighbors, batch_size=batch_size, space="l2")
 
-    total = len(labels)
-    hits = 0
+    neighbors = exclude_self(indices, np.arange(len(indices)))
 
-    for i in range(total):
-        # indices[i,0] é o próprio ponto
-        for neighbor_idx in indices[i, 1:]:
-            if labels[i] == labels[neighbor_idx]:
-                hits += 1
-                break
+    return float((codes[neighbors] == codes[:, None]).any(axis=1).mean())
 
-    return hits / total
+def stratified_sample(labels: np.ndarray, sample_size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Índices de uma amostra estratificada: cada label contribui na proporção do
+    seu tamanho, com pelo menos 2 itens (quando houver) para entrar no silhouette.
+    """
+    labels = np.asarray(labels)
+    if len(labels) <= sample_size:
+        return np.arange(len(labels))
+    _, codes, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    groups = np.split(np.argsort(codes, kind="stable"), np.cumsum(counts)[:-1])
+    sample = []
+    for members in groups:
+        take = min(len(members), max(2, int(round(sample_size * len(members) / len(labels)))))
+        sample.append(rng.choice(members, take, replace=False))
+    return np.concatenate(sample)
+
+def mean_pairwise_cosine(embeddings: np.ndarray, batch_size: int = 1024) -> float:
+    """
+    Similaridade coseno média entre pares distintos, exata em O(N·d):
+    soma_{i<j} cos(i, j) = (|Σ v̂|² - Σ |v̂|²) / 2, com v̂ normalizados.
+    """
+    n = len(embeddings)
+    if n < 2:
+        return 0.0
+    total = np.zeros(embeddings.shape[1], dtype=np.float64)
+    self_sim = 0.0
+    for i in range(0, n, batch_size):
+        block = np.asarray(embeddings[i:i + batch_size], dtype=np.float64)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        normed = np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+        total += normed.sum(axis=0)
+        self_sim += float(np.einsum("ij,ij->", normed, normed))
+    return float((total @ total - self_sim) / (n * (n - 1)))
+
+def mean_pairwise_euclidean(
+    embeddings: np.ndarray,
+    max_exact_pairs: int = MAX_EXACT_PAIRS,
+    sample_size: int = PAIR_SAMPLE_SIZE,
+    batch_size: int = 1024,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[float, Optional[float]]:
+    """
+    Distância euclidiana média entre pares distintos.
+
+    Exata (somando blocos da matriz de distâncias) se o número de pares couber
+    em `max_exact_pairs`; senão, estimada por `sample_size` pares aleatórios.
+
+    Returns:
+        média e meia-largura do IC 95% (None quando exata).
+    """
+    n = len(embeddings)
+    if n < 2:
+        return 0.0, None
+
+    if n * (n - 1) // 2 <= max_exact_pairs:
+        total = 0.0
+        for i in range(0, n, batch_size):
+            block = np.asarray(embeddings[i:i + batch_size], dtype=np.float32)
+            for j in range(i, n, batch_size):
+                dist = np.sqrt(np.maximum(_block_distances(block, np.asarray(embeddings[j:j + batch_size], dtype=np.float32), "l2"), 0.0))
+                # Blocos fora da diagonal contam uma vez; na diagonal, só acima dela
+                total += float(np.triu(dist, k=1).sum() if i == j else dist.sum())
+        return total / (n * (n - 1) / 2), None
+
+    rng = rng or np.random.default_rng()
+    first = rng.integers(0, n, sample_size)
+    # Segundo índice uniforme entre os demais: evita pares (i, i)
+    second = (first + rng.integers(1, n, sample_size)) % n
+    order = np.argsort(first)
+    first, second = first[order], second[order]
+    distances = np.empty(sample_size, dtype=np.float64)
+    for i in range(0, sample_size, batch_size):
+        a = np.asarray(embeddings[first[i:i + batch_size]], dtype=np.float32)
+        b = np.asarray(embeddings[second[i:i + batch_size]], dtype=np.float32)
+        distances[i:i + batch_size] = np.linalg.norm(a - b, axis=1)
+    ci = 1.96 * distances.std(ddof=1) / np.sqrt(sample_size)
+    return float(distances.mean()), float(ci)
 
 def adjusted_rand_index(labels_true: np.ndarray, labels_pred: np.ndarray) -> float:
     """Calcula Adjusted Rand Index entre labels verdadeiros e previstos."""
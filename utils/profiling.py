@@ -0,0 +1,230 @@
+"""
+Perfilamento dos passos do `run.py` (`--profile`): profiler determinístico
+(cProfile) ou por amostragem de pilhas, e rastreamento opcional de alocações
+(tracemalloc). Cada passo grava seus artefatos em um diretório com carimbo de
+tempo:
+
+- `<passo>.pstats` e `<passo>_top.txt` (cProfile; abra com `python -m pstats` ou snakeviz)
+- `<passo>.collapsed` (amostragem; pilhas colapsadas para flamegraph.pl/speedscope)
+- `<passo>_alloc.txt` (tracemalloc: maiores alocações e pico)
+- `<passo>_workers.*` (mesmos artefatos somados dos workers do pool de OCR)
+
+Os workers de processo herdam a configuração por variáveis de ambiente e
+envolvem cada tarefa com `profile_worker`.
+"""
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Configuração herdada pelos processos filhos (pool de OCR)
+PROFILE_DIR_ENV = "MYMIND_PROFILE_DIR"
+PROFILE_MODE_ENV = "MYMIND_PROFILE_MODE"
+PROFILE_MEMORY_ENV = "MYMIND_PROFILE_MEMORY"
+
+SAMPLING_INTERVAL = 0.005
+TOP_ENTRIES = 50
+TRACEMALLOC_FRAMES = 25
+
+def new_profile_dir(base_dir: str = "data/output/profiles") -> str:
+    """Diretório com carimbo de tempo para os artefatos de uma execução."""
+    path = Path(base_dir) / datetime.now().strftime("%Y%m%d_%H%M%S")
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+class SamplingProfiler:
+    """
+    Amostra periodicamente as pilhas de todas as threads (`sys._current_frames`)
+    e conta pilhas colapsadas ("thread;f1;f2;f3"). Custo proporcional à taxa de
+    amostragem, não ao número de chamadas.
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.counts[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_top(self, path: str, limit: int = TOP_ENTRIES):
+        """Funções com mais amostras no topo da pilha (tempo próprio)."""
+        own = Counter()
+        for stack, count in self.counts.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        total = sum(own.values()) or 1
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{total} amostras a cada {self.interval * 1000:.1f} ms\n\n")
+            for function, count in own.most_common(limit):
+                f.write(f"{count / total:7.2%} {count:8d}  {function}\n")
+
+def _write_pstats_top(stats: pstats.Stats, path: str, limit: int = TOP_ENTRIES):
+    with open(path, "w", encoding="utf-8") as f:
+        stats.stream = f
+        stats.sort_stats("cumulative").print_stats(limit)
+        stats.sort_stats("tottime").print_stats(limit)
+
+def _write_alloc_report(snapshot: tracemalloc.Snapshot, peak: int, path: str, limit: int = TOP_ENTRIES):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Pico de memória rastreada: {peak / 1e6:.1f} MB\n\n")
+        f.write(f"== Top {limit} linhas por memória ainda alocada ==\n")
+        for stat in snapshot.statistics("lineno")[:limit]:
+            f.write(f"{stat}\n")
+        f.write("\n== Top 10 pilhas ==\n")
+        for stat in snapshot.statistics("traceback")[:10]:
+            f.write(f"\n{stat.size / 1e6:.2f} MB em {stat.count} blocos\n")
+            f.write("\n".join(stat.traceback.format()) + "\n")
+
+@contextmanager
+def _profiled(prefix: str, mode: Optional[str], memory: bool):
+    """Perfila o bloco e grava os artefatos com o prefixo de caminho informado."""
+    profiler = sampler = None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+    elif mode == "sampling":
+        sampler = SamplingProfiler()
+    elif mode is not None:
+        raise ValueError(f"Modo de perfil inválido: '{mode}'. Use um de {PROFILE_MODES}.")
+
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if memory:
+        tracemalloc.reset_peak()
+    if sampler:
+        sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(f"{prefix}.pstats")
+            _write_pstats_top(pstats.Stats(profiler), f"{prefix}_top.txt")
+        if sampler:
+            sampler.stop()
+            sampler.write_collapsed(f"{prefix}.collapsed")
+            sampler.write_top(f"{prefix}_top.txt")
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            _write_alloc_report(tracemalloc.take_snapshot(), peak, f"{prefix}_alloc.txt")
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+def _merge_worker_artifacts(workers_dir: Path, prefix: str):
+    """Soma os perfis das tarefas dos workers em um único artefato por tipo."""
+    pstats_files = sorted(str(p) for p in workers_dir.glob("*.pstats"))
+    if pstats_files:
+        stats = pstats.Stats(pstats_files[0])
+        for path in pstats_files[1:]:
+            stats.add(path)
+        stats.dump_stats(f"{prefix}_workers.pstats")
+        _write_pstats_top(stats, f"{prefix}_workers_top.txt")
+
+    collapsed = Counter()
+    for path in workers_dir.glob("*.collapsed"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    collapsed[stack] += int(count)
+    if collapsed:
+        with open(f"{prefix}_workers.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in collapsed.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_step(name: str, output_dir: Optional[str], mode: Optional[str] = None, memory: bool = False):
+    """
+    Perfila um passo do pipeline. Sem `mode` nem `memory`, não faz nada.
+    Durante o passo, processos filhos criados por ele (workers de OCR)
+    também gravam perfis por tarefa, somados ao final em `<passo>_workers.*`.
+    """
+    if output_dir is None or (mode is None and not memory):
+        yield
+        return
+
+    prefix = os.path.join(output_dir, name)
+    workers_dir = Path(output_dir) / "workers" / name
+    workers_dir.mkdir(parents=True, exist_ok=True)
+
+    previous = {key: os.environ.get(key) for key in (PROFILE_DIR_ENV, PROFILE_MODE_ENV, PROFILE_MEMORY_ENV)}
+    os.environ[PROFILE_DIR_ENV] = str(workers_dir)
+    os.environ[PROFILE_MODE_ENV] = mode or ""
+    os.environ[PROFILE_MEMORY_ENV] = "1" if memory else ""
+
+    start = time.perf_counter()
+    try:
+        with _profiled(prefix, mode, memory):
+            yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        _merge_worker_artifacts(workers_dir, prefix)
+        print(f"[Profile] {name}: {time.perf_counter() - start:.1f}s, artefatos em {output_dir}")
+
+@contextmanager
+def profile_worker(task_name: str):
+    """
+    Perfila uma tarefa dentro de um worker de processo, se o passo que criou o
+    pool estiver sendo perfilado (configuração vinda do ambiente).
+    """
+    output_dir = os.environ.get(PROFILE_DIR_ENV)
+    mode = os.environ.get(PROFILE_MODE_ENV) or None
+    memory = bool(os.environ.get(PROFILE_MEMORY_ENV))
+    if not output_dir or (mode is None and not memory):
+        yield
+        return
+
+    prefix = os.path.join(output_dir, f"{task_name}_{os.getpid()}_{time.monotonic_ns()}")
+    with _profiled(prefix, mode, memory):
+        yield
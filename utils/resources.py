@@ -0,0 +1,279 @@
+"""
+Governador de recursos da máquina: distribui núcleos entre OCR, embeddings e o
+LLM, dimensiona o pool de OCR pela memória medida por worker e segura a
+admissão de novos documentos quando a memória disponível fica baixa.
+
+Sem ele, cada pool de OCR sobe até 8 processos com EasyOCR e torch usando
+todos os núcleos, enquanto o modelo de embeddings e o llama.cpp disputam as
+mesmas CPUs (oversubscription) e a memória pode acabar.
+
+Limites podem ser impostos por ambiente (ex: containers):
+    MYMIND_CPU_LIMIT=8 MYMIND_MEMORY_LIMIT_MB=16000 python run.py ...
+"""
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from utils.instrumentation import incr, observe
+
+# Estimativa de memória por worker de OCR (modelo EasyOCR + página) até a primeira medição
+OCR_WORKER_MEMORY_MB = 1500
+# Teto de workers de OCR (CPU) e de processos com GPU
+MAX_OCR_WORKERS = 8
+MAX_GPU_OCR_WORKERS = 2
+# Memória reservada para o SO e o processo principal (modelo de embeddings, filas)
+RESERVED_MEMORY_MB = 2048
+# Abaixo desta fração da memória total disponível, a admissão de documentos espera
+MEMORY_PRESSURE_RATIO = 0.10
+# O piso de pressão nunca passa desta fração do total (limites pequenos, ex: containers)
+MAX_PRESSURE_FLOOR_RATIO = 0.25
+MEMORY_POLL_INTERVAL = 0.5
+# Espera máxima por memória antes de seguir com um aviso
+MEMORY_WAIT_TIMEOUT = 60.0
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+def cpu_count() -> int:
+    """Núcleos utilizáveis: afinidade do processo, cota do cgroup e MYMIND_CPU_LIMIT."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    limit = os.environ.get("MYMIND_CPU_LIMIT")
+    return max(1, min(cores, int(limit)) if limit else cores)
+
+def physical_cpu_count() -> int:
+    """Núcleos físicos (o llama.cpp rende mais sem hyper-threading); aproximação sem psutil."""
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False)
+    except ImportError:
+        physical = None
+    cores = cpu_count()
+    return max(1, min(cores, physical) if physical else cores)
+
+def process_tree_rss_mb() -> Optional[float]:
+    """Memória residente deste processo e dos filhos (workers de OCR), em MB."""
+    try:
+        import psutil
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss / 2**20
+    except ImportError:
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+def memory_info() -> Tuple[Optional[float], Optional[float]]:
+    """
+    (total, disponível) em MB; (None, None) se não for possível medir. Com
+    MYMIND_MEMORY_LIMIT_MB, o total é o limite e o uso é o do próprio
+    processo (com os workers), não o da máquina inteira.
+    """
+    total = available = None
+    try:
+        import psutil
+        memory = psutil.virtual_memory()
+        total, available = memory.total / 2**20, memory.available / 2**20
+    except ImportError:
+        try:
+            with open("/proc/meminfo", "r") as f:
+                fields = {line.split(":")[0]: float(line.split()[1]) / 1024 for line in f}
+            total, available = fields.get("MemTotal"), fields.get("MemAvailable")
+        except (OSError, ValueError, IndexError):
+            pass
+    limit = os.environ.get("MYMIND_MEMORY_LIMIT_MB")
+    if limit and total is not None:
+        used = process_tree_rss_mb() or 0.0
+        total = min(total, float(limit))
+        available = max(0.0, min(available if available is not None else total, total - used))
+    return total, available
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo atual, em MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return getattr(info, "peak_wset", info.rss) / 2**20
+        except ImportError:
+            return None
+
+def worker_memory_mb() -> Optional[float]:
+    """
+    Memória própria de um worker, em MB: USS (páginas exclusivas do processo)
+    com psutil; sem ele, o pico de RSS (workers são criados com spawn, sem
+    páginas herdadas do processo principal).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_full_info().uss / 2**20
+    except Exception:
+        # Sem psutil, ou USS indisponível na plataforma/sem permissão
+        return peak_rss_mb()
+
+def apply_thread_limits(threads: int):
+    """Limita as threads de OpenMP/BLAS e as intra-op do torch neste processo."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+def init_worker(threads: int = 1):
+    """`initializer` dos pools de processos: cada worker usa `threads` threads."""
+    apply_thread_limits(threads)
+
+class ResourceGovernor:
+    """
+    Divide `cores` entre os estágios e controla quantos workers de OCR estão
+    ativos no processo (vários documentos extraídos em paralelo compartilham o
+    mesmo orçamento em vez de cada um abrir o próprio pool cheio).
+    """
+
+    def __init__(self, cores: Optional[int] = None, memory_mb: Optional[float] = None):
+        self.cores = cores or cpu_count()
+        self.memory_mb = memory_mb or memory_info()[0]
+        self.worker_memory_mb: Dict[str, float] = {"ocr": OCR_WORKER_MEMORY_MB}
+        self._ocr_in_use = 0
+        self._cond = threading.Condition()
+
+    def threads_for(self, stage: str) -> int:
+        """
+        Threads de um estágio: `embed` fica com 1/4 dos núcleos, `ocr` com o
+        restante (um núcleo por worker) e `llm` com os núcleos físicos menos um
+        (na inferência o OCR não roda e o embedding de consultas é leve).
+        """
+        embed = max(1, self.cores // 4)
+        if stage == "embed":
+            return embed
+        if stage == "ocr":
+            return max(1, self.cores - embed)
+        if stage == "llm":
+            physical = physical_cpu_count()
+            return max(1, physical - 1) if physical > 2 else physical
+        raise ValueError(f"Estágio desconhecido: '{stage}'. Use embed, ocr ou llm.")
+
+    def available_memory_mb(self) -> Optional[float]:
+        return memory_info()[1]
+
+    def _pressure_floor_mb(self) -> float:
+        """Memória livre mínima: a reserva fixa, limitada a uma fração do total configurado."""
+        total = self.memory_mb or 0
+        floor = max(RESERVED_MEMORY_MB, MEMORY_PRESSURE_RATIO * total)
+        return min(floor, MAX_PRESSURE_FLOOR_RATIO * total) if total else floor
+
+    def record_worker_memory(self, stage: str, mb: Optional[float]):
+        """Atualiza a memória por worker com o pico medido (fica com o maior já visto)."""
+        if mb:
+            with self._cond:
+                self.worker_memory_mb[stage] = max(self.worker_memory_mb.get(stage, 0), mb)
+
+    def memory_slots(self, stage: str) -> int:
+        """Quantos workers do estágio ainda cabem na memória disponível."""
+        available = self.available_memory_mb()
+        if available is None:
+            return MAX_OCR_WORKERS
+        return max(0, int((available - self._pressure_floor_mb()) // self.worker_memory_mb[stage]))
+
+    def wait_for_memory(self, required_mb: float = 0.0, timeout: Optional[float] = MEMORY_WAIT_TIMEOUT) -> float:
+        """
+        Bloqueia enquanto a memória disponível estiver abaixo do piso de pressão
+        (+ `required_mb`), por no máximo `timeout` segundos. Nunca bloqueia
+        quando nenhum worker de OCR deste processo está ativo (nada a liberar:
+        ao menos um documento/worker sempre passa), e `required_mb` é limitado
+        ao que cabe no total configurado. Retorna o tempo esperado, em segundos.
+        """
+        floor = self._pressure_floor_mb()
+        if self.memory_mb:
+            required_mb = min(required_mb, max(0.0, self.memory_mb - floor))
+        start = time.perf_counter()
+        warned = False
+        while True:
+            available = self.available_memory_mb()
+            if available is None or available - required_mb >= floor:
+                break
+            with self._cond:
+                idle = self._ocr_in_use == 0
+            if idle:
+                break
+            if not warned:
+                print(f"[Recursos] Memória baixa ({available:.0f} MB livres, piso {floor:.0f} MB); aguardando...")
+                warned = True
+            if timeout is not None and time.perf_counter() - start >= timeout:
+                print(f"[Recursos] Memória ainda baixa ({available:.0f} MB) após {timeout:.0f}s; seguindo.")
+                break
+            time.sleep(MEMORY_POLL_INTERVAL)
+        waited = time.perf_counter() - start
+        if waited >= MEMORY_POLL_INTERVAL:
+            incr("memory_throttled")
+            observe("memory_wait_seconds", waited)
+        return waited
+
+    def ocr_budget(self, gpu: bool = False) -> int:
+        """Máximo de workers de OCR simultâneos no processo (tamanho do pool de OCR)."""
+        return MAX_GPU_OCR_WORKERS if gpu else min(MAX_OCR_WORKERS, self.threads_for("ocr"))
+
+    @contextmanager
+    def ocr_workers(self, jobs: int, gpu: bool = False) -> Iterator[int]:
+        """
+        Reserva workers de OCR para um documento com `jobs` páginas: limitado
+        pelos núcleos livres do estágio e pela memória (ao menos 1, esperando se
+        necessário). Devolve a reserva ao sair.
+        """
+        budget = self.ocr_budget(gpu)
+        with self._cond:
+            while self._ocr_in_use >= budget:
+                self._cond.wait()
+            free = budget - self._ocr_in_use
+            granted = max(1, min(jobs, free, self.memory_slots("ocr")))
+            self._ocr_in_use += granted
+        incr("ocr_workers_granted", granted)
+        try:
+            yield granted
+        finally:
+            with self._cond:
+                self._ocr_in_use -= granted
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        total, available = memory_info()
+        return {
+            "cores": self.cores,
+            "memory_total_mb": round(total, 1) if total else None,
+            "memory_available_mb": round(available, 1) if available else None,
+            "threads": {stage: self.threads_for(stage) for stage in ("embed", "ocr", "llm")},
+            "worker_memory_mb": {stage: round(mb, 1) for stage, mb in self.worker_memory_mb.items()},
+            "ocr_workers_in_use": self._ocr_in_use,
+        }
+
+_governor: Optional[ResourceGovernor] = None
+_governor_lock = threading.Lock()
+
+def get_governor() -> ResourceGovernor:
+    """Governador compartilhado pelo processo."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = ResourceGovernor()
+    return _governor